@@ -0,0 +1,48 @@
+from sqlalchemy import inspect, text
+from sqlalchemy.engine import Engine
+
+from app.models import User, GroupScore, Group
+
+# 在 create_all 之后补齐的新增字段：create_all 只建缺失的表，不会给已存在的表加列或索引
+ADDED_COLUMNS = {
+    User.__table__: ["group_name", "public_key_valid"],
+    GroupScore.__table__: ["group_name", "user_anonymous_id"],
+    Group.__table__: ["member_count"],
+}
+ADDED_INDEXES = {
+    # 建环随机抽样所需的复合索引
+    User.__table__: ["ix_users_level_valid_id"],
+}
+
+
+def run_schema_migrations(engine: Engine) -> list:
+    """轻量级迁移：按模型定义补齐旧库缺少的列和索引，返回执行的变更列表。
+
+    通过 SQLAlchemy inspector 读取现有结构（不依赖 SQLite 的 PRAGMA），列类型按当前方言编译，
+    SQLite 与 PostgreSQL 都可直接执行；所有 DDL 在一个事务中提交（PostgreSQL 的 DDL 是事务性的）。
+    """
+    applied = []
+    inspector = inspect(engine)
+    with engine.begin() as conn:
+        for table, names in ADDED_COLUMNS.items():
+            existing = {col["name"] for col in inspector.get_columns(table.name)}
+            for name in names:
+                if name in existing:
+                    continue
+                col = table.c[name]
+                ddl = f"ALTER TABLE {table.name} ADD COLUMN {name} {col.type.compile(dialect=conn.dialect)}"
+                # 带服务端默认值的列连同默认值一起添加，已有行直接取默认值（NOT NULL 列必须有默认值）
+                default = conn.dialect.ddl_compiler(conn.dialect, None).get_column_default_string(col)
+                if default is not None:
+                    ddl += f" DEFAULT {default}"
+                    if not col.nullable:
+                        ddl += " NOT NULL"
+                conn.execute(text(ddl))
+                applied.append(f"{table.name}.{name}")
+        for table, names in ADDED_INDEXES.items():
+            existing = {ix["name"] for ix in inspector.get_indexes(table.name)}
+            for index in table.indexes:
+                if index.name in names and index.name not in existing:
+                    index.create(bind=conn)
+                    applied.append(index.name)
+    return applied
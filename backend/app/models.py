@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Float, Text, JSON, DateTime
+from sqlalchemy import Column, Integer, String, Float, Text, JSON, DateTime, Boolean, Index, text
 from sqlalchemy.sql import func
 from .database import Base
 
@@ -13,11 +13,18 @@ class User(Base):
     anonymous_id = Column(String(100), unique=True, index=True, nullable=False, 
                          comment="用户匿名标识，用于关联数据但不暴露真实身份")
     public_key = Column(Text, nullable=False, comment="用户的椭圆曲线公钥")
+    public_key_valid = Column(Boolean, nullable=True,
+                              comment="公钥是否为有效的 secp256k1 压缩公钥（写入公钥时计算；NULL 表示旧数据尚未回填）")
     group_name = Column(String(100), nullable=True, comment="用户所属的固定群组名称（登录时分配，一次性）")
     user_level = Column(String(50), default="medium", comment="用户运动水平，用于环匹配")
     created_at = Column(DateTime(timezone=True), server_default=func.now(), 
                        comment="用户注册时间")
 
+    __table_args__ = (
+        # 建环随机抽样：按 (水平, 公钥有效) 定位后在 id 上做区间探测
+        Index("ix_users_level_valid_id", "user_level", "public_key_valid", "id"),
+    )
+
 class Ring(Base):
     """
     环数据模型
@@ -51,6 +58,47 @@ class HeatmapData(Base):
     created_at = Column(DateTime(timezone=True), server_default=func.now(), 
                        comment="数据上传时间")
 
+class HeatmapCell(Base):
+    """
+    热力图区块聚合模型
+    每个区块(x, y)一行，保存累计权重与样本数，由上传路径增量维护
+    """
+    __tablename__ = "heatmap_cells"
+
+    x = Column(Integer, primary_key=True, comment="区块横坐标编号")
+    y = Column(Integer, primary_key=True, comment="区块纵坐标编号")
+    weight_sum = Column(Float, nullable=False, default=0.0, comment="区块累计权重（加噪权重之和）")
+    sample_count = Column(Integer, nullable=False, default=0, comment="累计上传样本数")
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now(),
+                       comment="最近一次更新时间")
+
+class HeatmapRollup(Base):
+    """
+    热力图分级汇总模型
+    level 级超级区块边长为 2^level 个原始区块，坐标为 (x >> level, y >> level)
+    """
+    __tablename__ = "heatmap_rollups"
+
+    level = Column(Integer, primary_key=True, comment="缩放级别（1 起，0 级即 heatmap_cells）")
+    x = Column(Integer, primary_key=True, comment="超级区块横坐标编号")
+    y = Column(Integer, primary_key=True, comment="超级区块纵坐标编号")
+    weight_sum = Column(Float, nullable=False, default=0.0, comment="超级区块累计权重")
+    sample_count = Column(Integer, nullable=False, default=0, comment="累计上传样本数")
+
+class HeatmapBucket(Base):
+    """
+    热力图时间分桶汇总模型
+    按小时（granularity=3600）与按天（granularity=86400）两级预汇总，bucket 为 UTC 纪元秒整除粒度
+    """
+    __tablename__ = "heatmap_buckets"
+
+    granularity = Column(Integer, primary_key=True, comment="分桶粒度（秒）：3600 小时桶 / 86400 天桶")
+    bucket = Column(Integer, primary_key=True, comment="桶编号：UTC 纪元秒 // granularity")
+    x = Column(Integer, primary_key=True, comment="区块横坐标编号")
+    y = Column(Integer, primary_key=True, comment="区块纵坐标编号")
+    weight_sum = Column(Float, nullable=False, default=0.0, comment="桶内区块累计权重")
+    sample_count = Column(Integer, nullable=False, default=0, comment="桶内累计上传样本数")
+
 class GroupScore(Base):
     """
     群体成绩数据模型
@@ -68,6 +116,30 @@ class GroupScore(Base):
     created_at = Column(DateTime(timezone=True), server_default=func.now(), 
                        comment="成绩提交时间")
 
+class GroupStats(Base):
+    """
+    群组成绩运行汇总模型
+    与 GroupScore 同事务增量维护，排行榜直接读取，无需扫描 group_scores
+    """
+    __tablename__ = "group_stats"
+
+    group_name = Column(String(100), primary_key=True, comment="群组名称")
+    distance_sum = Column(Float, nullable=False, default=0.0, comment="总距离之和（公里）")
+    pace_sum = Column(Float, nullable=False, default=0.0, comment="平均配速之和")
+    score_count = Column(Integer, nullable=False, default=0, comment="成绩条数")
+    member_count = Column(Integer, nullable=False, default=0, comment="不同提交者匿名ID数量")
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+class GroupMember(Base):
+    """
+    群组成员去重表
+    (group_name, user_anonymous_id) 唯一，首次出现时为 group_stats.member_count 计数
+    """
+    __tablename__ = "group_members"
+
+    group_name = Column(String(100), primary_key=True)
+    user_anonymous_id = Column(String(100), primary_key=True)
+
 class Group(Base):
     """
     运动群组与群密钥（对称密钥，用于成员上传成绩时的 HMAC 验证）。
@@ -78,4 +150,28 @@ class Group(Base):
     id = Column(Integer, primary_key=True, index=True)
     name = Column(String(100), unique=True, index=True, nullable=False)
     secret = Column(Text, nullable=False, comment="群密钥（hex 编码）")
-    created_at = Column(DateTime(timezone=True), server_default=func.now())
\ No newline at end of file
+    member_count = Column(Integer, nullable=False, default=0, server_default=text("0"),
+                          comment="已分配到本组的用户数（登录分配时原子递增，用于最少成员优先分配）")
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+class AppMeta(Base):
+    """
+    应用元数据键值表
+    记录一次性引导步骤（如演示排行榜已播种）等持久化标记
+    """
+    __tablename__ = "app_meta"
+
+    key = Column(String(100), primary_key=True, comment="标记名称")
+    value = Column(Text, nullable=True, comment="标记内容")
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+class SignatureDigest(Base):
+    """
+    已使用的环签名摘要
+    digest = SHA-256(ring_id | message | c0)，主键唯一，用于拒绝重放；按 created_at 定期清理
+    """
+    __tablename__ = "signature_digests"
+
+    digest = Column(String(64), primary_key=True, comment="签名摘要（hex）")
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), index=True,
+                        comment="首次提交时间，清理依据")
@@ -1,17 +1,34 @@
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
+import json
+import os
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Optional
 
-from app.database import get_db
-from app.schemas import HeatmapDataCreate
-from app.services.heatmap_service import HeatmapService
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from pydantic import ValidationError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.database import get_async_db, sqlite_write_lock
+from app.schemas import HeatmapDataCreate, HeatmapStreamRecord
+from app.services.heatmap_service import HeatmapService, np
 
 # 创建热力图相关的API路由
 router = APIRouter()
 
+# 紧凑响应格式的媒体类型
+COLUMNS_MEDIA_TYPE = "application/vnd.privacykeep.heatmap-columns+json"
+BINARY_MEDIA_TYPE = "application/octet-stream"
+
+# NDJSON 流式导入：累计到该条数后在行边界提交一个事务；单行最大字节数（限制缓冲区内存）
+STREAM_CHUNK_RECORDS = int(os.getenv("HEATMAP_STREAM_CHUNK_RECORDS", "5000"))
+STREAM_MAX_LINE_BYTES = int(os.getenv("HEATMAP_STREAM_MAX_LINE_BYTES", str(1 << 20)))
+# 相对时间窗口 window 的最大跨度（天）
+MAX_WINDOW_DAYS = int(os.getenv("HEATMAP_MAX_WINDOW_DAYS", "365"))
+
 @router.post("/data", response_model=dict)
 async def upload_heatmap_data(
     data: HeatmapDataCreate,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """上传经过差分隐私处理后的热力图数据。
 
@@ -29,35 +46,246 @@ async def upload_heatmap_data(
         dict: 上传结果
     """
     try:
-        HeatmapService.store_heatmap_data(db, data.anonymous_id, data.data)
+        # 复用同步服务代码；SQL 经 aiosqlite 执行，不阻塞事件循环
+        async with sqlite_write_lock(db):
+            await db.run_sync(HeatmapService.store_heatmap_data, data.anonymous_id, data.data)
         return {
             "message": "热力图数据上传成功",
             "status": "success",
             "description": "数据已通过差分隐私保护并存储"
         }
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(status_code=500, detail=f"热力图数据上传失败: {str(e)}")
 
+@router.post("/data/stream", response_model=dict)
+async def stream_heatmap_data(
+    request: Request,
+    db: AsyncSession = Depends(get_async_db)
+):
+    """NDJSON 流式批量导入（application/x-ndjson），用于回放归档的脱敏数据。
+
+    每行一个 JSON 对象，两种形式可混用：
+    - 单条记录 {"anonymous_id", "x", "y", "weight"}
+    - 一次完整上传 {"anonymous_id", "data": [{"x", "y", "weight"}, ...]}（与 POST /data 的请求体相同）
+
+    请求体边读边解析，累计约 HEATMAP_STREAM_CHUNK_RECORDS 条后在行边界按批量路径写入并提交一个事务，
+    内存占用与请求体大小无关。某行格式错误时返回 400，已提交的分块保留，lines_committed 为已完整
+    入库的行数，客户端可从下一行续传。
+
+    Returns:
+        dict: 导入条数、行数、事务数、耗时与每秒导入条数
+    """
+    started = time.perf_counter()
+    pending = []
+    stats = {"records": 0, "lines": 0, "chunks": 0}
+    line_no = 0
+
+    async def flush():
+        async with sqlite_write_lock(db):
+            await db.run_sync(HeatmapService.store_heatmap_records, pending)
+        stats["records"] += len(pending)
+        stats["chunks"] += 1
+        stats["lines"] = line_no
+        pending.clear()
+
+    def parse(line: bytes) -> None:
+        try:
+            obj = json.loads(line)
+            if isinstance(obj, dict) and "data" in obj:
+                upload = HeatmapDataCreate.model_validate(obj)
+                pending.extend(
+                    HeatmapStreamRecord.model_construct(anonymous_id=upload.anonymous_id, x=p.x, y=p.y, weight=p.weight)
+                    for p in upload.data
+                )
+            else:
+                pending.append(HeatmapStreamRecord.model_validate(obj))
+        except (ValueError, ValidationError) as e:
+            reason = ("; ".join(f"{'.'.join(map(str, err['loc']))}: {err['msg']}" for err in e.errors())
+                      if isinstance(e, ValidationError) else str(e))
+            raise HTTPException(status_code=400, detail={
+                "message": f"第 {line_no} 行格式错误: {reason[:200]}",
+                "line": line_no,
+                "records_committed": stats["records"],
+                "lines_committed": stats["lines"],
+            })
+
+    try:
+        buffer = bytearray()
+        async for piece in request.stream():
+            # 只在新到的数据中找换行，未结束的行原地累积，不会随每个分段被重新复制和扫描
+            scan = len(buffer)
+            buffer += piece
+            start = 0
+            while True:
+                end = buffer.find(b"\n", scan)
+                if end < 0:
+                    break
+                line = bytes(buffer[start:end])
+                start = scan = end + 1
+                line_no += 1
+                if line.strip():
+                    parse(line)
+                if len(pending) >= STREAM_CHUNK_RECORDS:
+                    await flush()
+            if start:
+                del buffer[:start]
+            if len(buffer) > STREAM_MAX_LINE_BYTES:
+                raise HTTPException(status_code=413, detail=f"第 {line_no + 1} 行超过 {STREAM_MAX_LINE_BYTES} 字节")
+        if buffer.strip():
+            line_no += 1
+            parse(buffer)
+        if pending:
+            await flush()
+        stats["lines"] = line_no
+        elapsed = time.perf_counter() - started
+        return {
+            "message": "热力图数据流式导入完成",
+            "status": "success",
+            **stats,
+            "elapsed_s": round(elapsed, 3),
+            "records_per_second": round(stats["records"] / elapsed, 1) if elapsed > 0 else None,
+        }
+    except HTTPException:
+        raise
+    except Exception as e:
+        await db.rollback()
+        raise HTTPException(status_code=500, detail={
+            "message": f"热力图数据流式导入失败: {str(e)}",
+            "records_committed": stats["records"],
+            "lines_committed": stats["lines"],
+        })
+
 @router.get("/", response_model=dict)
-async def get_heatmap(db: Session = Depends(get_db), attenuate: bool = True, factor: float = 0.7, radius: int = 5):
+async def get_heatmap(
+    request: Request,
+    db: AsyncSession = Depends(get_async_db),
+    attenuate: bool = True,
+    factor: float = 0.7,
+    radius: int = 5,
+    x_min: Optional[int] = None,
+    x_max: Optional[int] = None,
+    y_min: Optional[int] = None,
+    y_max: Optional[int] = None,
+    zoom: int = Query(0, ge=0, le=HeatmapService.MAX_ZOOM_LEVEL),
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    window: Optional[str] = Query(None, pattern=r"^\d+[hd]$"),
+    format: Optional[str] = Query(None, pattern=r"^(records|columns|binary)$")
+):
     """获取全局聚合热力图。
 
     后端对同一区块的权重求和，不反推任何单个用户轨迹。
 
     Args:
         db: 数据库会话
+        x_min/x_max/y_min/y_max: 视口范围（原始网格坐标，闭区间），只返回视口内区块
+        zoom: 缩放级别，0 为原始区块；n 级返回边长 2^n 的超级区块（坐标为原坐标右移 n 位）
+        since/until: 时间窗口 [since, until)，ISO8601，精度为小时
+        window: 相对时间窗口（如 24h、7d、30d），与 since 互斥，最长 MAX_WINDOW_DAYS 天
+        format: 响应格式 records（默认）/ columns / binary，也可通过 Accept 头协商：
+            application/vnd.privacykeep.heatmap-columns+json → {"x":[],"y":[],"w":[]}
+            application/octet-stream → 小端 int32 x[n] | int32 y[n] | float32 w[n]，n 见 X-Heatmap-Count
 
     Returns:
         HeatmapResponse: 聚合热力图数据
     """
+    if x_min is not None and x_max is not None and x_min > x_max:
+        raise HTTPException(status_code=400, detail="x_min 不能大于 x_max")
+    if y_min is not None and y_max is not None and y_min > y_max:
+        raise HTTPException(status_code=400, detail="y_min 不能大于 y_max")
+    if window is not None:
+        if since is not None:
+            raise HTTPException(status_code=400, detail="window 与 since 不能同时指定")
+        try:
+            since = (until or datetime.now(timezone.utc)) - _window_span(window)
+        except OverflowError:
+            raise HTTPException(status_code=400, detail="window 超出可表示的日期范围")
+    if since is not None and until is not None and _as_utc(since) >= _as_utc(until):
+        # 空窗口或倒置窗口直接报错，而不是返回看似"无数据"的空结果
+        raise HTTPException(status_code=400, detail="since 必须早于 until")
+    fmt = _negotiate_format(request.headers.get("accept"), format)
     try:
-        aggregated = HeatmapService.get_global_heatmap(db)
-        if attenuate:
-            aggregated = HeatmapService.attenuate_center(aggregated, factor=factor, radius=radius)
+        query = dict(x_min=x_min, x_max=x_max, y_min=y_min, y_max=y_max, zoom=zoom, since=since, until=until)
+        # 衰减半径以原始区块为单位，换算到当前级别的超级区块
+        scaled_radius = radius / (1 << zoom)
+        if np is not None and fmt != "records":
+            # 紧凑格式走列式路径：x/y/weight 全程保持为 NumPy 数组，最后一次性打包
+            xs, ys, ws = await db.run_sync(lambda s: HeatmapService.get_global_heatmap_columns(s, **query))
+            if attenuate:
+                xs, ys, ws = HeatmapService.attenuate_center_columns(xs, ys, ws, factor=factor, radius=scaled_radius)
+            aggregated = None
+        else:
+            # 默认的记录格式直接由查询行构建 dict，不经数组中转
+            aggregated = await db.run_sync(lambda s: HeatmapService.get_global_heatmap(s, **query))
+            if attenuate:
+                aggregated = HeatmapService.attenuate_center(aggregated, factor=factor, radius=scaled_radius)
+            if fmt != "records":
+                xs = [item['x'] for item in aggregated]
+                ys = [item['y'] for item in aggregated]
+                ws = [item['weight'] for item in aggregated]
+        description = "全局热力图数据，已通过差分隐私保护" + ("（中心已衰减显示）" if attenuate else "")
+
+        if fmt == "binary":
+            # 平面布局：n 个 int32 x | n 个 int32 y | n 个 float32 weight，小端序
+            return Response(
+                content=HeatmapService.pack_columns(xs, ys, ws),
+                media_type=BINARY_MEDIA_TYPE,
+                headers={
+                    "X-Heatmap-Count": str(len(xs)),
+                    "X-Heatmap-Zoom": str(zoom),
+                    "X-Heatmap-Cell-Size": str(1 << zoom),
+                }
+            )
+        if fmt == "columns":
+            # 平行数组，直接 json.dumps 绕过通用 jsonable_encoder
+            body = {
+                "x": _as_list(xs),
+                "y": _as_list(ys),
+                "w": _as_list(ws),
+                "zoom": zoom,
+                "cell_size": 1 << zoom,
+                "description": description
+            }
+            return Response(content=json.dumps(body, ensure_ascii=False), media_type=COLUMNS_MEDIA_TYPE)
         return {
             "heatmap": aggregated,
-            "description": "全局热力图数据，已通过差分隐私保护" + ("（中心已衰减显示）" if attenuate else "")
+            "zoom": zoom,
+            "cell_size": 1 << zoom,
+            "description": description
         }
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"获取热力图失败: {str(e)}")
+
+
+def _as_utc(dt: datetime) -> datetime:
+    # 未带时区的查询参数按 UTC 处理（与 HeatmapService 的时间桶一致）
+    return dt if dt.tzinfo is not None else dt.replace(tzinfo=timezone.utc)
+
+
+def _window_span(window: str) -> timedelta:
+    """window（如 24h / 7d）→ timedelta；先按字符串长度与上限校验，超大数值不进入日期运算。"""
+    digits = window[:-1].lstrip("0") or "0"
+    hours = int(digits) * (24 if window.endswith("d") else 1) if len(digits) <= 9 else None
+    if hours is None or hours > MAX_WINDOW_DAYS * 24:
+        raise HTTPException(status_code=400,
+                            detail=f"window 最长 {MAX_WINDOW_DAYS}d（{MAX_WINDOW_DAYS * 24}h）")
+    if hours == 0:
+        raise HTTPException(status_code=400, detail="window 必须大于 0")
+    return timedelta(hours=hours)
+
+
+def _negotiate_format(accept: Optional[str], fmt: Optional[str]) -> str:
+    """确定响应格式：显式 format 参数优先，其次 Accept 头，默认沿用记录式 JSON。"""
+    if fmt:
+        return fmt
+    accept = (accept or "").lower()
+    if BINARY_MEDIA_TYPE in accept:
+        return "binary"
+    if COLUMNS_MEDIA_TYPE in accept:
+        return "columns"
+    return "records"
+
+
+def _as_list(values) -> list:
+    return values.tolist() if hasattr(values, "tolist") else list(values)
@@ -1,135 +1,144 @@
 from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
-from sqlalchemy import func
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select
 
-from app.database import get_db
-from app.schemas import RingRequest, RingResponse, ScoreSubmit, LeaderboardResponse, ScoreSubmitRing
+from app.database import get_async_db, sqlite_write_lock
+from app.schemas import (
+    RingRequest, RingResponse, ScoreSubmit, LeaderboardResponse, ScoreSubmitRing,
+    ScoreSubmitRingBatch, ScoreBatchItemResult, ScoreBatchResponse
+)
 from app.services.ring_service import RingService
 from app.services.crypto_service import CryptoService
-from app.models import Ring, GroupScore, User, Group
-from sqlalchemy import func
+from app.services.leaderboard_service import LeaderboardService
+from app.services.verify_pool import get_verify_pool, PoolSaturated
+from app.services.ring_pool import get_ring_pool
+from app.services.group_service import GroupService
+from app.services.replay_guard import get_replay_guard
+from app.models import Ring, GroupScore, User
 import json
+import os
 
 # 创建排行榜相关的API路由
 router = APIRouter()
 
-def seed_leaderboard(db: Session, target_groups: int = 6, target_members: int = 5):
-    """确保演示排行榜至少有 target_groups 个群组，每组至少 target_members 位成员。
-    若已有部分数据，则按需补齐，不重复插入相同 seed 用户。
-    """
-    import hashlib, random
-    # 预设候选组名
-    candidate_groups = [
-        "闪电跑者", "旋风小队", "晨曦战士", "夜猫子联盟",
-        "周末勇士", "马拉松训练营", "健康生活家", "城市探索者",
-        "节奏大师", "耐力王者", "速度之星", "坚持到底队"
-    ]
-    random.shuffle(candidate_groups)
-    use_groups = candidate_groups[:target_groups]
-
-    # 统计现有每组的 distinct 成员数
-    existing_counts = {row[0]: row[1] for row in db.query(
-        GroupScore.group_name, func.count(func.distinct(GroupScore.user_anonymous_id))
-    ).group_by(GroupScore.group_name).all()}
-
-    for gname in use_groups:
-        current = int(existing_counts.get(gname, 0) or 0)
-        need = max(0, target_members - current)
-        if need == 0:
-            continue
-        # 准备一个 seed ring（或复用同一个 ring_id）
-        ring_id = f"seed_{hashlib.md5(gname.encode()).hexdigest()[:8]}"
-        ring = db.query(Ring).filter(Ring.ring_id == ring_id).first()
-        if not ring:
-            pubkeys = [hashlib.md5((gname+str(i)).encode()).hexdigest() for i in range(7)]
-            ring = Ring(ring_id=ring_id, public_keys=pubkeys, group_name=gname, user_level="medium")
-            db.add(ring); db.commit(); db.refresh(ring)
-        # 生成需要的成员成绩，保证 user_anonymous_id 唯一
-        base_idx = current
-        for k in range(need):
-            idx = base_idx + k
-            user_id = f"seed_user_{hashlib.md5((gname+str(idx)).encode()).hexdigest()[:10]}"
-            # 合理的距离/配速随机（不同组可稍微偏置）
-            # 距离 3~12km，配速 5.0~7.0 分/公里之间
-            dist = round(random.uniform(3.0, 12.0), 1)
-            pace = round(random.uniform(5.0, 7.0), 1)
-            sig = hashlib.sha256(f"{ring_id}{user_id}{dist}{pace}".encode()).hexdigest()
-            gs = GroupScore(
-                ring_id=ring.ring_id,
-                group_name=gname,
-                user_anonymous_id=user_id,
-                total_distance=dist,
-                average_pace=pace,
-                signature=sig
-            )
-            db.add(gs)
-        db.commit()
+# 批量提交单批最大条数
+BATCH_MAX_ITEMS = int(os.getenv("RING_BATCH_MAX_ITEMS", "256"))
 
 @router.post("/request-ring", response_model=RingResponse)
 async def request_ring(
     request: RingRequest,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """请求加入一个匿名环。"""
     try:
-        user = db.query(User).filter(User.anonymous_id == request.anonymous_id).first()
+        user = (await db.execute(select(User).where(User.anonymous_id == request.anonymous_id))).scalar_one_or_none()
         if not user:
             # 旧逻辑：无用户时直接创建，但不再在此分配随机组；组在登录时分配。
-            # 为兼容旧前端，若前端未调用 /user/login，这里兜底分配一次。
-            group_name = RingService.pick_group_for_user()
-            user = User(
-                anonymous_id=request.anonymous_id,
-                public_key=request.public_key,
-                user_level=request.user_level,
-                group_name=group_name
-            )
-            db.add(user)
-            db.commit()
-            db.refresh(user)
+            # 为兼容旧前端，若前端未调用 /user/login，这里兜底分配一次（与登录相同的最少成员优先）。
+            async with sqlite_write_lock(db):
+                group_name = await db.run_sync(GroupService.assign_group)
+                user = User(
+                    anonymous_id=request.anonymous_id,
+                    public_key=request.public_key,
+                    public_key_valid=RingService._is_valid_secp256k1_compressed_hex(request.public_key),
+                    user_level=request.user_level,
+                    group_name=group_name
+                )
+                db.add(user)
+                await db.commit()
         else:
             # 更新公钥（如果变更）
             if user.public_key != request.public_key:
-                user.public_key = request.public_key
-                db.add(user)
-                db.commit()
-                db.refresh(user)
+                async with sqlite_write_lock(db):
+                    user.public_key = request.public_key
+                    user.public_key_valid = RingService._is_valid_secp256k1_compressed_hex(request.public_key)
+                    db.add(user)
+                    await db.commit()
 
-        ring_info = RingService.generate_ring(db, request.public_key, request.user_level, group_name=user.group_name)
+        # 复用窗口内的重复请求直接返回已发放的环；其余从预建环池取成员集（未命中时现场构建），
+        # 两者都会写入 Ring 行（现场构建还可能补种用户）并提交，因此在写锁内执行
+        pool = get_ring_pool()
+        group_name = user.group_name
+        ring_info = pool.reused(request.public_key, request.user_level, group_name)
+        if ring_info is None:
+            async with sqlite_write_lock(db):
+                ring_info = await db.run_sync(
+                    lambda s: pool.acquire(s, request.public_key, request.user_level, group_name=group_name)
+                )
         return RingResponse(**ring_info)
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(status_code=500, detail=f"环生成失败: {str(e)}")
 
+async def _release_before_verify(db: AsyncSession, objs) -> None:
+    """等待验证前结束只读事务：对象脱离会话（保留已加载属性），连接归还连接池，
+    避免大量请求在等待验证期间占满连接池。"""
+    for obj in objs:
+        db.expunge(obj)
+    await db.rollback()
+
+async def _seen_digests(db: AsyncSession, digests) -> set:
+    """验证前的重放检查：布隆过滤器判定未见过的摘要不查库，其余按主键查 signature_digests。"""
+    guard = get_replay_guard()
+    maybe = guard.candidates(digests)
+    if not maybe:
+        return set()
+    return await db.run_sync(guard.seen, maybe)
+
+def _record_unless_replayed(db, scores_with_digests) -> list:
+    """同一事务内登记签名摘要并写入成绩；摘要已被占用（重放）的成绩跳过。返回每条是否写入。"""
+    guard = get_replay_guard()
+    claimed = []
+    for gs, digest in scores_with_digests:
+        ok = guard.claim(db, digest)
+        if ok:
+            LeaderboardService.record_score(db, gs)
+        claimed.append(ok)
+    return claimed
+
+def _replayed() -> HTTPException:
+    return HTTPException(status_code=409, detail="该签名已提交过，拒绝重放")
+
+async def _verify_or_503(pending):
+    """等待验证池结果；池已满时返回 503 + Retry-After，由客户端退避重试。"""
+    try:
+        return await pending
+    except PoolSaturated:
+        raise HTTPException(status_code=503, detail="签名验证繁忙，请稍后重试", headers={"Retry-After": "1"})
+
 @router.post("/submit-score", response_model=dict)
 async def submit_score(
     score_data: ScoreSubmit,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """提交带有群密钥 HMAC 的运动成绩（教学版）。"""
     try:
-        grp = db.query(Group).filter(Group.name==score_data.group_name).first()
-        if not grp:
+        # 群密钥与群组 id 走进程内映射，命中时不查 groups 表
+        secret = await db.run_sync(GroupService.lookup_secret, score_data.group_name)
+        if secret is None:
             raise HTTPException(status_code=404, detail="群组不存在")
 
         # 验证 HMAC（基于 group_key 的 SHA-512 HMAC）
         import hmac, hashlib
         msg = f"{score_data.group_name}|{score_data.total_distance}|{score_data.average_pace}".encode()
-        key = bytes.fromhex(grp.secret)
+        key = bytes.fromhex(secret)
         mac = hmac.new(key, msg, hashlib.sha512).hexdigest()
         if mac != score_data.group_signature:
             raise HTTPException(status_code=400, detail="群密钥验证失败")
 
         # 将成绩聚合进对应群组
         group_score = GroupScore(
-            ring_id=f"group_{grp.id}",
+            ring_id=f"group_{GroupService.cached_group_id(score_data.group_name)}",
             group_name=score_data.group_name,
             user_anonymous_id=None,
             total_distance=score_data.total_distance,
             average_pace=score_data.average_pace,
             signature=score_data.group_signature
         )
-        db.add(group_score)
-        db.commit()
+        async with sqlite_write_lock(db):
+            await db.run_sync(LeaderboardService.record_score, group_score)
+            await db.commit()
+        LeaderboardService.invalidate_cache()
 
         return {
             "message": "成绩上传成功",
@@ -139,26 +148,31 @@ async def submit_score(
     except HTTPException:
         raise
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(status_code=500, detail=f"成绩提交失败: {str(e)}")
 
 @router.post("/submit-score-ring", response_model=dict)
 async def submit_score_ring(
     payload: ScoreSubmitRing,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """使用真正环签名提交成绩 (Schnorr-like 教学版)。"""
     try:
         # 获取环信息
-        ring = db.query(Ring).filter(Ring.ring_id == payload.ring_id).first()
+        ring = (await db.execute(select(Ring).where(Ring.ring_id == payload.ring_id))).scalar_one_or_none()
         if not ring:
             raise HTTPException(status_code=404, detail="环不存在")
         # 组装消息（与前端保持一致）
         msg = f"{payload.ring_id}|{payload.total_distance}|{payload.average_pace}".encode()
         c0 = payload.signature.c0
         s_list = payload.signature.s
-        # 验证环签名
-        if not CryptoService.ring_verify(msg, ring.public_keys, c0, s_list):
+        # 重放检查在验证之前：已使用过的签名不做任何椭圆曲线运算
+        digest = get_replay_guard().digest(ring.ring_id, msg, c0)
+        if await _seen_digests(db, [digest]):
+            raise _replayed()
+        await _release_before_verify(db, [ring])
+        # 验证环签名（在验证池中执行，不阻塞事件循环）
+        if not await _verify_or_503(get_verify_pool().verify(msg, ring.public_keys, c0, s_list, ring_id=ring.ring_id)):
             raise HTTPException(status_code=400, detail="环签名验证失败")
         # 写入成绩；签名序列化保留
         sig_store = json.dumps({"c0": c0, "s": s_list})
@@ -170,48 +184,133 @@ async def submit_score_ring(
             average_pace=payload.average_pace,
             signature=sig_store
         )
-        db.add(gs)
-        db.commit()
+        async with sqlite_write_lock(db):
+            claimed = await db.run_sync(_record_unless_replayed, [(gs, digest)])
+            await db.commit()
+        get_replay_guard().remember([digest])
+        if not claimed[0]:
+            # 并发的相同请求或其他 worker 已抢先写入
+            raise _replayed()
+        LeaderboardService.invalidate_cache()
         return {"message": "环签名成绩上传成功", "status": "success"}
     except HTTPException:
         raise
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(status_code=500, detail=f"环签名成绩提交失败: {str(e)}")
 
+@router.post("/submit-scores-ring/batch", response_model=ScoreBatchResponse)
+async def submit_scores_ring_batch(
+    payload: ScoreSubmitRingBatch,
+    db: AsyncSession = Depends(get_async_db)
+):
+    """批量提交环签名成绩：按环分组并行验证，逐条返回结果，通过的成绩在一个事务内写入。"""
+    items = payload.items
+    if len(items) > BATCH_MAX_ITEMS:
+        raise HTTPException(status_code=413, detail=f"单批最多 {BATCH_MAX_ITEMS} 条成绩")
+    try:
+        ring_ids = {item.ring_id for item in items}
+        rings = {}
+        if ring_ids:
+            found = await db.execute(select(Ring).where(Ring.ring_id.in_(ring_ids)))
+            rings = {r.ring_id: r for r in found.scalars()}
+
+        guard = get_replay_guard()
+        results = [None] * len(items)
+        digests = [None] * len(items)
+        for idx, item in enumerate(items):
+            if item.ring_id not in rings:
+                results[idx] = ScoreBatchItemResult(index=idx, ring_id=item.ring_id, status="not_found", detail="环不存在")
+                continue
+            # 组装消息（与前端保持一致）
+            msg = f"{item.ring_id}|{item.total_distance}|{item.average_pace}".encode()
+            digests[idx] = (msg, guard.digest(item.ring_id, msg, item.signature.c0))
+
+        # 重放检查：已入库的签名与同一批内重复的签名都不进入验证
+        seen = await _seen_digests(db, [d for _, d in filter(None, digests)])
+        jobs, job_index = [], []
+        for idx, item in enumerate(items):
+            if digests[idx] is None:
+                continue
+            msg, digest = digests[idx]
+            if digest in seen:
+                results[idx] = ScoreBatchItemResult(index=idx, ring_id=item.ring_id, status="replayed", detail="该签名已提交过")
+                continue
+            seen.add(digest)
+            ring = rings[item.ring_id]
+            jobs.append((msg, ring.public_keys, item.signature.c0, item.signature.s, ring.ring_id))
+            job_index.append(idx)
+
+        await _release_before_verify(db, rings.values())
+        verdicts = await _verify_or_503(get_verify_pool().verify_batch(jobs))
+
+        scores, score_index = [], []
+        for idx, ok in zip(job_index, verdicts):
+            item = items[idx]
+            if not ok:
+                results[idx] = ScoreBatchItemResult(index=idx, ring_id=item.ring_id, status="rejected", detail="环签名验证失败")
+                continue
+            ring = rings[item.ring_id]
+            gs = GroupScore(
+                ring_id=ring.ring_id,
+                group_name=ring.group_name,
+                user_anonymous_id=None,
+                total_distance=item.total_distance,
+                average_pace=item.average_pace,
+                signature=json.dumps({"c0": item.signature.c0, "s": item.signature.s})
+            )
+            scores.append((gs, digests[idx][1]))
+            score_index.append(idx)
+            results[idx] = ScoreBatchItemResult(index=idx, ring_id=item.ring_id, status="accepted")
+        accepted = len(scores)
+        if scores:
+            async with sqlite_write_lock(db):
+                claimed = await db.run_sync(_record_unless_replayed, scores)
+                await db.commit()
+            guard.remember(digest for _, digest in scores)
+            # 验证期间被并发请求抢先写入的签名改判为重放
+            for idx, ok in zip(score_index, claimed):
+                if not ok:
+                    results[idx] = ScoreBatchItemResult(index=idx, ring_id=items[idx].ring_id, status="replayed", detail="该签名已提交过")
+                    accepted -= 1
+            LeaderboardService.invalidate_cache()
+        return ScoreBatchResponse(accepted=accepted, rejected=len(items) - accepted, results=results)
+    except HTTPException:
+        raise
+    except Exception as e:
+        await db.rollback()
+        raise HTTPException(status_code=500, detail=f"批量环签名成绩提交失败: {str(e)}")
+
 @router.get("/", response_model=LeaderboardResponse)
-async def get_leaderboard(db: Session = Depends(get_db), seed: bool = True):
-    """获取群体排行榜。"""
+async def get_leaderboard(db: AsyncSession = Depends(get_async_db)):
+    """获取群体排行榜（只读；进程内缓存，成绩提交时失效）。
+
+    演示数据播种已移至启动引导 / scripts/seed_leaderboard.py，不再在读路径上执行。
+    """
     try:
-        if seed:
-            seed_leaderboard(db)
-        subquery = db.query(
-            GroupScore.group_name.label('gname'),
-            func.avg(GroupScore.total_distance).label('avg_distance'),
-            func.avg(GroupScore.average_pace).label('avg_pace'),
-            func.count(func.distinct(GroupScore.user_anonymous_id)).label('member_count')
-        ).group_by(GroupScore.group_name).subquery()
-
-        leaderboard_data = db.query(
-            subquery.c.gname,
-            subquery.c.avg_distance,
-            subquery.c.avg_pace,
-            subquery.c.member_count
-        ).all()
-
-        leaderboard = []
-        for row in leaderboard_data:
-            # 规格化为两位小数
-            avg_dist = round(float(row.avg_distance), 2) if row.avg_distance is not None else 0.0
-            avg_pace = round(float(row.avg_pace), 2) if row.avg_pace is not None else 0.0
-            leaderboard.append({
-                "group_name": row.gname or "未知组",
-                "average_distance": avg_dist,
-                "average_pace": avg_pace,
-                "member_count": int(row.member_count) if row.member_count is not None else 0
-            })
-
-        leaderboard.sort(key=lambda x: x["average_distance"], reverse=True)
-        return LeaderboardResponse(leaderboard=leaderboard)
+        return LeaderboardResponse(leaderboard=await db.run_sync(LeaderboardService.get_leaderboard))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"获取排行榜失败: {str(e)}")
+
+@router.get("/cache-stats", response_model=dict)
+async def get_leaderboard_cache_stats():
+    """缓存命中/未命中统计：排行榜聚合缓存与环公钥解析缓存。"""
+    return {
+        "leaderboard": LeaderboardService.cache_stats(),
+        "ring_keys": CryptoService.ring_key_cache_stats()
+    }
+
+@router.get("/ring-pool-stats", response_model=dict)
+async def get_ring_pool_stats():
+    """预建环池状态：各池深度、命中率、复用次数与后台补充耗时。"""
+    return get_ring_pool().stats()
+
+@router.get("/replay-stats", response_model=dict)
+async def get_replay_stats():
+    """防重放状态：布隆过滤器规模、免查库次数、查库次数与拒绝的重放次数。"""
+    return get_replay_guard().stats()
+
+@router.get("/verify-pool-stats", response_model=dict)
+async def get_verify_pool_stats():
+    """环签名验证池状态：执行器类型、在途/峰值任务数与 503 拒绝次数。"""
+    return get_verify_pool().stats()
@@ -1,65 +1,93 @@
+from functools import lru_cache
+
 from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
+from sqlalchemy import bindparam, select
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.database import get_db
+from app.database import UPSERT_INSERTS, get_async_db, sqlite_write_lock
 from app.schemas import UserLoginResponse, UserLoginRequest
-from app.models import User, Group
+from app.models import User
+from app.services.group_service import GroupService
 from app.services.ring_service import RingService
-import os, secrets
 
 router = APIRouter()
 
-@router.post("/login", response_model=UserLoginResponse)
-async def user_login(payload: UserLoginRequest, db: Session = Depends(get_db)):
-    """用户登录/注册：首次登录分配固定队伍，后续保持不变。"""
-    try:
-        user = db.query(User).filter(User.anonymous_id == payload.anonymous_id).first()
-        if user:
-            # 若已有用户但未分配组（旧数据），为其补齐组名
-            if not user.group_name:
-                user.group_name = RingService.pick_group_for_user()
-                db.add(user)
-                db.commit()
-                db.refresh(user)
-            # 生成/获取群密钥
-            group = db.query(Group).filter(Group.name==user.group_name).first()
-            if not group:
-                secret = secrets.token_hex(32)
-                group = Group(name=user.group_name, secret=secret)
-                db.add(group); db.commit(); db.refresh(group)
-            return UserLoginResponse(
-                anonymous_id=user.anonymous_id,
-                public_key=user.public_key,
-                user_level=user.user_level,
-                group_name=user.group_name,
-                group_key=group.secret
-            )
+_LOGIN_COLUMNS = (User.anonymous_id, User.public_key, User.user_level, User.group_name)
 
-        # 首次：创建并分配队伍
-        group = RingService.pick_group_for_user()
-        user = User(
-            anonymous_id=payload.anonymous_id,
-            public_key=payload.public_key,
-            user_level=payload.user_level,
-            group_name=group
-        )
-        db.add(user)
-        db.commit()
-        db.refresh(user)
-        # 生成群密钥
-        grp = db.query(Group).filter(Group.name==user.group_name).first()
-        if not grp:
-            secret = secrets.token_hex(32)
-            grp = Group(name=user.group_name, secret=secret)
-            db.add(grp); db.commit(); db.refresh(grp)
+@lru_cache(maxsize=None)
+def _upsert_user_stmt(dialect_name: str):
+    """INSERT ... ON CONFLICT (anonymous_id) DO UPDATE ... WHERE group_name IS NULL RETURNING（按方言名缓存，
+    不持有引擎引用）：新用户按请求写入；已有用户只补齐缺失的组名（公钥、水平保持首次登录时的值）。"""
+    users = User.__table__
+    stmt = UPSERT_INSERTS[dialect_name](users).values(
+        anonymous_id=bindparam("anonymous_id"),
+        public_key=bindparam("public_key"),
+        public_key_valid=bindparam("public_key_valid"),
+        user_level=bindparam("user_level"),
+        group_name=bindparam("group_name")
+    )
+    return stmt.on_conflict_do_update(
+        index_elements=[users.c.anonymous_id],
+        set_={"group_name": stmt.excluded.group_name},
+        where=users.c.group_name.is_(None)
+    ).returning(*(users.c[col.key] for col in _LOGIN_COLUMNS))
+
+def _upsert_user(db, payload: UserLoginRequest, group_name: str):
+    """写入新用户或为旧用户补齐组名，返回用户行。
+    只有真正写入了 group_name 时才返回行，返回 None 说明该用户已有队伍（并发登录抢先），本次分配作废。"""
+    return db.execute(_upsert_user_stmt(db.get_bind().dialect.name), {
+        "anonymous_id": payload.anonymous_id,
+        "public_key": payload.public_key,
+        "public_key_valid": RingService._is_valid_secp256k1_compressed_hex(payload.public_key),
+        "user_level": payload.user_level,
+        "group_name": group_name,
+    }).first()
+
+def _register(db, payload: UserLoginRequest, user):
+    """登录的写入部分（同步会话，经 run_sync 一次执行，不提交）：
+    最少成员群组计数加一 + 用户 upsert + （仅旧组名未命中映射时）群组 upsert。返回 (用户行, 群密钥)。"""
+    if user is None or not user.group_name:
+        assigned = GroupService.assign_group(db)
+        user = _upsert_user(db, payload, assigned)
+        if user is None:
+            # 并发的同一用户登录已先分配了队伍，撤销本次计数并读取已有结果
+            GroupService.release_group(db, assigned)
+            user = db.execute(select(*_LOGIN_COLUMNS).where(User.anonymous_id == payload.anonymous_id)).one()
+    secret = GroupService.cached_secret(user.group_name)
+    if secret is None:
+        secret = GroupService.ensure_group(db, user.group_name)
+    return user, secret
 
+@router.post("/login", response_model=UserLoginResponse)
+async def user_login(payload: UserLoginRequest, db: AsyncSession = Depends(get_async_db)):
+    """用户登录/注册：首次登录分配固定队伍，后续保持不变。
+
+    已分配队伍的老用户只需一次主键查询（群密钥取自进程内映射）；其余情况在写锁内一个事务完成，一次提交。
+    """
+    try:
+        user = (await db.execute(select(*_LOGIN_COLUMNS).where(User.anonymous_id == payload.anonymous_id))).first()
+        secret = GroupService.cached_secret(user.group_name) if user is not None and user.group_name else None
+        if secret is None:
+            async with sqlite_write_lock(db):
+                user, secret = await db.run_sync(_register, payload, user)
+                await db.commit()
+            GroupService.remember(user.group_name, secret)
         return UserLoginResponse(
             anonymous_id=user.anonymous_id,
             public_key=user.public_key,
             user_level=user.user_level,
             group_name=user.group_name,
-            group_key=grp.secret
+            group_key=secret
         )
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(status_code=500, detail=f"登录失败: {str(e)}")
+
+@router.get("/group-sizes", response_model=dict)
+async def get_group_sizes(db: AsyncSession = Depends(get_async_db)):
+    """各群组当前成员数（只读 groups.member_count 计数列，不统计 users 表）。
+    计数与 users 表的核对开销随用户数增长，放在 scripts/check_group_stats.py 中执行。"""
+    try:
+        return await db.run_sync(GroupService.group_sizes)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"获取群组规模失败: {str(e)}")
@@ -14,6 +14,10 @@ class HeatmapDataCreate(BaseModel):
     anonymous_id: str
     data: List[HeatmapDataBase]  # 区块数据列表
 
+class HeatmapStreamRecord(HeatmapDataBase):
+    """NDJSON 流式导入的单条区块记录（一行一条）"""
+    anonymous_id: str
+
 class HeatmapDataResponse(BaseModel):
     """热力图数据响应模型"""
     x: int
@@ -56,6 +60,23 @@ class ScoreSubmitRing(BaseModel):
     average_pace: float
     signature: RingSignature
 
+class ScoreSubmitRingBatch(BaseModel):
+    """批量提交环签名成绩（离线客户端重连后集中上传）"""
+    items: List[ScoreSubmitRing]
+
+class ScoreBatchItemResult(BaseModel):
+    """批量提交中单条成绩的处理结果"""
+    index: int
+    ring_id: str
+    status: str             # accepted / rejected / replayed / not_found
+    detail: Optional[str] = None
+
+class ScoreBatchResponse(BaseModel):
+    """批量提交响应模型"""
+    accepted: int
+    rejected: int
+    results: List[ScoreBatchItemResult]
+
 class GroupScoreResponse(BaseModel):
     """群体成绩响应模型"""
     group_name: str
@@ -1,5 +1,6 @@
-"""Services package (crypto, ring, heatmap)."""
+"""Services package (crypto, ring, heatmap, leaderboard)."""
 
 from .crypto_service import CryptoService
 from .ring_service import RingService
 from .heatmap_service import HeatmapService
+from .leaderboard_service import LeaderboardService
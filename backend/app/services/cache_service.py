@@ -0,0 +1,80 @@
+import threading
+import time
+from collections import OrderedDict
+
+_MISSING = object()
+
+
+class TTLCache:
+    """进程内有界缓存：LRU 淘汰 + 可选 TTL 过期，线程安全，并统计命中/未命中。
+
+    注意：缓存仅在当前进程内有效，多 worker 部署时各进程独立，靠 TTL 兜底一致性。
+
+    每次 invalidate 递增 generation：调用方在计算前读取 generation 并传给 set，
+    计算期间发生过失效时回填被丢弃，过期结果不会覆盖失效。
+    """
+
+    def __init__(self, maxsize: int = 128, ttl: float = None):
+        self.maxsize = max(1, int(maxsize))
+        self.ttl = ttl if ttl is None or ttl > 0 else None
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self.stale_sets = 0
+        self.generation = 0
+
+    def get(self, key, default=None):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._data.get(key, _MISSING)
+            if entry is not _MISSING:
+                value, expires_at = entry
+                if expires_at is None or expires_at > now:
+                    self._data.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._data[key]
+            self.misses += 1
+            return default
+
+    def set(self, key, value, generation: int = None) -> bool:
+        """写入缓存；给出 generation 且其后已发生失效时不写入，返回是否写入。"""
+        expires_at = time.monotonic() + self.ttl if self.ttl else None
+        with self._lock:
+            if generation is not None and generation != self.generation:
+                self.stale_sets += 1
+                return False
+            self._data[key] = (value, expires_at)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+            return True
+
+    def invalidate(self, key=_MISSING) -> None:
+        """失效指定键；不传键时清空全部。"""
+        with self._lock:
+            if key is _MISSING:
+                self._data.clear()
+            else:
+                self._data.pop(key, None)
+            self.invalidations += 1
+            self.generation += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / total, 4) if total else 0.0,
+                "size": len(self._data),
+                "maxsize": self.maxsize,
+                "ttl": self.ttl,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+                "stale_sets": self.stale_sets,
+            }
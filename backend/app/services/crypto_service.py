@@ -3,54 +3,463 @@ import time
 import json
 from typing import List, Tuple
 import os
+import secrets
+import threading
+from concurrent.futures import ThreadPoolExecutor
 
+from app.services.cache_service import TTLCache
 # 简易椭圆曲线与环签名（Schnorr-like）实现（教学版）
-# 使用 coincurve (secp256k1) 做底层标量/点运算；生成的“环签名”不是生产级（缺少抗侧信道与严格域校验），仅供演示。
+# 底层 secp256k1 运算经由可插拔曲线后端（coincurve / 纯 Python / ecdsa）；生成的“环签名”不是生产级（缺少抗侧信道与严格域校验），仅供演示。
 
-# 可选依赖：coincurve 不可用时使用降级策略，保证服务可启动
+# 可选依赖：coincurve 不可用时自动改用纯 Python 后端，保证服务可启动且签名可验证
 try:
     import coincurve  # type: ignore
 except Exception:  # pragma: no cover - 环境缺少本地依赖时的降级路径
     coincurve = None
 
-# 次级可选依赖：ecdsa 作为备用生成有效 secp256k1 公私钥
+# 次级可选依赖：ecdsa 作为另一个可选曲线后端
 try:
     import ecdsa  # type: ignore
 except Exception:
     ecdsa = None
 
+# 环公钥解析缓存：ring_id → (公钥 hex 元组, 后端名, 解析后的点列表, L_serial)
+# 环写入后公钥集合不再变化，热门环的重复提交可跳过解压缩与序列化
+RING_KEY_CACHE_SIZE = int(os.getenv("RING_KEY_CACHE_SIZE", "1024"))
+_ring_key_cache = TTLCache(maxsize=RING_KEY_CACHE_SIZE)
+
+# 批量验证：并行线程数与每个任务的最大签名条数
+BATCH_VERIFY_WORKERS = int(os.getenv("BATCH_VERIFY_WORKERS", str(min(8, os.cpu_count() or 1))))
+BATCH_VERIFY_CHUNK = int(os.getenv("BATCH_VERIFY_CHUNK", "16"))
+
+# ====================== 可插拔曲线后端（secp256k1） ======================
+# 环签名只用到这几种运算：点解码/编码、k·G、k·P、P+Q，以及每一步的 s·G + c·P（mul_add）。
+# 约定：标量须在 [1, N) 内，结果为无穷远点或输入非法时抛 ValueError（与 coincurve 行为一致），
+# 保证各后端在边界情况下给出相同的验证结论。
+
+SECP256K1_P = 0xFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFEFFFFFC2F
+SECP256K1_N = 0xFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFEBAAEDCE6AF48A03BBFD25E8CD0364141
+SECP256K1_G = (
+    0x79BE667EF9DCBBAC55A06295CE870B07029BFCDB2DCE28D959F2815B16F81798,
+    0x483ADA7726A3C4655DA4FBFC0E1108A8FD17B448A68554199C47D08FFB10D4B8,
+)
+
+
+def _check_scalar(k: int) -> None:
+    if not 0 < k < SECP256K1_N:
+        raise ValueError("scalar out of range")
+
+
+class CurveBackend:
+    """曲线后端接口。点对象对调用方不透明，只能交回产生它的后端使用。"""
+
+    name = "abstract"
+
+    def decode_point(self, data: bytes):
+        """解析 SEC1 公钥（33 字节压缩 / 65 字节非压缩），不在曲线上时抛 ValueError。"""
+        raise NotImplementedError
+
+    def encode_point(self, point) -> bytes:
+        """33 字节压缩编码。"""
+        raise NotImplementedError
+
+    def base_mul(self, k: int):
+        """k·G"""
+        raise NotImplementedError
+
+    def point_mul(self, point, k: int):
+        """k·P"""
+        raise NotImplementedError
+
+    def add(self, p, q):
+        """P + Q（结果为无穷远点时抛 ValueError）"""
+        raise NotImplementedError
+
+    def mul_add(self, point, s: int, c: int):
+        """s·G + c·P（环签名每一步的核心运算）。默认分两次乘法再相加；纯 Python 后端覆盖为 Straus 联合乘法。"""
+        return self.add(self.base_mul(s), self.point_mul(point, c))
+
+
+class CoincurveBackend(CurveBackend):
+    """libsecp256k1（C 实现），最快。"""
+
+    name = "coincurve"
+
+    def decode_point(self, data: bytes):
+        return coincurve.PublicKey(data)
+
+    def encode_point(self, point) -> bytes:
+        return point.format(compressed=True)
+
+    def base_mul(self, k: int):
+        _check_scalar(k)
+        return coincurve.PublicKey.from_valid_secret(k.to_bytes(32, 'big'))
+
+    def point_mul(self, point, k: int):
+        _check_scalar(k)
+        return point.multiply(k.to_bytes(32, 'big'))
+
+    def add(self, p, q):
+        return coincurve.PublicKey.combine_keys([p, q])
+
+    def mul_add(self, point, s: int, c: int):
+        # 仍是两次库调用（c·P，再 tweak_add 计算 Q + s·G），并非联合多标量乘法；
+        # 只省去单独的 s·G 公钥对象与 combine_keys，实测验证约快 1.02-1.1 倍
+        _check_scalar(s)
+        _check_scalar(c)
+        return point.multiply(c.to_bytes(32, 'big')).add(s.to_bytes(32, 'big'))
+
+
+class EcdsaBackend(CurveBackend):
+    """python-ecdsa 的 PointJacobi（纯 Python，装有 gmpy2 时会自动加速）。"""
+
+    name = "ecdsa"
+
+    def __init__(self):
+        from ecdsa.ellipticcurve import INFINITY
+        self._infinity = INFINITY
+        self._curve = ecdsa.SECP256k1
+        self._g = ecdsa.SECP256k1.generator
+
+    def decode_point(self, data: bytes):
+        if len(data) not in (33, 65):
+            raise ValueError("invalid public key length")
+        try:
+            return ecdsa.VerifyingKey.from_string(data, curve=self._curve).pubkey.point
+        except Exception as e:
+            raise ValueError(f"invalid public key: {e}")
+
+    def encode_point(self, point) -> bytes:
+        if point == self._infinity:
+            raise ValueError("point at infinity")
+        return point.to_bytes('compressed')
+
+    def base_mul(self, k: int):
+        _check_scalar(k)
+        return self._g * k
+
+    def point_mul(self, point, k: int):
+        _check_scalar(k)
+        return point * k
+
+    def add(self, p, q):
+        r = p + q
+        if r == self._infinity:
+            raise ValueError("point at infinity")
+        return r
+
+
+# ---- 纯 Python 实现：Jacobian 坐标 (X, Y, Z) 表示仿射点 (X/Z², Y/Z³)，Z == 0 为无穷远点 ----
+_INF = (0, 1, 0)
+
+
+def _jac_double(pt):
+    # a = 0 时的倍点公式（dbl-2009-l）
+    X1, Y1, Z1 = pt
+    if not Y1 or not Z1:
+        return _INF
+    p = SECP256K1_P
+    YY = Y1 * Y1 % p
+    S = 4 * X1 * YY % p
+    M = 3 * X1 * X1 % p
+    X3 = (M * M - 2 * S) % p
+    return X3, (M * (S - X3) - 8 * YY * YY) % p, 2 * Y1 * Z1 % p
+
+
+def _jac_add(a, b):
+    X1, Y1, Z1 = a
+    X2, Y2, Z2 = b
+    if not Z1:
+        return b
+    if not Z2:
+        return a
+    p = SECP256K1_P
+    Z1Z1 = Z1 * Z1 % p
+    Z2Z2 = Z2 * Z2 % p
+    U1 = X1 * Z2Z2 % p
+    S1 = Y1 * Z2 * Z2Z2 % p
+    H = (X2 * Z1Z1 - U1) % p
+    R = (Y2 * Z1 * Z1Z1 - S1) % p
+    if not H:
+        return _jac_double(a) if not R else _INF
+    HH = H * H % p
+    HHH = H * HH % p
+    V = U1 * HH % p
+    X3 = (R * R - HHH - 2 * V) % p
+    return X3, (R * (V - X3) - S1 * HHH) % p, Z1 * Z2 * H % p
+
+
+def _jac_add_affine(a, x2, y2):
+    # 混合加法：第二个点为仿射坐标（Z = 1），省去若干乘法
+    X1, Y1, Z1 = a
+    if not Z1:
+        return x2, y2, 1
+    p = SECP256K1_P
+    Z1Z1 = Z1 * Z1 % p
+    H = (x2 * Z1Z1 - X1) % p
+    R = (y2 * Z1 * Z1Z1 - Y1) % p
+    if not H:
+        return _jac_double(a) if not R else _INF
+    HH = H * H % p
+    HHH = H * HH % p
+    V = X1 * HH % p
+    X3 = (R * R - HHH - 2 * V) % p
+    return X3, (R * (V - X3) - Y1 * HHH) % p, Z1 * H % p
+
+
+def _batch_to_affine(points):
+    """Montgomery 批量求逆：n 个（非无穷远）点只做一次模逆。"""
+    p = SECP256K1_P
+    prefix = []
+    acc = 1
+    for _, _, Z in points:
+        acc = acc * Z % p
+        prefix.append(acc)
+    inv = pow(acc, -1, p)
+    out = [None] * len(points)
+    for i in range(len(points) - 1, -1, -1):
+        X, Y, Z = points[i]
+        zi = inv * prefix[i - 1] % p if i else inv
+        inv = inv * Z % p
+        zi2 = zi * zi % p
+        out[i] = (X * zi2 % p, Y * zi2 * zi % p)
+    return out
+
+
+def _wnaf(k: int, width: int) -> list:
+    """宽度为 width 的 wNAF 表示（低位在前），非零位均为奇数且 |d| < 2^(width-1)。"""
+    digits = []
+    full = 1 << width
+    half = full >> 1
+    mask = full - 1
+    while k:
+        if k & 1:
+            d = k & mask
+            if d >= half:
+                d -= full
+            k -= d
+        else:
+            d = 0
+        digits.append(d)
+        k >>= 1
+    return digits
+
+
+class PurePythonBackend(CurveBackend):
+    """纯 Python secp256k1，无本地依赖（coincurve 装不上的 ARM 主机等）。
+
+    - Jacobian 坐标：加法/倍点不做模逆，只在编码时求逆一次
+    - 变基点 k·P：wNAF（宽度 WNAF_WIDTH），奇数倍点表批量归一为仿射后用混合加法
+    - 定基点 k·G：按 G_WINDOW 位分窗的预计算表 j·2^(w·i)·G，只做加法不做倍点；首次使用时构建
+    - s·G + c·P：Straus 联合乘法，两个 wNAF 共用一条倍点链；G 侧使用预计算的奇数倍点表（宽度 STRAUS_G_WIDTH）
+    """
+
+    name = "pure"
+    WNAF_WIDTH = 5
+    G_WINDOW = 8
+    STRAUS_G_WIDTH = 8
+
+    def __init__(self):
+        self._g_table = None
+        self._g_odd = None
+        self._lock = threading.Lock()
+
+    def decode_point(self, data: bytes):
+        p = SECP256K1_P
+        if len(data) == 33 and data[0] in (2, 3):
+            x = int.from_bytes(data[1:], 'big')
+            if x >= p:
+                raise ValueError("invalid public key")
+            rhs = (x * x * x + 7) % p
+            y = pow(rhs, (p + 1) // 4, p)
+            if y * y % p != rhs:
+                raise ValueError("point not on curve")
+            if (y & 1) != (data[0] & 1):
+                y = p - y
+        elif len(data) == 65 and data[0] == 4:
+            x = int.from_bytes(data[1:33], 'big')
+            y = int.from_bytes(data[33:], 'big')
+            if x >= p or y >= p or (y * y - x * x * x - 7) % p:
+                raise ValueError("point not on curve")
+        else:
+            raise ValueError("invalid public key")
+        return x, y, 1
+
+    def encode_point(self, point) -> bytes:
+        X, Y, Z = point
+        if not Z:
+            raise ValueError("point at infinity")
+        p = SECP256K1_P
+        if Z == 1:
+            x, y = X, Y
+        else:
+            zi = pow(Z, -1, p)
+            zi2 = zi * zi % p
+            x, y = X * zi2 % p, Y * zi2 * zi % p
+        return bytes([2 | (y & 1)]) + x.to_bytes(32, 'big')
+
+    def _base_table(self):
+        if self._g_table is None:
+            with self._lock:
+                if self._g_table is None:
+                    w = self.G_WINDOW
+                    rows = -(-256 // w)
+                    points = []
+                    base = (SECP256K1_G[0], SECP256K1_G[1], 1)
+                    for _ in range(rows):
+                        acc = base
+                        points.append(acc)
+                        for _ in range((1 << w) - 2):
+                            acc = _jac_add(acc, base)
+                            points.append(acc)
+                        base = _jac_add(acc, base)
+                    flat = _batch_to_affine(points)
+                    size = (1 << w) - 1
+                    self._g_table = [flat[i * size:(i + 1) * size] for i in range(rows)]
+        return self._g_table
+
+    def base_mul(self, k: int):
+        _check_scalar(k)
+        table = self._base_table()
+        w = self.G_WINDOW
+        mask = (1 << w) - 1
+        acc = _INF
+        for row in table:
+            d = k & mask
+            if d:
+                x, y = row[d - 1]
+                acc = _jac_add_affine(acc, x, y)
+            k >>= w
+        return acc
+
+    @staticmethod
+    def _odd_multiples(point, width: int) -> list:
+        """奇数倍点表 P, 3P, 5P, ..., (2^(width-1)-1)P，批量归一为仿射坐标。"""
+        double = _jac_double(point)
+        odd = [point]
+        for _ in range((1 << (width - 2)) - 1):
+            odd.append(_jac_add(odd[-1], double))
+        return _batch_to_affine(odd)
+
+    def _base_odd_multiples(self):
+        if self._g_odd is None:
+            with self._lock:
+                if self._g_odd is None:
+                    g = (SECP256K1_G[0], SECP256K1_G[1], 1)
+                    self._g_odd = self._odd_multiples(g, self.STRAUS_G_WIDTH)
+        return self._g_odd
+
+    def point_mul(self, point, k: int):
+        _check_scalar(k)
+        p = SECP256K1_P
+        odd = self._odd_multiples(point, self.WNAF_WIDTH)
+        acc = _INF
+        for d in reversed(_wnaf(k, self.WNAF_WIDTH)):
+            acc = _jac_double(acc)
+            if d > 0:
+                x, y = odd[d >> 1]
+                acc = _jac_add_affine(acc, x, y)
+            elif d < 0:
+                x, y = odd[(-d) >> 1]
+                acc = _jac_add_affine(acc, x, p - y)
+        return acc
+
+    def mul_add(self, point, s: int, c: int):
+        _check_scalar(s)
+        _check_scalar(c)
+        p = SECP256K1_P
+        g_odd = self._base_odd_multiples()
+        p_odd = self._odd_multiples(point, self.WNAF_WIDTH)
+        ds = _wnaf(s, self.STRAUS_G_WIDTH)
+        dc = _wnaf(c, self.WNAF_WIDTH)
+        n = max(len(ds), len(dc))
+        ds += [0] * (n - len(ds))
+        dc += [0] * (n - len(dc))
+        acc = _INF
+        for i in range(n - 1, -1, -1):
+            acc = _jac_double(acc)
+            d = dc[i]
+            if d > 0:
+                x, y = p_odd[d >> 1]
+                acc = _jac_add_affine(acc, x, y)
+            elif d < 0:
+                x, y = p_odd[(-d) >> 1]
+                acc = _jac_add_affine(acc, x, p - y)
+            d = ds[i]
+            if d > 0:
+                x, y = g_odd[d >> 1]
+                acc = _jac_add_affine(acc, x, y)
+            elif d < 0:
+                x, y = g_odd[(-d) >> 1]
+                acc = _jac_add_affine(acc, x, p - y)
+        if not acc[2]:
+            raise ValueError("point at infinity")
+        return acc
+
+    def add(self, p, q):
+        r = _jac_add(p, q)
+        if not r[2]:
+            raise ValueError("point at infinity")
+        return r
+
+
+_CURVE_BACKENDS = {
+    "coincurve": CoincurveBackend,
+    "ecdsa": EcdsaBackend,
+    "pure": PurePythonBackend,
+}
+# 后端选择：auto（按 coincurve → pure → ecdsa 的顺序取第一个可用的）或指定名称
+CURVE_BACKEND = os.getenv("CRYPTO_CURVE_BACKEND", "auto")
+_curve_backend = None
+
+
+def available_curve_backends() -> List[str]:
+    """当前环境可用的后端，按 auto 模式的优先级排列。"""
+    names = []
+    if coincurve is not None:
+        names.append("coincurve")
+    names.append("pure")
+    if ecdsa is not None:
+        names.append("ecdsa")
+    return names
+
+
+def make_curve_backend(name: str) -> CurveBackend:
+    if name not in _CURVE_BACKENDS:
+        raise ValueError(f"unknown curve backend: {name}")
+    if name not in available_curve_backends():
+        raise RuntimeError(f"curve backend not installed: {name}")
+    return _CURVE_BACKENDS[name]()
+
+
+def get_curve_backend() -> CurveBackend:
+    """进程内当前后端，首次使用时按 CRYPTO_CURVE_BACKEND 创建。"""
+    global _curve_backend
+    if _curve_backend is None:
+        name = available_curve_backends()[0] if CURVE_BACKEND == "auto" else CURVE_BACKEND
+        _curve_backend = make_curve_backend(name)
+    return _curve_backend
+
+
+def set_curve_backend(name: str) -> CurveBackend:
+    """切换当前后端（基准测试 / 运维排障用）；解析缓存按后端区分，无需清空。"""
+    global _curve_backend
+    _curve_backend = make_curve_backend(name)
+    return _curve_backend
+
+
 class CryptoService:
     """简化的环签名密码学服务（演示用）。"""
 
     @staticmethod
     def generate_keypair():
-        if coincurve is not None:
-            private_key = coincurve.PrivateKey()
-            public_key = private_key.public_key
-            return {
-                'private_key': private_key.secret.hex(),
-                'public_key': public_key.format(compressed=True).hex()
-            }
-        # Fallback: 使用 ecdsa 生成有效 secp256k1 公私钥（压缩公钥）
-        if ecdsa is not None:
-            sk = ecdsa.SigningKey.generate(curve=ecdsa.SECP256k1)
-            vk = sk.get_verifying_key()
-            # 构造压缩公钥：前缀 0x02/0x03 + x
-            x_int = int.from_bytes(vk.pubkey.point.x().to_bytes(32, 'big'), 'big')
-            y_int = int(vk.pubkey.point.y())
-            prefix = b'\x03' if (y_int & 1) else b'\x02'
-            pub_compressed = prefix + x_int.to_bytes(32, 'big')
-            return {
-                'private_key': sk.to_string().hex(),
-                'public_key': pub_compressed.hex()
-            }
-        # 最差降级：保持旧行为，但注意这些公钥不一定可用于曲线验证
-        ts = str(int(time.time() * 1000))
-        fake_priv = hashlib.sha256((ts + "priv").encode()).hexdigest()
-        # 用 02 前缀 + 随机 32 字节确保形式上像压缩公钥，但可能不在曲线上
-        fake_x = hashlib.sha256((ts + "x").encode()).digest()
-        fake_pub = (b'\x02' + fake_x).hex()
-        return {'private_key': fake_priv, 'public_key': fake_pub}
+        """随机生成 secp256k1 私钥与 33 字节压缩公钥（hex）。"""
+        backend = get_curve_backend()
+        secret = secrets.randbelow(SECP256K1_N - 1) + 1
+        return {
+            'private_key': f"{secret:064x}",
+            'public_key': backend.encode_point(backend.base_mul(secret)).hex()
+        }
 
     @staticmethod
     def simulate_ring_signature(message: str, private_key_hex: str, public_keys: List[str]) -> str:
@@ -83,43 +492,45 @@ class CryptoService:
 
     # ====================== 真正（教学版）Schnorr 风格环签名 ======================
     @staticmethod
-    def ring_sign(message: bytes, priv_key_hex: str, ring_pubkeys_hex: List[str]) -> Tuple[str, List[str]]:
+    def ring_sign(message: bytes, priv_key_hex: str, ring_pubkeys_hex: List[str],
+                  backend: CurveBackend = None) -> Tuple[str, List[str]]:
         """生成一个简单 Schnorr-like ring signature.
         返回 (c0_hex, s_list_hex)。
         说明：
           - 采用经典构造：随机挑选起点索引 i，生成随机 k；计算环上逐一挑战/响应。
           - 哈希域：sha256(message || L || R_i || P_i ... ) 简化。
           - 非生产：未做 cofactors / 序列化校验；未防 key 重复；未添加 key image（因此不可检测重复）。
+        backend 缺省为当前曲线后端。
         """
-        if coincurve is None:
-            raise RuntimeError("缺少 coincurve，无法生成真实环签名")
-        from coincurve import PrivateKey, PublicKey
-        ORDER = 0xFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFEBAAEDCE6AF48A03BBFD25E8CD0364141
+        backend = backend or get_curve_backend()
+        ORDER = SECP256K1_N
         ring_size = len(ring_pubkeys_hex)
         if ring_size < 2:
             raise ValueError("环大小至少为2")
 
-        # 将公钥解析为 PublicKey 对象
-        ring_pubs = [PublicKey(bytes.fromhex(pk)) for pk in ring_pubkeys_hex]
+        # 将公钥解析为后端点对象
+        ring_pubs = [backend.decode_point(bytes.fromhex(pk)) for pk in ring_pubkeys_hex]
+        ring_serial = [backend.encode_point(p) for p in ring_pubs]
         # 私钥
-        sk = PrivateKey.from_hex(priv_key_hex)
-        pk_bytes = sk.public_key.format(compressed=True)
+        x = int(priv_key_hex, 16)
+        _check_scalar(x)
+        my_pub = backend.base_mul(x)
+        pk_bytes = backend.encode_point(my_pub)
         # 找到自己在环中的索引（若未包含，视为匿名：添加自己的公钥）
         try:
-            idx = [p.format(compressed=True) for p in ring_pubs].index(pk_bytes)
+            idx = ring_serial.index(pk_bytes)
         except ValueError:
-            ring_pubs.append(sk.public_key)
+            ring_pubs.append(my_pub)
+            ring_serial.append(pk_bytes)
             ring_pubkeys_hex.append(pk_bytes.hex())
             idx = len(ring_pubs) - 1
             ring_size += 1
 
-        import secrets
         # 随机挑选起点索引 start（论文里常以 i+1 mod n 开始闭合）
         start = (idx + 1) % ring_size
         # 随机 k
         k = (secrets.randbits(256) % ORDER) or 1
-        k_bytes = k.to_bytes(32, 'big')
-        R = coincurve.PublicKey.from_valid_secret(k_bytes).format(compressed=True)
+        R = backend.encode_point(backend.base_mul(k))
 
         c = [b'' for _ in range(ring_size)]
         s = [0 for _ in range(ring_size)]
@@ -131,7 +542,7 @@ class CryptoService:
                 h.update(pt)
             return h.digest()
 
-        L_serial = b''.join([p.format(compressed=True) for p in ring_pubs])
+        L_serial = b''.join(ring_serial)
         c[start] = H(message, L_serial, R)
 
         # 向后遍历直到回到 idx
@@ -140,20 +551,16 @@ class CryptoService:
             j_next = (j + 1) % ring_size
             # 随机 s_j
             s[j] = (secrets.randbits(256) % ORDER) or 1
-            Pj = ring_pubs[j]
             # R = s_j*G + c_j*P_j
-            R1 = coincurve.PublicKey.from_valid_secret(s[j].to_bytes(32, 'big'))
             cj_int = int.from_bytes(c[j], 'big') % ORDER
-            R2 = Pj.multiply(cj_int.to_bytes(32, 'big'))
-            R_point = coincurve.PublicKey.combine_keys([R1, R2])
-            c[j_next] = H(message, L_serial, R_point.format(compressed=True))
+            R_point = CryptoService._ring_point(backend, ring_pubs[j], s[j], cj_int)
+            c[j_next] = H(message, L_serial, R_point)
             j = j_next
 
         # 现在 j == idx，计算自己的 s_idx，使得：
         # c[start] == H(message, L, s_idx*G + c_idx*P_idx)
         cj_int = int.from_bytes(c[idx], 'big') % ORDER
         # s_idx = k - c_idx * x  (mod order)
-        x = int.from_bytes(sk.secret, 'big') % ORDER
         s[idx] = (k - (cj_int * x) % ORDER) % ORDER
         # 闭合：确保 c[start] 已定义，返回 c0 = c[0]（或按论文用 c[start] 也可，此处取序号0一致性）
         c0_hex = c[0].hex() if c[0] else c[start].hex()
@@ -161,41 +568,128 @@ class CryptoService:
         return c0_hex, s_hex_list
 
     @staticmethod
-    def ring_verify(message: bytes, ring_pubkeys_hex: List[str], c0_hex: str, s_list_hex: List[str]) -> bool:
+    def _ring_point(backend: CurveBackend, pub, s_int: int, c_int: int) -> bytes:
+        """环上一步：返回 s·G + c·P 的压缩编码（签名与验证共用），由后端做联合多标量乘法。"""
+        return backend.encode_point(backend.mul_add(pub, s_int, c_int))
+
+    @staticmethod
+    def _parse_ring(ring_pubkeys_hex: List[str], ring_id: str = None, backend: CurveBackend = None):
+        """解析环公钥并序列化 L_serial，返回 (ring_pubs, L_serial)。
+        给出 ring_id 时走有界 LRU 缓存；缓存项会核对公钥列表与后端，防止同名环内容不一致。
+        """
+        backend = backend or get_curve_backend()
+        key_tuple = tuple(ring_pubkeys_hex)
+        if ring_id is not None:
+            entry = _ring_key_cache.get(ring_id)
+            if entry is not None and entry[0] == key_tuple and entry[1] == backend.name:
+                return entry[2], entry[3]
+        ring_pubs = [backend.decode_point(bytes.fromhex(pk)) for pk in ring_pubkeys_hex]
+        L_serial = b''.join([backend.encode_point(p) for p in ring_pubs])
+        if ring_id is not None:
+            _ring_key_cache.set(ring_id, (key_tuple, backend.name, ring_pubs, L_serial))
+        return ring_pubs, L_serial
+
+    @staticmethod
+    def ring_key_cache_stats() -> dict:
+        return _ring_key_cache.stats()
+
+    @staticmethod
+    def ring_verify(message: bytes, ring_pubkeys_hex: List[str], c0_hex: str, s_list_hex: List[str],
+                    ring_id: str = None, backend: CurveBackend = None) -> bool:
         """验证教学版 Schnorr-like 环签名。
         由于上面 sign 过程对椭圆曲线加法做了“hash 混合”近似，这里复现同样流程；安全性远低于正式算法。
+        传入 ring_id 时复用缓存的已解析公钥与 L_serial。
         """
-        if coincurve is None:
+        backend = backend or get_curve_backend()
+        try:
+            ring_pubs, L_serial = CryptoService._parse_ring(ring_pubkeys_hex, ring_id, backend)
+        except Exception:
             return False
-        from coincurve import PublicKey
-        ORDER = 0xFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFEBAAEDCE6AF48A03BBFD25E8CD0364141
+        return CryptoService._verify_parsed(message, ring_pubs, L_serial, c0_hex, s_list_hex, backend)
+
+    @staticmethod
+    def _verify_parsed(message: bytes, ring_pubs: list, L_serial: bytes, c0_hex: str, s_list_hex: List[str],
+                       backend: CurveBackend) -> bool:
+        """在已解析的环公钥上验证签名（ring_verify 与批量验证共用）。"""
+        ORDER = SECP256K1_N
         try:
-            ring_pubs = [PublicKey(bytes.fromhex(pk)) for pk in ring_pubkeys_hex]
             n = len(ring_pubs)
             if n < 2:
                 return False
-            c = [b'' for _ in range(n)]
-            c[0] = bytes.fromhex(c0_hex)
             s_vals = [int(x,16) % ORDER for x in s_list_hex]
             if len(s_vals) != n:
                 return False
-            def H(*parts):
-                h = hashlib.sha256(); [h.update(p) for p in parts]; return h.digest()
-            L_serial = b''.join([p.format(compressed=True) for p in ring_pubs])
-            for j in range(n-1):
-                R1 = coincurve.PublicKey.from_valid_secret(s_vals[j].to_bytes(32,'big'))
-                R2 = ring_pubs[j].multiply((int.from_bytes(c[j],'big') % ORDER).to_bytes(32,'big'))
-                R_point = coincurve.PublicKey.combine_keys([R1, R2])
-                c[j+1] = H(message, L_serial, R_point.format(compressed=True))
-            # 闭合：最后一轮
-            R1 = coincurve.PublicKey.from_valid_secret(s_vals[-1].to_bytes(32,'big'))
-            R2 = ring_pubs[-1].multiply((int.from_bytes(c[-1],'big') % ORDER).to_bytes(32,'big'))
-            R_point = coincurve.PublicKey.combine_keys([R1, R2])
-            c_closure = H(message, L_serial, R_point.format(compressed=True))
-            return c_closure.hex() == c0_hex
+            # 从 c0 出发绕环一周，最后一轮得到的挑战须与 c0 闭合
+            c = bytes.fromhex(c0_hex)
+            for j in range(n):
+                c_int = int.from_bytes(c, 'big') % ORDER
+                R_point = CryptoService._ring_point(backend, ring_pubs[j], s_vals[j], c_int)
+                h = hashlib.sha256()
+                h.update(message); h.update(L_serial); h.update(R_point)
+                c = h.digest()
+            return c.hex() == c0_hex
         except Exception:
             return False
 
+    @staticmethod
+    def ring_verify_many(ring_pubkeys_hex: List[str], ring_id: str, signatures: List[Tuple[bytes, str, List[str]]]) -> List[bool]:
+        """同一个环上的多条签名：公钥只解析一次，逐条验证。signatures 为 [(message, c0_hex, s_list_hex), ...]。"""
+        backend = get_curve_backend()
+        try:
+            ring_pubs, L_serial = CryptoService._parse_ring(ring_pubkeys_hex, ring_id, backend)
+        except Exception:
+            return [False] * len(signatures)
+        return [
+            CryptoService._verify_parsed(message, ring_pubs, L_serial, c0_hex, s_list_hex, backend)
+            for message, c0_hex, s_list_hex in signatures
+        ]
+
+    @staticmethod
+    def plan_verify_batch(items: List[Tuple[bytes, List[str], str, List[str], str]]) -> list:
+        """把批量验证切成任务：先按 ring_id 分组，再切成不超过 BATCH_VERIFY_CHUNK 条的块。
+
+        返回 [(ring_pubkeys_hex, ring_id, [(原下标, (message, c0_hex, s_list_hex)), ...]), ...]。
+        """
+        groups = {}
+        for idx, (message, pubkeys, c0_hex, s_list_hex, ring_id) in enumerate(items):
+            key = ring_id if ring_id is not None else tuple(pubkeys)
+            group = groups.setdefault(key, (pubkeys, ring_id, []))
+            group[2].append((idx, (message, c0_hex, s_list_hex)))
+
+        tasks = []
+        for pubkeys, ring_id, entries in groups.values():
+            for start in range(0, len(entries), BATCH_VERIFY_CHUNK):
+                tasks.append((pubkeys, ring_id, entries[start:start + BATCH_VERIFY_CHUNK]))
+        return tasks
+
+    @staticmethod
+    def ring_verify_batch(items: List[Tuple[bytes, List[str], str, List[str], str]], max_workers: int = None) -> List[bool]:
+        """批量验证环签名，按输入顺序返回每条的结果。
+
+        items 为 [(message, ring_pubkeys_hex, c0_hex, s_list_hex, ring_id), ...]。
+        按 plan_verify_batch 分组切块，使每个环的公钥只解析一次，各块交给线程池并行验证
+        （coincurve 底层调用会释放 GIL）。供脚本等同步调用方使用；API 路径走 verify_pool。
+        """
+        if not items:
+            return []
+        tasks = CryptoService.plan_verify_batch(items)
+
+        def run(task):
+            pubkeys, ring_id, entries = task
+            return CryptoService.ring_verify_many(pubkeys, ring_id, [sig for _, sig in entries])
+
+        workers = max(1, int(max_workers or BATCH_VERIFY_WORKERS))
+        verdicts = [False] * len(items)
+        if workers == 1 or len(tasks) == 1:
+            outcomes = map(run, tasks)
+        else:
+            with ThreadPoolExecutor(max_workers=min(workers, len(tasks))) as pool:
+                outcomes = list(pool.map(run, tasks))
+        for (_, _, entries), results in zip(tasks, outcomes):
+            for (idx, _), ok in zip(entries, results):
+                verdicts[idx] = ok
+        return verdicts
+
     @staticmethod
     def generate_ring_id():
         timestamp = str(int(time.time() * 1000))
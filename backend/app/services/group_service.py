@@ -0,0 +1,158 @@
+import secrets
+import threading
+from functools import lru_cache
+from typing import Iterable, Optional
+
+from sqlalchemy import bindparam, func, select, update
+from sqlalchemy.orm import Session
+
+from app.database import dialect_insert
+from app.models import AppMeta, Group, User
+from app.services.ring_service import RingService
+
+
+class GroupService:
+    """群组与群密钥：群组集合固定（RingService.GROUP_NAMES），密钥在启动时一次性写入并读入进程内映射，
+    登录与 HMAC 成绩提交直接查映射，不再每次查 groups 表。
+
+    多个 worker 同时启动时均以 INSERT ... ON CONFLICT DO NOTHING 写入后再读回，拿到的是同一份密钥。
+
+    新用户按最少成员优先分配队伍：groups.member_count 在分配时与用户写入同事务原子递增，
+    登录时不统计 users 表。
+    """
+
+    # 旧库升级后成员计数一次性回填完成的标记（app_meta）
+    MEMBER_COUNT_MARKER = "group_member_counts_backfilled"
+
+    _secrets = {}
+    _ids = {}
+    _lock = threading.Lock()
+
+    @staticmethod
+    def bootstrap(db: Session, names: Iterable[str] = None) -> int:
+        """确保固定群组都已有密钥（已存在的保持不变）并载入映射，返回映射中的群组数。"""
+        names = list(names or RingService.GROUP_NAMES)
+        if names:
+            stmt = dialect_insert(db, Group).values(
+                [{"name": name, "secret": secrets.token_hex(32)} for name in names]
+            ).on_conflict_do_nothing(index_elements=[Group.name])
+            db.execute(stmt)
+            db.commit()
+        rows = db.execute(select(Group.id, Group.name, Group.secret)).all()
+        with GroupService._lock:
+            GroupService._secrets.update({name: secret for _, name, secret in rows})
+            GroupService._ids.update({name: group_id for group_id, name, _ in rows})
+            return len(GroupService._secrets)
+
+    @staticmethod
+    def cached_secret(group_name: str) -> Optional[str]:
+        return GroupService._secrets.get(group_name)
+
+    @staticmethod
+    def cached_group_id(group_name: str) -> Optional[int]:
+        return GroupService._ids.get(group_name)
+
+    @staticmethod
+    def remember(group_name: str, secret: str, group_id: int = None) -> None:
+        """事务提交后登记群密钥（未提交的密钥不能进入映射，否则回滚后与库中不一致）。"""
+        with GroupService._lock:
+            GroupService._secrets[group_name] = secret
+            if group_id is not None:
+                GroupService._ids[group_name] = group_id
+
+    @staticmethod
+    def ensure_group(db: Session, group_name: str) -> str:
+        """映射未命中时（不在固定集合中的旧组名）在当前事务中补建群组并返回密钥（不提交）。"""
+        stmt = dialect_insert(db, Group).values(
+            name=group_name, secret=secrets.token_hex(32)
+        ).on_conflict_do_nothing(index_elements=[Group.name])
+        db.execute(stmt)
+        return db.execute(select(Group.secret).where(Group.name == group_name)).scalar_one()
+
+    @staticmethod
+    def assign_group(db: Session) -> str:
+        """最少成员优先：一条 UPDATE ... RETURNING 选出成员数最少的固定群组并把计数加一（不提交）。
+
+        选择与递增在同一语句内完成：SQLite 写入串行执行；PostgreSQL 的子查询加 FOR UPDATE SKIP LOCKED，
+        并发登录会各自锁定不同的群组，所有行都被锁住时再退回阻塞等待。计数始终精确，分配结果在
+        并发下至多与理想值相差在途登录数。
+        """
+        name = (db.execute(_assign_stmt(skip_locked=True)).scalar_one_or_none()
+                or db.execute(_assign_stmt(skip_locked=False)).scalar_one_or_none())
+        if name is None:
+            raise RuntimeError("groups 表中没有可分配的群组，请先执行 GroupService.bootstrap")
+        return name
+
+    @staticmethod
+    def release_group(db: Session, group_name: str) -> None:
+        """撤销一次分配（并发登录中另一请求已为该用户分配了队伍时调用，不提交）。"""
+        db.execute(_release_stmt(), {"group_name": group_name})
+
+    @staticmethod
+    def backfill_member_counts(db: Session, force: bool = False) -> bool:
+        """按 users 表重算 member_count 并提交。默认只在首次升级时执行一次（app_meta 标记），
+        多个 worker 同时启动时只有插入标记成功的一个执行。返回是否执行了回填。"""
+        if not force:
+            marker = dialect_insert(db, AppMeta).values(
+                key=GroupService.MEMBER_COUNT_MARKER
+            ).on_conflict_do_nothing(index_elements=[AppMeta.key])
+            if (db.execute(marker).rowcount or 0) == 0:
+                db.rollback()
+                return False
+        counted = select(func.count(User.id)).where(User.group_name == Group.name).correlate(Group).scalar_subquery()
+        db.execute(update(Group).values(member_count=counted).execution_options(synchronize_session=False))
+        db.commit()
+        return True
+
+    @staticmethod
+    def group_sizes(db: Session, verify: bool = False) -> dict:
+        """各群组当前成员数（读计数列）；verify=True 时另行统计 users 表并列出不一致的群组。"""
+        rows = db.execute(select(Group.name, Group.member_count).order_by(Group.member_count.desc(), Group.name)).all()
+        sizes = [{"group_name": name, "member_count": int(count or 0)} for name, count in rows]
+        fixed = [s["member_count"] for s in sizes if s["group_name"] in RingService.GROUP_NAMES]
+        result = {
+            "groups": sizes,
+            "total": sum(s["member_count"] for s in sizes),
+            "spread": (max(fixed) - min(fixed)) if fixed else 0,
+        }
+        if verify:
+            counted = dict(db.execute(
+                select(User.group_name, func.count(User.id)).where(User.group_name.isnot(None)).group_by(User.group_name)
+            ).all())
+            result["drift"] = [
+                {"group_name": s["group_name"], "member_count": s["member_count"], "users": int(counted.get(s["group_name"], 0))}
+                for s in sizes if s["member_count"] != counted.get(s["group_name"], 0)
+            ]
+        return result
+
+    @staticmethod
+    def lookup_secret(db: Session, group_name: str) -> Optional[str]:
+        """只读查询群密钥（先查映射，未命中时连同群组 id 一起读入）；群组不存在时返回 None。"""
+        secret = GroupService.cached_secret(group_name)
+        if secret is None or GroupService.cached_group_id(group_name) is None:
+            row = db.execute(select(Group.id, Group.secret).where(Group.name == group_name)).one_or_none()
+            if row is None:
+                return None
+            GroupService.remember(group_name, row.secret, row.id)
+            secret = row.secret
+        return secret
+
+
+# 登录热路径上的语句预先构建并缓存（基于 Core 表，绕过 ORM 批量更新；构建开销大于执行本身）
+@lru_cache(maxsize=None)
+def _assign_stmt(skip_locked: bool):
+    groups = Group.__table__
+    target = select(groups.c.id).where(groups.c.name.in_(RingService.GROUP_NAMES)).order_by(
+        groups.c.member_count, groups.c.id
+    ).limit(1).with_for_update(skip_locked=skip_locked).scalar_subquery()
+    return update(groups).where(groups.c.id == target).values(
+        member_count=groups.c.member_count + 1
+    ).returning(groups.c.name)
+
+
+@lru_cache(maxsize=None)
+def _release_stmt():
+    groups = Group.__table__
+    return update(groups).where(groups.c.name == bindparam("group_name")).values(
+        member_count=groups.c.member_count - 1
+    )
@@ -1,38 +1,348 @@
+import os
+import struct
+from datetime import datetime, timezone
 from sqlalchemy.orm import Session
-from sqlalchemy import func
-from app.models import HeatmapData
+from sqlalchemy import func, insert, delete, literal, or_, and_, Integer
+from app.database import dialect_insert
+from app.models import HeatmapData, HeatmapCell, HeatmapRollup, HeatmapBucket
+
+# 可选依赖：numpy 可用时热力图读取路径走列式向量化计算
+try:
+    import numpy as np  # type: ignore
+except Exception:  # pragma: no cover - 缺少 numpy 时退回逐元素实现
+    np = None
+
+HOUR = 3600
+DAY = 86400
+
+
+def _epoch_seconds(dt: datetime) -> int:
+    """datetime → UTC 纪元秒；SQLite 读回的无时区时间按 UTC 处理。"""
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return int(dt.timestamp())
 
 class HeatmapService:
     """热力图数据服务：存储与聚合（前端已做差分隐私）。"""
 
+    # 批量写入时单条 executemany 的最大行数，可通过环境变量覆盖
+    BULK_BATCH_SIZE = int(os.getenv("HEATMAP_BULK_BATCH_SIZE", "500"))
+    # 预汇总的最大缩放级别：level 级超级区块边长 2^level
+    MAX_ZOOM_LEVEL = int(os.getenv("HEATMAP_MAX_ZOOM_LEVEL", "6"))
+
+    @staticmethod
+    def store_heatmap_data(db: Session, anonymous_id: str, data: list, bulk: bool = True, batch_size: int = None):
+        """存储一次上传的区块数据并同步更新聚合表，整体在一个事务内提交。
+
+        Args:
+            bulk: True 时走 Core insert + executemany，跳过 ORM 对象与 identity map；
+                False 为逐对象 db.add 的旧路径（保留用于对比基准）
+            batch_size: 每批最大行数，默认 BULK_BATCH_SIZE
+        """
+        # 原始行与时间桶使用同一时间戳，保证重建结果与增量维护一致
+        now = datetime.now(timezone.utc)
+        if bulk:
+            HeatmapService._bulk_insert_rows(db, anonymous_id, data, batch_size, created_at=now)
+        else:
+            for item in data:
+                heatmap_item = HeatmapData(
+                    anonymous_id=anonymous_id,
+                    x=item.x,
+                    y=item.y,
+                    weight=item.weight,
+                    created_at=now
+                )
+                db.add(heatmap_item)
+        HeatmapService._upsert_cells(db, data, uploaded_at=now)
+        db.commit()
+
+    @staticmethod
+    def store_heatmap_records(db: Session, records: list, batch_size: int = None) -> None:
+        """流式导入的一个分块：记录各自带 anonymous_id（含 anonymous_id/x/y/weight 属性），
+        与 store_heatmap_data 相同的批量写入 + 聚合表 upsert，整体在一个事务内提交。"""
+        now = datetime.now(timezone.utc)
+        HeatmapService._insert_raw_rows(db, [
+            {'anonymous_id': item.anonymous_id, 'x': int(item.x), 'y': int(item.y), 'weight': float(item.weight),
+             'created_at': now}
+            for item in records
+        ], batch_size)
+        HeatmapService._upsert_cells(db, records, uploaded_at=now)
+        db.commit()
+
+    @staticmethod
+    def _bulk_insert_rows(db: Session, anonymous_id: str, data: list, batch_size: int = None,
+                          created_at: datetime = None) -> None:
+        created_at = created_at or datetime.now(timezone.utc)
+        HeatmapService._insert_raw_rows(db, [
+            {'anonymous_id': anonymous_id, 'x': int(item.x), 'y': int(item.y), 'weight': float(item.weight),
+             'created_at': created_at}
+            for item in data
+        ], batch_size)
+
     @staticmethod
-    def store_heatmap_data(db: Session, anonymous_id: str, data: list):
+    def _insert_raw_rows(db: Session, rows: list, batch_size: int = None) -> None:
+        size = max(1, int(batch_size or HeatmapService.BULK_BATCH_SIZE))
+        stmt = insert(HeatmapData)
+        for start in range(0, len(rows), size):
+            db.execute(stmt, rows[start:start + size])
+
+    @staticmethod
+    def _upsert_cells(db: Session, data: list, uploaded_at: datetime = None) -> None:
+        """将本次上传按区块合并后 upsert 进 heatmap_cells、各级 heatmap_rollups 及当前小时/天的
+        heatmap_buckets（不提交，随调用方事务一起提交）。"""
+        merged = {}
         for item in data:
-            heatmap_item = HeatmapData(
-                anonymous_id=anonymous_id,
-                x=item.x,
-                y=item.y,
-                weight=item.weight
+            key = (int(item.x), int(item.y))
+            w, n = merged.get(key, (0.0, 0))
+            merged[key] = (w + float(item.weight), n + 1)
+        if not merged:
+            return
+        rows = [
+            {'x': x, 'y': y, 'weight_sum': w, 'sample_count': n}
+            for (x, y), (w, n) in merged.items()
+        ]
+        stmt = dialect_insert(db, HeatmapCell)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[HeatmapCell.x, HeatmapCell.y],
+            set_={
+                'weight_sum': HeatmapCell.weight_sum + stmt.excluded.weight_sum,
+                'sample_count': HeatmapCell.sample_count + stmt.excluded.sample_count,
+                'updated_at': func.now(),
+            }
+        )
+        db.execute(stmt, rows)
+
+        rollup_rows = []
+        for level in range(1, HeatmapService.MAX_ZOOM_LEVEL + 1):
+            coarse = {}
+            for (x, y), (w, n) in merged.items():
+                key = (x >> level, y >> level)
+                cw, cn = coarse.get(key, (0.0, 0))
+                coarse[key] = (cw + w, cn + n)
+            rollup_rows.extend(
+                {'level': level, 'x': x, 'y': y, 'weight_sum': w, 'sample_count': n}
+                for (x, y), (w, n) in coarse.items()
+            )
+        if rollup_rows:
+            stmt = dialect_insert(db, HeatmapRollup)
+            stmt = stmt.on_conflict_do_update(
+                index_elements=[HeatmapRollup.level, HeatmapRollup.x, HeatmapRollup.y],
+                set_={
+                    'weight_sum': HeatmapRollup.weight_sum + stmt.excluded.weight_sum,
+                    'sample_count': HeatmapRollup.sample_count + stmt.excluded.sample_count,
+                }
             )
-            db.add(heatmap_item)
+            db.execute(stmt, rollup_rows)
+
+        ts = _epoch_seconds(uploaded_at or datetime.now(timezone.utc))
+        bucket_rows = [
+            {'granularity': gran, 'bucket': ts // gran, 'x': x, 'y': y, 'weight_sum': w, 'sample_count': n}
+            for gran in (HOUR, DAY)
+            for (x, y), (w, n) in merged.items()
+        ]
+        HeatmapService._upsert_buckets(db, bucket_rows)
+
+    @staticmethod
+    def _upsert_buckets(db: Session, bucket_rows: list) -> None:
+        if not bucket_rows:
+            return
+        stmt = dialect_insert(db, HeatmapBucket)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[HeatmapBucket.granularity, HeatmapBucket.bucket, HeatmapBucket.x, HeatmapBucket.y],
+            set_={
+                'weight_sum': HeatmapBucket.weight_sum + stmt.excluded.weight_sum,
+                'sample_count': HeatmapBucket.sample_count + stmt.excluded.sample_count,
+            }
+        )
+        db.execute(stmt, bucket_rows)
+
+    @staticmethod
+    def rebuild_cell_aggregates(db: Session) -> int:
+        """重建全部热力图聚合表，用于已有数据库的一次性初始化或纠偏。
+
+        原始行可能已被保留策略清理，因此只重算原始数据仍覆盖的那些天的时间桶；
+        heatmap_cells 再由天桶求和得到，已清理时段的历史汇总不受影响。
+
+        Returns:
+            重建后的区块数量
+        """
+        earliest = db.query(func.min(HeatmapData.created_at)).scalar()
+        if earliest is not None:
+            start_day = _epoch_seconds(earliest) // DAY
+            db.execute(delete(HeatmapBucket).where(or_(
+                and_(HeatmapBucket.granularity == DAY, HeatmapBucket.bucket >= start_day),
+                and_(HeatmapBucket.granularity == HOUR, HeatmapBucket.bucket >= start_day * (DAY // HOUR)),
+            )))
+            buckets = {}
+            rows = db.query(HeatmapData.x, HeatmapData.y, HeatmapData.weight, HeatmapData.created_at).yield_per(5000)
+            for row in rows:
+                ts = _epoch_seconds(row.created_at) if row.created_at is not None else 0
+                for gran in (HOUR, DAY):
+                    key = (gran, ts // gran, row.x, row.y)
+                    w, n = buckets.get(key, (0.0, 0))
+                    buckets[key] = (w + float(row.weight), n + 1)
+            bucket_rows = [
+                {'granularity': g, 'bucket': b, 'x': x, 'y': y, 'weight_sum': w, 'sample_count': n}
+                for (g, b, x, y), (w, n) in buckets.items()
+            ]
+            for start in range(0, len(bucket_rows), HeatmapService.BULK_BATCH_SIZE):
+                db.execute(insert(HeatmapBucket), bucket_rows[start:start + HeatmapService.BULK_BATCH_SIZE])
+
+        db.execute(delete(HeatmapCell))
+        source = db.query(
+            HeatmapBucket.x,
+            HeatmapBucket.y,
+            func.sum(HeatmapBucket.weight_sum),
+            func.sum(HeatmapBucket.sample_count)
+        ).filter(HeatmapBucket.granularity == DAY).group_by(HeatmapBucket.x, HeatmapBucket.y)
+        db.execute(insert(HeatmapCell).from_select(
+            ['x', 'y', 'weight_sum', 'sample_count'], source
+        ))
+        HeatmapService._rebuild_rollups(db)
         db.commit()
+        return db.query(func.count()).select_from(HeatmapCell).scalar() or 0
 
     @staticmethod
-    def get_global_heatmap(db: Session):
-        result = db.query(
-            HeatmapData.x,
-            HeatmapData.y,
-            func.sum(HeatmapData.weight).label('total_weight')
-        ).group_by(HeatmapData.x, HeatmapData.y).all()
-        heatmap_data = []
-        for row in result:
-            heatmap_data.append({
-                'x': row.x,
-                'y': row.y,
-                'weight': float(row.total_weight)
-            })
-        # 若尚无真实数据，返回一组预置演示点（不会覆盖已有数据）
-        if not heatmap_data:
+    def _rebuild_rollups(db: Session) -> None:
+        """由 heatmap_cells 逐级重算 heatmap_rollups（不提交）。"""
+        db.execute(delete(HeatmapRollup))
+        for level in range(1, HeatmapService.MAX_ZOOM_LEVEL + 1):
+            sx = HeatmapCell.x.op('>>')(level)
+            sy = HeatmapCell.y.op('>>')(level)
+            source = db.query(
+                literal(level, Integer),
+                sx,
+                sy,
+                func.sum(HeatmapCell.weight_sum),
+                func.sum(HeatmapCell.sample_count)
+            ).group_by(sx, sy)
+            db.execute(insert(HeatmapRollup).from_select(
+                ['level', 'x', 'y', 'weight_sum', 'sample_count'], source
+            ))
+
+    @staticmethod
+    def prune_raw_data(db: Session, older_than_days: int, hourly_older_than_days: int = None,
+                       commit: bool = True) -> dict:
+        """保留策略：删除早于 older_than_days 天的原始上传行，时间桶与全局聚合保持不变。
+
+        截止时间向下取整到 UTC 零点，保证剩余原始行覆盖完整的天，重建时天桶不会丢失数据。
+
+        Args:
+            older_than_days: 原始行保留天数
+            hourly_older_than_days: 可选，小时桶保留天数；更早的时段仍可由天桶回答
+            commit: False 时只执行不提交，由调用方决定提交或回滚（用于预演）
+        Returns:
+            {'raw_rows': 删除的原始行数, 'hourly_buckets': 删除的小时桶行数}
+        """
+        now_day = _epoch_seconds(datetime.now(timezone.utc)) // DAY
+        cutoff = datetime.fromtimestamp((now_day - int(older_than_days)) * DAY, tz=timezone.utc)
+        raw = db.query(HeatmapData).filter(HeatmapData.created_at < cutoff).delete(synchronize_session=False)
+        hourly = 0
+        if hourly_older_than_days is not None:
+            cutoff_hour = (now_day - int(hourly_older_than_days)) * (DAY // HOUR)
+            hourly = db.query(HeatmapBucket).filter(
+                HeatmapBucket.granularity == HOUR,
+                HeatmapBucket.bucket < cutoff_hour
+            ).delete(synchronize_session=False)
+        if commit:
+            db.commit()
+        return {'raw_rows': raw, 'hourly_buckets': hourly}
+
+    @staticmethod
+    def _window_filter(since: datetime = None, until: datetime = None):
+        """把 [since, until) 拆成“首尾零散小时桶 + 中间整天桶”，返回 heatmap_buckets 过滤条件。
+        时间精度为小时：since 向下、until 向上取整到整点。"""
+        start_h = _epoch_seconds(since) // HOUR if since is not None else 0
+        until_s = _epoch_seconds(until or datetime.now(timezone.utc))
+        end_h = -(-until_s // HOUR)
+        hours_per_day = DAY // HOUR
+        day_start = -(-start_h // hours_per_day)
+        day_end = end_h // hours_per_day
+        if day_start >= day_end:
+            return and_(HeatmapBucket.granularity == HOUR,
+                        HeatmapBucket.bucket >= start_h, HeatmapBucket.bucket < end_h)
+        return or_(
+            and_(HeatmapBucket.granularity == HOUR,
+                 HeatmapBucket.bucket >= start_h, HeatmapBucket.bucket < day_start * hours_per_day),
+            and_(HeatmapBucket.granularity == DAY,
+                 HeatmapBucket.bucket >= day_start, HeatmapBucket.bucket < day_end),
+            and_(HeatmapBucket.granularity == HOUR,
+                 HeatmapBucket.bucket >= day_end * hours_per_day, HeatmapBucket.bucket < end_h),
+        )
+
+    @staticmethod
+    def get_global_heatmap(db: Session, x_min: int = None, x_max: int = None,
+                           y_min: int = None, y_max: int = None, zoom: int = 0,
+                           since: datetime = None, until: datetime = None):
+        """读取聚合热力图，可按视口裁剪、按缩放级别返回超级区块，并可限定时间窗口。
+
+        Args:
+            x_min/x_max/y_min/y_max: 原始网格坐标下的视口范围（闭区间），缺省表示不限
+            zoom: 0 为原始区块；level>0 时返回边长 2^level 的超级区块，坐标为 (x >> level, y >> level)
+            since/until: 时间窗口 [since, until)，任一给出时改由小时/天时间桶合并得到
+        Returns:
+            形如 [{'x': int, 'y': int, 'weight': float}, ...]
+        """
+        rows = HeatmapService._query_heatmap_rows(db, x_min, x_max, y_min, y_max, zoom, since, until)
+        return [{'x': x, 'y': y, 'weight': float(w)} for x, y, w in rows]
+
+    @staticmethod
+    def get_global_heatmap_columns(db: Session, x_min: int = None, x_max: int = None,
+                                   y_min: int = None, y_max: int = None, zoom: int = 0,
+                                   since: datetime = None, until: datetime = None):
+        """与 get_global_heatmap 相同的查询，但以列式 NumPy 数组 (xs, ys, ws) 返回，需要 numpy。
+        坐标列直接按 int64 构建（不经 float64 中转，大坐标不丢精度），权重列为 float64。"""
+        rows = HeatmapService._query_heatmap_rows(db, x_min, x_max, y_min, y_max, zoom, since, until)
+        n = len(rows)
+        return (np.fromiter((r[0] for r in rows), dtype=np.int64, count=n),
+                np.fromiter((r[1] for r in rows), dtype=np.int64, count=n),
+                np.fromiter((r[2] for r in rows), dtype=np.float64, count=n))
+
+    @staticmethod
+    def _query_heatmap_rows(db: Session, x_min: int = None, x_max: int = None,
+                            y_min: int = None, y_max: int = None, zoom: int = 0,
+                            since: datetime = None, until: datetime = None) -> list:
+        """返回 [(x, y, weight), ...] 元组列表，供记录式与列式两种输出共用。"""
+        if since is not None or until is not None:
+            # 时间窗口：只合并少量预汇总的时间桶，不扫描原始行
+            model = HeatmapBucket
+            sx = model.x.op('>>')(zoom) if zoom > 0 else model.x
+            sy = model.y.op('>>')(zoom) if zoom > 0 else model.y
+            query = db.query(
+                sx.label('x'), sy.label('y'), func.sum(model.weight_sum).label('weight_sum')
+            ).filter(HeatmapService._window_filter(since, until))
+            # 视口按超级区块对齐后换回原始坐标过滤
+            span = (1 << zoom) - 1
+            if x_min is not None:
+                query = query.filter(model.x >= ((x_min >> zoom) << zoom))
+            if x_max is not None:
+                query = query.filter(model.x <= ((x_max >> zoom) << zoom) + span)
+            if y_min is not None:
+                query = query.filter(model.y >= ((y_min >> zoom) << zoom))
+            if y_max is not None:
+                query = query.filter(model.y <= ((y_max >> zoom) << zoom) + span)
+            return [tuple(row) for row in query.group_by(sx, sy).all()]
+
+        # 只读聚合表：代价与视口内区块数成正比，而非历史上传行数
+        if zoom > 0:
+            model = HeatmapRollup
+            query = db.query(model.x, model.y, model.weight_sum).filter(model.level == zoom)
+        else:
+            model = HeatmapCell
+            query = db.query(model.x, model.y, model.weight_sum)
+        # 视口边界换算到当前级别的坐标（算术右移即向下取整）
+        if x_min is not None:
+            query = query.filter(model.x >= (x_min >> zoom))
+        if x_max is not None:
+            query = query.filter(model.x <= (x_max >> zoom))
+        if y_min is not None:
+            query = query.filter(model.y >= (y_min >> zoom))
+        if y_max is not None:
+            query = query.filter(model.y <= (y_max >> zoom))
+        heatmap_rows = [tuple(row) for row in query.all()]
+        # 若尚无真实数据，返回一组预置演示点（不会覆盖已有数据）；带视口或缩放的查询不做填充
+        viewport = any(v is not None for v in (x_min, x_max, y_min, y_max))
+        if not heatmap_rows and not viewport and zoom == 0:
             # 构造以北京近似坐标为中心的 10x10 区块演示数据，使用相对小坐标避免过大索引导致前端映射异常
             base_lat_idx = int(39.9042 / 0.001)
             base_lng_idx = int(116.4074 / 0.001)
@@ -44,13 +354,9 @@ class HeatmapService:
                     weight = max(0, 12 - dist_center * 2) + ((dx*dy) % 4)
                     if weight <= 0:
                         continue
-                    demo.append({
-                        'x': base_lng_idx + dx,
-                        'y': base_lat_idx + dy,
-                        'weight': float(weight)
-                    })
+                    demo.append((base_lng_idx + dx, base_lat_idx + dy, float(weight)))
             return demo
-        return heatmap_data
+        return heatmap_rows
 
     @staticmethod
     def attenuate_center(heatmap_data: list, factor: float = 0.7, radius: int = 5) -> list:
@@ -86,3 +392,38 @@ class HeatmapService:
         except Exception:
             # 发生异常则不做衰减，原样返回
             return list(heatmap_data)
+
+    @staticmethod
+    def attenuate_center_columns(xs, ys, ws, factor: float = 0.7, radius: float = 5):
+        """attenuate_center 的列式向量化版本：输入输出均为 NumPy 数组 (xs, ys, ws)。
+
+        质心、半径掩码与 factor 截断规则与 attenuate_center 完全一致；不修改入参数组。
+        """
+        if ws.size == 0:
+            return xs, ys, ws
+        try:
+            # max(0.0, w) 的等价写法（NaN 视为 0，与逐元素版本一致）
+            total_w = float(np.where(ws > 0.0, ws, 0.0).sum())
+            if total_w <= 0:
+                return xs, ys, ws
+            cx = float(np.dot(xs, ws)) / total_w
+            cy = float(np.dot(ys, ws)) / total_w
+            r2 = float(radius) * float(radius)
+            f = min(max(float(factor), 0.0), 1.0)
+            dx = xs - cx
+            dy = ys - cy
+            inside = (dx * dx + dy * dy) <= r2
+            return xs, ys, np.where(inside, ws * f, ws)
+        except Exception:
+            # 发生异常则不做衰减，原样返回
+            return xs, ys, ws
+
+    @staticmethod
+    def pack_columns(xs, ys, ws) -> bytes:
+        """列式数据打包为二进制：int32 x[n] | int32 y[n] | float32 w[n]，小端序，前端可直接映射为 TypedArray。"""
+        if np is not None:
+            return (np.asarray(xs, dtype='<i4').tobytes()
+                    + np.asarray(ys, dtype='<i4').tobytes()
+                    + np.asarray(ws, dtype='<f4').tobytes())
+        n = len(xs)
+        return struct.pack(f'<{n}i{n}i{n}f', *xs, *ys, *ws)
@@ -0,0 +1,228 @@
+import hashlib
+import os
+import random
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from sqlalchemy import func, insert, delete
+from app.database import dialect_insert
+from app.models import GroupScore, Ring, AppMeta, GroupStats, GroupMember
+from app.services.cache_service import TTLCache
+
+# group_name 为空的成绩在排行榜中显示的组名
+UNKNOWN_GROUP = "未知组"
+
+class LeaderboardService:
+    """排行榜服务：group_stats 运行汇总 + 进程内 TTL 缓存（成绩写入时显式失效）。"""
+
+    # 缓存有效期（秒），可通过环境变量覆盖；0 表示不过期，仅靠写入失效
+    CACHE_TTL = float(os.getenv("LEADERBOARD_CACHE_TTL", "30"))
+    _cache = TTLCache(maxsize=1, ttl=CACHE_TTL)
+    _CACHE_KEY = "leaderboard"
+
+    @staticmethod
+    def get_leaderboard(db: Session) -> list:
+        """读取排行榜：命中缓存直接返回，未命中再做全表聚合并回填。
+        聚合期间若有成绩写入使缓存失效，本次结果只返回给当前请求，不回填。"""
+        generation = LeaderboardService._cache.generation
+        cached = LeaderboardService._cache.get(LeaderboardService._CACHE_KEY)
+        if cached is not None:
+            return cached
+        leaderboard = LeaderboardService.compute_leaderboard(db)
+        LeaderboardService._cache.set(LeaderboardService._CACHE_KEY, leaderboard, generation=generation)
+        return leaderboard
+
+    @staticmethod
+    def compute_leaderboard(db: Session) -> list:
+        """从 group_stats 读取排行榜，代价与群组数成正比。"""
+        avg_distance = GroupStats.distance_sum / GroupStats.score_count
+        rows = db.query(GroupStats).filter(GroupStats.score_count > 0).order_by(avg_distance.desc()).all()
+        return [LeaderboardService._format_entry(
+            row.group_name, row.distance_sum, row.pace_sum, row.score_count, row.member_count
+        ) for row in rows]
+
+    @staticmethod
+    def _format_entry(group_name, distance_sum, pace_sum, score_count, member_count) -> dict:
+        # 规格化为两位小数
+        return {
+            "group_name": group_name or UNKNOWN_GROUP,
+            "average_distance": round(float(distance_sum) / score_count, 2) if score_count else 0.0,
+            "average_pace": round(float(pace_sum) / score_count, 2) if score_count else 0.0,
+            "member_count": int(member_count or 0)
+        }
+
+    @staticmethod
+    def record_score(db: Session, score: GroupScore) -> None:
+        """写入一条成绩并在同一事务内更新 group_stats / group_members（不提交）。"""
+        db.add(score)
+        group_name = score.group_name or UNKNOWN_GROUP
+        new_member = 0
+        if score.user_anonymous_id is not None:
+            stmt = dialect_insert(db, GroupMember).values(
+                group_name=group_name, user_anonymous_id=score.user_anonymous_id
+            ).on_conflict_do_nothing()
+            new_member = db.execute(stmt).rowcount or 0
+        stmt = dialect_insert(db, GroupStats).values(
+            group_name=group_name,
+            distance_sum=score.total_distance,
+            pace_sum=score.average_pace,
+            score_count=1,
+            member_count=new_member
+        )
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[GroupStats.group_name],
+            set_={
+                'distance_sum': GroupStats.distance_sum + stmt.excluded.distance_sum,
+                'pace_sum': GroupStats.pace_sum + stmt.excluded.pace_sum,
+                'score_count': GroupStats.score_count + 1,
+                'member_count': GroupStats.member_count + stmt.excluded.member_count,
+                'updated_at': func.now(),
+            }
+        )
+        db.execute(stmt)
+
+    @staticmethod
+    def _stats_from_scores(db: Session) -> dict:
+        """由 group_scores 原始行重新计算每组汇总：{group_name: (distance_sum, pace_sum, score_count, member_count)}。"""
+        gname = func.coalesce(GroupScore.group_name, UNKNOWN_GROUP)
+        rows = db.query(
+            gname,
+            func.sum(GroupScore.total_distance),
+            func.sum(GroupScore.average_pace),
+            func.count(GroupScore.id),
+            func.count(func.distinct(GroupScore.user_anonymous_id))
+        ).group_by(gname).all()
+        return {r[0]: (float(r[1] or 0.0), float(r[2] or 0.0), int(r[3]), int(r[4])) for r in rows}
+
+    @staticmethod
+    def check_group_stats(db: Session, tolerance: float = 1e-6) -> list:
+        """一致性检查：对比 group_stats 与原始 group_scores 重算结果，返回有偏差的群组列表。"""
+        expected = LeaderboardService._stats_from_scores(db)
+        actual = {
+            row.group_name: (row.distance_sum, row.pace_sum, row.score_count, row.member_count)
+            for row in db.query(GroupStats).all()
+        }
+        drift = []
+        for name in sorted(set(expected) | set(actual)):
+            exp = expected.get(name, (0.0, 0.0, 0, 0))
+            act = actual.get(name, (0.0, 0.0, 0, 0))
+            if (abs(exp[0] - act[0]) > tolerance or abs(exp[1] - act[1]) > tolerance
+                    or exp[2] != act[2] or exp[3] != act[3]):
+                drift.append({
+                    "group_name": name,
+                    "expected": dict(zip(("distance_sum", "pace_sum", "score_count", "member_count"), exp)),
+                    "actual": dict(zip(("distance_sum", "pace_sum", "score_count", "member_count"), act)),
+                })
+        return drift
+
+    @staticmethod
+    def rebuild_group_stats(db: Session) -> int:
+        """由 group_scores 全量重建 group_stats 与 group_members，返回群组数。"""
+        db.execute(delete(GroupMember))
+        db.execute(delete(GroupStats))
+        gname = func.coalesce(GroupScore.group_name, UNKNOWN_GROUP)
+        members = db.query(gname, GroupScore.user_anonymous_id).filter(
+            GroupScore.user_anonymous_id.isnot(None)
+        ).distinct()
+        db.execute(insert(GroupMember).from_select(['group_name', 'user_anonymous_id'], members))
+        stats = LeaderboardService._stats_from_scores(db)
+        if stats:
+            db.execute(insert(GroupStats), [
+                {'group_name': name, 'distance_sum': d, 'pace_sum': p, 'score_count': n, 'member_count': m}
+                for name, (d, p, n, m) in stats.items()
+            ])
+        db.commit()
+        LeaderboardService.invalidate_cache()
+        return len(stats)
+
+    # 演示数据播种完成后写入 app_meta 的标记
+    SEED_MARKER = "leaderboard_seeded"
+
+    @staticmethod
+    def bootstrap_demo_seed(db: Session, force: bool = False) -> int:
+        """一次性播种演示排行榜：已有持久化标记时直接跳过。
+
+        标记与种子成绩在同一事务中写入；多个 worker 同时启动时，只有先提交的一个成功，
+        其余因标记主键冲突回滚。
+
+        Args:
+            force: 忽略已有标记，重新按需补齐演示群组
+        Returns:
+            新插入的成绩条数
+        """
+        marker = db.get(AppMeta, LeaderboardService.SEED_MARKER)
+        if marker is not None and not force:
+            return 0
+        try:
+            if marker is None:
+                db.add(AppMeta(key=LeaderboardService.SEED_MARKER))
+                db.flush()
+            inserted = LeaderboardService.seed_leaderboard(db)
+            db.commit()
+        except IntegrityError:
+            db.rollback()
+            return 0
+        LeaderboardService.invalidate_cache()
+        return inserted
+
+    @staticmethod
+    def seed_leaderboard(db: Session, target_groups: int = 6, target_members: int = 5) -> int:
+        """确保演示排行榜至少有 target_groups 个群组，每组至少 target_members 位成员。
+        若已有部分数据，则按需补齐，不重复插入相同 seed 用户。不提交，返回新插入的成绩条数。
+        """
+        # 预设候选组名
+        candidate_groups = [
+            "闪电跑者", "旋风小队", "晨曦战士", "夜猫子联盟",
+            "周末勇士", "马拉松训练营", "健康生活家", "城市探索者",
+            "节奏大师", "耐力王者", "速度之星", "坚持到底队"
+        ]
+        random.shuffle(candidate_groups)
+        use_groups = candidate_groups[:target_groups]
+        inserted = 0
+
+        # 现有每组的 distinct 成员数（取自 group_stats 运行汇总）
+        existing_counts = {row[0]: row[1] for row in db.query(
+            GroupStats.group_name, GroupStats.member_count
+        ).all()}
+
+        for gname in use_groups:
+            current = int(existing_counts.get(gname, 0) or 0)
+            need = max(0, target_members - current)
+            if need == 0:
+                continue
+            # 准备一个 seed ring（或复用同一个 ring_id）
+            ring_id = f"seed_{hashlib.md5(gname.encode()).hexdigest()[:8]}"
+            ring = db.query(Ring).filter(Ring.ring_id == ring_id).first()
+            if not ring:
+                pubkeys = [hashlib.md5((gname+str(i)).encode()).hexdigest() for i in range(7)]
+                ring = Ring(ring_id=ring_id, public_keys=pubkeys, group_name=gname, user_level="medium")
+                db.add(ring)
+            # 生成需要的成员成绩，保证 user_anonymous_id 唯一
+            base_idx = current
+            for k in range(need):
+                idx = base_idx + k
+                user_id = f"seed_user_{hashlib.md5((gname+str(idx)).encode()).hexdigest()[:10]}"
+                # 合理的距离/配速随机（不同组可稍微偏置）
+                # 距离 3~12km，配速 5.0~7.0 分/公里之间
+                dist = round(random.uniform(3.0, 12.0), 1)
+                pace = round(random.uniform(5.0, 7.0), 1)
+                sig = hashlib.sha256(f"{ring_id}{user_id}{dist}{pace}".encode()).hexdigest()
+                gs = GroupScore(
+                    ring_id=ring_id,
+                    group_name=gname,
+                    user_anonymous_id=user_id,
+                    total_distance=dist,
+                    average_pace=pace,
+                    signature=sig
+                )
+                LeaderboardService.record_score(db, gs)
+                inserted += 1
+        return inserted
+
+    @staticmethod
+    def invalidate_cache() -> None:
+        """成绩写入提交后调用，使下一次读取重新聚合。"""
+        LeaderboardService._cache.invalidate()
+
+    @staticmethod
+    def cache_stats() -> dict:
+        return LeaderboardService._cache.stats()
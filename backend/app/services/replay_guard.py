@@ -0,0 +1,164 @@
+import hashlib
+import math
+import os
+import threading
+from datetime import datetime, timedelta, timezone
+from typing import Iterable, Set
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from app.database import dialect_insert
+from app.models import SignatureDigest
+
+# 布隆过滤器预期容量与误判率；容量按保留期内的签名条数估计，超出后误判率上升但不影响正确性
+REPLAY_BLOOM_CAPACITY = int(os.getenv("REPLAY_BLOOM_CAPACITY", "1000000"))
+REPLAY_BLOOM_ERROR_RATE = float(os.getenv("REPLAY_BLOOM_ERROR_RATE", "0.01"))
+# 签名摘要默认保留天数（清理脚本的默认值）
+REPLAY_DIGEST_RETENTION_DAYS = int(os.getenv("REPLAY_DIGEST_RETENTION_DAYS", "90"))
+
+
+class BloomFilter:
+    """定长位数组布隆过滤器，输入为已是均匀分布的摘要字节（取前 16 字节做双重哈希），线程安全。"""
+
+    def __init__(self, capacity: int, error_rate: float):
+        capacity = max(1, int(capacity))
+        self.num_bits = max(64, int(-capacity * math.log(error_rate) / (math.log(2) ** 2)))
+        self.num_hashes = max(1, round(self.num_bits / capacity * math.log(2)))
+        self._bits = bytearray((self.num_bits + 7) // 8)
+        self._lock = threading.Lock()
+        self.count = 0
+
+    def _positions(self, digest: bytes):
+        h1 = int.from_bytes(digest[:8], "big")
+        h2 = int.from_bytes(digest[8:16], "big") | 1
+        return [(h1 + i * h2) % self.num_bits for i in range(self.num_hashes)]
+
+    def add(self, digest: bytes) -> None:
+        positions = self._positions(digest)
+        with self._lock:
+            for p in positions:
+                self._bits[p >> 3] |= 1 << (p & 7)
+            self.count += 1
+
+    def __contains__(self, digest: bytes) -> bool:
+        bits = self._bits
+        return all(bits[p >> 3] & (1 << (p & 7)) for p in self._positions(digest))
+
+
+class ReplayGuard:
+    """环签名防重放：signature_digests 表（摘要唯一）为准，进程内布隆过滤器挡在前面。
+
+    - 验证前：布隆过滤器判定“一定没见过”的摘要直接放行，无需查库；判定“可能见过”的再查一次主键，
+      命中即为重放，不做任何椭圆曲线运算。
+    - 验证通过后：摘要与成绩在同一事务中以 INSERT ... ON CONFLICT DO NOTHING 写入，插入 0 行说明
+      其他请求 / 其他 worker 已抢先使用该签名，同样按重放处理。布隆过滤器只在本进程内更新，
+      跨进程的重放由唯一约束兜底。
+    """
+
+    def __init__(self, capacity: int = REPLAY_BLOOM_CAPACITY, error_rate: float = REPLAY_BLOOM_ERROR_RATE):
+        self.capacity = max(1, int(capacity))
+        self.error_rate = error_rate
+        self._bloom = BloomFilter(self.capacity, error_rate)
+        self._lock = threading.Lock()
+        self.bloom_negatives = 0
+        self.db_lookups = 0
+        self.replays = 0
+
+    @staticmethod
+    def digest(ring_id: str, message: bytes, c0: str) -> str:
+        """签名摘要：SHA-256(ring_id | message | c0) 的 hex。"""
+        h = hashlib.sha256()
+        for part in (ring_id.encode(), message, str(c0).encode()):
+            # 带长度前缀，避免字段拼接产生歧义
+            h.update(len(part).to_bytes(4, "big"))
+            h.update(part)
+        return h.hexdigest()
+
+    def remember(self, digests: Iterable[str]) -> None:
+        for d in digests:
+            self._bloom.add(bytes.fromhex(d))
+
+    def candidates(self, digests: Iterable[str]) -> Set[str]:
+        """布隆过滤器筛选：返回可能见过、需要查库确认的摘要。"""
+        digests = set(digests)
+        maybe = {d for d in digests if bytes.fromhex(d) in self._bloom}
+        with self._lock:
+            self.bloom_negatives += len(digests) - len(maybe)
+        return maybe
+
+    def seen(self, db: Session, digests: Iterable[str]) -> Set[str]:
+        """查库确认已使用的摘要（仅传入布隆过滤器的候选）。"""
+        digests = list(digests)
+        if not digests:
+            return set()
+        found = set(db.execute(select(SignatureDigest.digest).where(SignatureDigest.digest.in_(digests))).scalars())
+        with self._lock:
+            self.db_lookups += len(digests)
+            self.replays += len(found)
+        return found
+
+    def claim(self, db: Session, digest: str) -> bool:
+        """在当前事务中登记摘要（不提交）；摘要已存在时返回 False，调用方应按重放拒绝。"""
+        stmt = dialect_insert(db, SignatureDigest).values(digest=digest).on_conflict_do_nothing()
+        claimed = (db.execute(stmt).rowcount or 0) == 1
+        if not claimed:
+            with self._lock:
+                self.replays += 1
+        return claimed
+
+    def warm(self, db: Session) -> int:
+        """启动时把保留期内的摘要载入布隆过滤器（最多 capacity 条，取最新的），返回载入条数。"""
+        rows = db.execute(
+            select(SignatureDigest.digest).order_by(SignatureDigest.created_at.desc()).limit(self.capacity)
+        ).scalars()
+        loaded = 0
+        for d in rows:
+            self._bloom.add(bytes.fromhex(d))
+            loaded += 1
+        return loaded
+
+    @staticmethod
+    def prune(db: Session, older_than_days: int, commit: bool = True) -> dict:
+        """删除早于 older_than_days 天登记的签名摘要。
+
+        被清理的签名此后可以再次提交，保留期应长于环的使用期。
+        Args:
+            commit: False 时只执行不提交，由调用方决定提交或回滚（用于预演）
+        Returns:
+            {'digests': 删除的摘要条数}
+        """
+        cutoff = datetime.now(timezone.utc) - timedelta(days=int(older_than_days))
+        removed = db.query(SignatureDigest).filter(
+            SignatureDigest.created_at < cutoff
+        ).delete(synchronize_session=False)
+        if commit:
+            db.commit()
+        return {'digests': removed}
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "bloom_capacity": self.capacity,
+                "bloom_error_rate": self.error_rate,
+                "bloom_bits": self._bloom.num_bits,
+                "bloom_hashes": self._bloom.num_hashes,
+                "bloom_entries": self._bloom.count,
+                "bloom_negatives": self.bloom_negatives,
+                "db_lookups": self.db_lookups,
+                "replays": self.replays,
+            }
+
+
+_guard = None
+_guard_lock = threading.Lock()
+
+
+def get_replay_guard() -> ReplayGuard:
+    """进程内单例，首次使用时按环境变量创建。"""
+    global _guard
+    if _guard is None:
+        with _guard_lock:
+            if _guard is None:
+                _guard = ReplayGuard()
+    return _guard
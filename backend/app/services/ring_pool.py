@@ -0,0 +1,249 @@
+import os
+import threading
+import time
+from collections import deque
+
+from sqlalchemy.orm import Session
+
+from app.database import SessionLocal
+from app.models import User
+from app.services.cache_service import TTLCache
+from app.services.ring_service import RingService
+
+# 环大小（与 RingService.generate_ring 默认一致）
+RING_SIZE = int(os.getenv("RING_SIZE", "5"))
+# 每个 (user_level, group_name) 预建的成员集数量；0 表示关闭环池，每次现场构建
+RING_POOL_DEPTH = int(os.getenv("RING_POOL_DEPTH", "8"))
+# 预建成员集的最长存活时间（秒），过期丢弃，使新注册用户能进入后续的环
+RING_POOL_MAX_AGE = float(os.getenv("RING_POOL_MAX_AGE", "600"))
+# 后台补充线程的空闲唤醒间隔（秒）
+RING_POOL_REFILL_INTERVAL = float(os.getenv("RING_POOL_REFILL_INTERVAL", "30"))
+# 同一公钥在窗口内（秒）重复请求同水平同组的环时复用已发放的环；0 表示不复用
+RING_REUSE_WINDOW = float(os.getenv("RING_REUSE_WINDOW", "300"))
+# 启动时为哪些用户水平预建环（逗号分隔）；此外只登记库中用户实际拥有的水平
+RING_POOL_LEVELS = [lvl.strip() for lvl in os.getenv("RING_POOL_LEVELS", "medium").split(",") if lvl.strip()]
+# 最多登记的 (user_level, group_name) 池数量，超出的组合不预建，请求时现场构建
+RING_POOL_MAX_KEYS = int(os.getenv("RING_POOL_MAX_KEYS", "64"))
+
+
+class RingPool:
+    """预建环成员池：后台线程按 (user_level, group_name) 预先挑选并校验好成员公钥，
+    /request-ring 只需取出一组、放入请求者公钥并写入 Ring 行。
+
+    池中存放的是成员候选集而不是完整的环：请求者的公钥必须在环内，签名才能被服务端验证。
+    池为空（未命中）时退回 RingService.generate_ring 现场构建，并唤醒后台补充。
+
+    只有启动时登记的组合（配置的水平与库中已有用户的水平，至多 max_keys 个）才会预建；请求中的
+    其他 user_level 直接现场构建，不会新增池。后台线程只读抽样，不补种用户、不写库。
+    """
+
+    def __init__(self, depth: int = RING_POOL_DEPTH, ring_size: int = RING_SIZE,
+                 max_age: float = RING_POOL_MAX_AGE, reuse_window: float = RING_REUSE_WINDOW,
+                 refill_interval: float = RING_POOL_REFILL_INTERVAL, session_factory=SessionLocal,
+                 levels=None, max_keys: int = RING_POOL_MAX_KEYS):
+        self.depth = max(0, int(depth))
+        self.ring_size = max(2, int(ring_size))
+        self.levels = list(RING_POOL_LEVELS if levels is None else levels)
+        self.max_keys = max(0, int(max_keys))
+        self.max_age = max_age
+        self.refill_interval = refill_interval
+        # 后台补充线程自建会话所用的工厂（默认同步引擎）
+        self._session_factory = session_factory
+        self._pools = {}
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+        self._reuse = TTLCache(maxsize=4096, ttl=reuse_window) if reuse_window > 0 else None
+        self.hits = 0
+        self.misses = 0
+        self.unpooled = 0
+        self.reuse_hits = 0
+        self.expired = 0
+        self.refills = 0
+        self.refilled_sets = 0
+        self.refill_errors = 0
+        self.refill_ms_total = 0.0
+        self.refill_ms_max = 0.0
+        self.refill_ms_last = 0.0
+
+    # ---------- 请求路径 ----------
+    def reused(self, public_key: str, user_level: str = "medium", group_name: str = None):
+        """复用窗口内已发放给该公钥的环（不访问数据库），没有时返回 None。"""
+        if self._reuse is None:
+            return None
+        ring_info = self._reuse.get((public_key, user_level, group_name))
+        if ring_info is not None:
+            with self._lock:
+                self.reuse_hits += 1
+        return ring_info
+
+    def acquire(self, db: Session, public_key: str, user_level: str = "medium", group_name: str = None) -> dict:
+        """为请求者发放一个环，返回 {ring_id, ring_public_keys, group_name}。
+        除复用命中外都会写入并提交（Ring 行，未命中时可能还有补种用户），异步调用方需持有写锁。"""
+        ring_info = self.reused(public_key, user_level, group_name)
+        if ring_info is not None:
+            return ring_info
+
+        candidates = self._pop(user_level, group_name) if self.depth else None
+        if candidates is None:
+            ring_info = RingService.generate_ring(
+                db, public_key, user_level, group_name=group_name, ring_size=self.ring_size
+            )
+        else:
+            ring_info = RingService.create_ring(
+                db, self._members_for(candidates, public_key), user_level, group_name
+            )
+        if self._reuse is not None:
+            self._reuse.set((public_key, user_level, group_name), ring_info)
+        return ring_info
+
+    def _pop(self, user_level: str, group_name: str):
+        key = (user_level, group_name)
+        now = time.monotonic()
+        with self._lock:
+            queue = self._pools.get(key)
+            if queue is None:
+                # 未登记的组合不建池，直接现场构建
+                self.unpooled += 1
+                return None
+            candidates = None
+            while queue:
+                built_at, members = queue.popleft()
+                if self.max_age and now - built_at > self.max_age:
+                    self.expired += 1
+                    continue
+                candidates = members
+                break
+            if candidates is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+            low = len(queue) < self.depth
+        if low:
+            self._wake.set()
+        return candidates
+
+    def _members_for(self, candidates: list, public_key: str) -> list:
+        # 候选集多备一个公钥：请求者恰好在候选集中时剔除后仍然凑得齐
+        others = [pk for pk in candidates if pk != public_key]
+        if RingService._is_valid_secp256k1_compressed_hex(public_key):
+            return [public_key] + others[:self.ring_size - 1]
+        return others[:self.ring_size]
+
+    # ---------- 后台补充 ----------
+    def register(self, user_level: str, group_name: str) -> bool:
+        """登记一个需要预建的组合；池数量已达 max_keys 时不登记，返回是否已登记。"""
+        key = (user_level, group_name)
+        with self._lock:
+            if key not in self._pools:
+                if len(self._pools) >= self.max_keys:
+                    return False
+                self._pools[key] = deque()
+        self._wake.set()
+        return True
+
+    def refill_once(self) -> int:
+        """把每个已登记的池补到目标深度并清理过期项，返回本轮新建的成员集数。"""
+        now = time.monotonic()
+        with self._lock:
+            for queue in self._pools.values():
+                while queue and self.max_age and now - queue[0][0] > self.max_age:
+                    queue.popleft()
+                    self.expired += 1
+            wanted = {key: self.depth - len(queue) for key, queue in self._pools.items() if len(queue) < self.depth}
+        if not wanted:
+            return 0
+        built = 0
+        started = time.perf_counter()
+        db = self._session_factory()
+        try:
+            for (user_level, group_name), need in wanted.items():
+                for _ in range(need):
+                    # 只读抽样：用户不足以凑满一组时不预建，交给请求路径（持写锁）补种后现场构建
+                    members = RingService.sample_members(db, user_level, self.ring_size)
+                    if len(members) < self.ring_size:
+                        break
+                    with self._lock:
+                        self._pools[(user_level, group_name)].append((time.monotonic(), members))
+                    built += 1
+        except Exception as e:
+            db.rollback()
+            with self._lock:
+                self.refill_errors += 1
+            print(f"[WARN] ring pool refill failed: {e}")
+        finally:
+            db.close()
+        elapsed = (time.perf_counter() - started) * 1000
+        with self._lock:
+            self.refills += 1
+            self.refilled_sets += built
+            self.refill_ms_total += elapsed
+            self.refill_ms_max = max(self.refill_ms_max, elapsed)
+            self.refill_ms_last = elapsed
+        return built
+
+    def warm_from_users(self, db: Session) -> int:
+        """登记配置水平下的全部预设群组以及现有用户的 (user_level, group_name) 组合，启动后即可开始预建。
+        配置的组合先登记，不会被 max_keys 挤掉；返回登记的组合数。"""
+        pairs = [(level, name) for level in self.levels for name in RingService.GROUP_NAMES]
+        pairs += [tuple(row) for row in db.query(User.user_level, User.group_name).filter(
+            User.group_name.isnot(None)
+        ).distinct().order_by(User.user_level, User.group_name).limit(self.max_keys)]
+        return sum(self.register(user_level, group_name) for user_level, group_name in dict.fromkeys(pairs))
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            self._wake.clear()
+            self.refill_once()
+            self._wake.wait(self.refill_interval)
+
+    def start(self) -> None:
+        if self.depth == 0 or (self._thread is not None and self._thread.is_alive()):
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="ring-pool-refill", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "depth_target": self.depth,
+                "ring_size": self.ring_size,
+                "running": self._thread is not None and self._thread.is_alive(),
+                "pools": {f"{lvl}/{grp}": len(q) for (lvl, grp), q in self._pools.items()},
+                "hits": self.hits,
+                "misses": self.misses,
+                "unpooled": self.unpooled,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "reuse_hits": self.reuse_hits,
+                "expired": self.expired,
+                "refills": self.refills,
+                "refilled_sets": self.refilled_sets,
+                "refill_errors": self.refill_errors,
+                "refill_ms_avg": round(self.refill_ms_total / self.refills, 2) if self.refills else 0.0,
+                "refill_ms_max": round(self.refill_ms_max, 2),
+                "refill_ms_last": round(self.refill_ms_last, 2),
+            }
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_ring_pool() -> RingPool:
+    """进程内单例，首次使用时按环境变量创建。"""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = RingPool()
+    return _pool
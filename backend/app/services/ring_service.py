@@ -1,8 +1,19 @@
+import os
 import random
+from functools import lru_cache
+from sqlalchemy import bindparam, func, select, update
 from sqlalchemy.orm import Session
 from app.models import User, Ring
 from app.services.crypto_service import CryptoService
 
+# 公钥有效性 memo 的容量（公钥 hex → bool）
+PUBLIC_KEY_MEMO_SIZE = int(os.getenv("PUBLIC_KEY_MEMO_SIZE", "65536"))
+# 随机抽样：id 跨度不超过该值时直接取全集再抽；每个名额最多探测次数
+SAMPLE_SCAN_SPAN = int(os.getenv("RING_SAMPLE_SCAN_SPAN", "256"))
+SAMPLE_PROBES_PER_MEMBER = int(os.getenv("RING_SAMPLE_PROBES_PER_MEMBER", "50"))
+# 每轮探测数 = 缺口 × 该倍数（合并为一条 SQL）
+SAMPLE_PROBE_BATCH = int(os.getenv("RING_SAMPLE_PROBE_BATCH", "4"))
+
 class RingService:
     """环管理服务：生成与查询。"""
 
@@ -14,7 +25,7 @@ class RingService:
 
     @staticmethod
     def pick_group_for_user() -> str:
-        """为用户选择一个稳定的群组名称（简单随机，可扩展为按负载均衡）。"""
+        """随机选择一个群组名称（不读写计数）；登录分配队伍使用 GroupService.assign_group（最少成员优先）。"""
         import random
         return random.choice(RingService.GROUP_NAMES)
 
@@ -22,9 +33,10 @@ class RingService:
     def ensure_seed_users(db: Session, user_level: str = "medium", min_count: int = 6) -> None:
         """确保指定水平的用户数至少为 min_count（用于凑环）。
         会自动插入若干 seed 用户（anonymous_id 前缀为 seed_），其公钥使用 CryptoService.generate_keypair
-        生成有效的 secp256k1 压缩公钥。在 coincurve 不可用时，若安装了 ecdsa 也可生成有效公钥。
+        生成有效的 secp256k1 压缩公钥（任一曲线后端均可，含无本地依赖的纯 Python 后端）。
         """
-        existing = db.query(User).filter(User.user_level == user_level).count()
+        # 只需知道是否已够 min_count 个，限量计数避免大表全范围 COUNT
+        existing = db.query(User.id).filter(User.user_level == user_level).limit(min_count).count()
         to_add = max(0, min_count - int(existing or 0))
         if to_add <= 0:
             return
@@ -37,6 +49,7 @@ class RingService:
             user = User(
                 anonymous_id=anon,
                 public_key=kp['public_key'],
+                public_key_valid=RingService._is_valid_secp256k1_compressed_hex(kp['public_key']),
                 user_level=user_level,
                 group_name=None
             )
@@ -44,9 +57,11 @@ class RingService:
         db.commit()
 
     @staticmethod
+    @lru_cache(maxsize=PUBLIC_KEY_MEMO_SIZE)
     def _is_valid_secp256k1_compressed_hex(pk_hex: str) -> bool:
         """纯 Python 校验压缩公钥是否位于 secp256k1 曲线上（无需 coincurve）。
         压缩公钥：33字节，前缀 0x02/0x03 + 32字节 x。
+        公钥很少变化，结果按 hex 做进程内 memo；持久化的结果见 users.public_key_valid。
         p ≡ 3 (mod 4) 可用平方根简化：y = rhs^((p+1)//4) mod p。
         """
         if not isinstance(pk_hex, str):
@@ -82,33 +97,114 @@ class RingService:
             return False
 
     @staticmethod
-    def generate_ring(db: Session, user_public_key: str, user_level: str = "medium", group_name: str = None, ring_size: int = 5) -> dict:
-        # 确保同水平下至少有 ring_size 用户可供选取
-        RingService.ensure_seed_users(db, user_level=user_level, min_count=ring_size)
-        other_users = db.query(User).filter(
-            User.user_level == user_level,
-            User.public_key != user_public_key
-        ).limit(ring_size - 1).all()
-        # 累积有效压缩公钥
-        public_keys = []
-        # 先放入请求者公钥（若有效）
-        if RingService._is_valid_secp256k1_compressed_hex(user_public_key):
-            public_keys.append(user_public_key)
-        # 加入其他用户的有效公钥
-        for u in other_users:
-            pk = u.public_key
-            if RingService._is_valid_secp256k1_compressed_hex(pk):
-                public_keys.append(pk)
-            if len(public_keys) >= ring_size:
+    def backfill_public_key_valid(db: Session, recheck: bool = False, batch_size: int = 1000) -> dict:
+        """回填 users.public_key_valid：默认只处理 NULL 行，recheck=True 时全量重算。分批按主键推进并提交。"""
+        counts = {"checked": 0, "valid": 0, "invalid": 0}
+        last_id = 0
+        while True:
+            query = db.query(User.id, User.public_key).filter(User.id > last_id)
+            if not recheck:
+                query = query.filter(User.public_key_valid.is_(None))
+            rows = query.order_by(User.id).limit(batch_size).all()
+            if not rows:
                 break
-        # 不足则持续生成直至达到 ring_size
+            flags = [{"id": uid, "public_key_valid": RingService._is_valid_secp256k1_compressed_hex(pk)} for uid, pk in rows]
+            # ORM 按主键批量 UPDATE（executemany）
+            db.execute(update(User), flags)
+            db.commit()
+            last_id = rows[-1][0]
+            counts["checked"] += len(flags)
+            counts["valid"] += sum(1 for f in flags if f["public_key_valid"])
+        counts["invalid"] = counts["checked"] - counts["valid"]
+        return counts
+
+    @staticmethod
+    def sample_members(db: Session, user_level: str, count: int, exclude_key: str = None) -> list:
+        """在 (user_level, 公钥有效) 的用户中无放回地均匀随机抽取至多 count 个公钥，常规路径不使用 ORDER BY RANDOM()。
+
+        随机 id 探测：在 [min_id, max_id] 中取随机 r，经 ix_users_level_valid_id 索引定位第一个 id >= r 的行 j
+        及最后一个 id < r 的行 prev（各 O(log n)）。j 被命中的概率与空隙 j - prev 成正比，因此以 1/gap 的概率接受，
+        使每行被选中的概率相同。一轮的全部探测合并为一条语句；id 跨度很小时直接取全集抽样。
+        探测次数用尽（该水平在 id 空间中极稀疏，匹配行必然很少）时，缺口由剩余行 ORDER BY random() 补齐。
+        """
+        if count <= 0:
+            return []
+        lo, hi = db.execute(_sample_bounds_stmt(), {"lvl": user_level}).one()
+        if lo is None:
+            return []
+        keyed = db.query(User.id, User.public_key).filter(
+            User.user_level == user_level, User.public_key_valid.is_(True)
+        )
+        if hi - lo + 1 <= SAMPLE_SCAN_SPAN:
+            rows = [r for r in keyed.all() if r[1] != exclude_key]
+            return [pk for _, pk in random.sample(rows, min(count, len(rows)))]
+
+        chosen = {}
+        probes_left = SAMPLE_PROBES_PER_MEMBER * count
+        while len(chosen) < count and probes_left > 0:
+            # 每轮按缺口的数倍发起探测，多数情况下一轮即可凑齐
+            batch = min(probes_left, SAMPLE_PROBE_BATCH * (count - len(chosen)))
+            probes_left -= batch
+            params = {f"r{i}": random.randint(lo, hi) for i in range(batch)}
+            params["lvl"] = user_level
+            row = db.execute(_sample_probe_stmt(batch), params).one()
+            accepted = []
+            for i in range(batch):
+                j, prev = row[2 * i], row[2 * i + 1]
+                if j is None or j in chosen or j in accepted:
+                    continue
+                gap = j - (prev if prev is not None else lo - 1)
+                # 拒绝采样：按 1/gap 接受，抵消空隙带来的偏差
+                if random.random() * gap < 1:
+                    accepted.append(j)
+            if accepted:
+                keys = dict(keyed.filter(User.id.in_(accepted)).all())
+                for j in accepted:
+                    if len(chosen) < count and keys.get(j) not in (None, exclude_key):
+                        chosen[j] = keys[j]
+        if len(chosen) < count:
+            # 探测次数用尽（该水平极稀疏）时在未选中的行中随机补齐，不退回按 id 顺序取前几行
+            rest = keyed
+            if chosen:
+                rest = rest.filter(User.id.notin_(list(chosen)))
+            if exclude_key is not None:
+                rest = rest.filter(User.public_key != exclude_key)
+            for uid, pk in rest.order_by(func.random()).limit(count - len(chosen)).all():
+                chosen[uid] = pk
+        return list(chosen.values())
+
+    @staticmethod
+    def select_members(db: Session, user_level: str, exclude_key: str = None, count: int = 4) -> list:
+        """挑选 count 个同水平用户的有效压缩公钥（排除 exclude_key），不足时生成临时公钥补齐。"""
+        # 确保同水平下至少有 count + 1 用户可供选取
+        RingService.ensure_seed_users(db, user_level=user_level, min_count=count + 1)
+        # 有效性已在写入公钥时持久化，SQL 直接过滤后随机抽样，建环路径上不再做曲线运算
+        public_keys = RingService.sample_members(db, user_level, count, exclude_key=exclude_key)
+        if len(public_keys) < count:
+            # 兜底：尚未回填（public_key_valid 为 NULL）的旧行现场校验并回写标记
+            legacy = db.query(User).filter(User.user_level == user_level, User.public_key_valid.is_(None))
+            if exclude_key is not None:
+                legacy = legacy.filter(User.public_key != exclude_key)
+            legacy_users = legacy.limit(4 * count).all()
+            for u in legacy_users:
+                u.public_key_valid = RingService._is_valid_secp256k1_compressed_hex(u.public_key)
+                if u.public_key_valid and len(public_keys) < count:
+                    public_keys.append(u.public_key)
+            if legacy_users:
+                db.commit()
+        # 不足则持续生成直至达到 count
         safety = 0
-        while len(public_keys) < ring_size and safety < 50:
+        while len(public_keys) < count and safety < 50:
             mock = CryptoService.generate_keypair()
             if RingService._is_valid_secp256k1_compressed_hex(mock['public_key']):
                 public_keys.append(mock['public_key'])
             safety += 1
+        return public_keys
 
+    @staticmethod
+    def create_ring(db: Session, public_keys: list, user_level: str = "medium", group_name: str = None) -> dict:
+        """打乱成员顺序并写入一个新环。"""
+        public_keys = list(public_keys)
         random.shuffle(public_keys)
         ring_id = CryptoService.generate_ring_id()
         # 若传入 group_name 则使用，否则随机（兼容旧逻辑）
@@ -126,6 +222,40 @@ class RingService:
 
         return {"ring_id": ring_id, "ring_public_keys": public_keys, "group_name": group_name}
 
+    @staticmethod
+    def generate_ring(db: Session, user_public_key: str, user_level: str = "medium", group_name: str = None, ring_size: int = 5) -> dict:
+        """现场构建一个环：请求者公钥（若有效）+ 同水平其他用户公钥，共 ring_size 个。"""
+        public_keys = []
+        # 先放入请求者公钥（若有效）
+        if RingService._is_valid_secp256k1_compressed_hex(user_public_key):
+            public_keys.append(user_public_key)
+        public_keys += RingService.select_members(
+            db, user_level, exclude_key=user_public_key, count=ring_size - len(public_keys)
+        )
+        return RingService.create_ring(db, public_keys, user_level, group_name)
+
     @staticmethod
     def get_ring_by_id(db: Session, ring_id: str):
         return db.query(Ring).filter(Ring.ring_id == ring_id).first()
+
+
+def _sample_first_id(*extra, desc=False):
+    order = User.id.desc() if desc else User.id
+    return (select(User.id)
+            .where(User.user_level == bindparam("lvl"), User.public_key_valid.is_(True), *extra)
+            .order_by(order).limit(1).scalar_subquery())
+
+
+@lru_cache(maxsize=1)
+def _sample_bounds_stmt():
+    return select(_sample_first_id(), _sample_first_id(desc=True))
+
+
+@lru_cache(maxsize=64)
+def _sample_probe_stmt(n: int):
+    """n 个探测点合并成一条 SELECT：每个点取 (第一个 id >= r, 最后一个 id < r)。语句按 n 缓存，免去每次构建与编译。"""
+    cols = []
+    for i in range(n):
+        r = bindparam(f"r{i}")
+        cols += [_sample_first_id(User.id >= r), _sample_first_id(User.id < r, desc=True)]
+    return select(*cols)
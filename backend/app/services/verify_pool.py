@@ -0,0 +1,234 @@
+import asyncio
+import hashlib
+import os
+import threading
+from functools import partial
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from typing import List, Tuple
+
+from app.services.cache_service import TTLCache
+from app.services.crypto_service import CryptoService, get_curve_backend
+
+# 验证执行器：auto（默认）/ thread / process / inline（直接在事件循环上执行，仅用于对比测试）
+VERIFY_EXECUTOR = os.getenv("RING_VERIFY_EXECUTOR", "auto")
+# 纯 Python 实现的曲线后端：验证全程持有 GIL，线程池只能限流，验证期间仍会拖慢事件循环与其他请求；
+# coincurve 在 C 调用期间释放 GIL，线程池即可并行
+GIL_BOUND_BACKENDS = ("pure", "ecdsa")
+VERIFY_WORKERS = int(os.getenv("RING_VERIFY_WORKERS", str(min(4, os.cpu_count() or 1))))
+# 等待队列长度：在途任务数超过 workers + queue 时拒绝新任务（503）
+VERIFY_QUEUE = int(os.getenv("RING_VERIFY_QUEUE", "64"))
+# 验证结果缓存：客户端超时重试、负载均衡重复投递的相同签名直接返回已有结论；容量 0 表示关闭
+VERDICT_CACHE_SIZE = int(os.getenv("RING_VERDICT_CACHE_SIZE", "4096"))
+VERDICT_CACHE_TTL = float(os.getenv("RING_VERDICT_CACHE_TTL", "120"))
+
+
+class PoolSaturated(Exception):
+    """验证池已满，调用方应返回 503 让客户端稍后重试。"""
+
+
+def resolve_executor(executor: str) -> str:
+    """auto：当前曲线后端持有 GIL 时用进程池，否则用线程池；显式配置线程池 + 纯 Python 后端时打印警告。"""
+    backend = get_curve_backend().name
+    if executor == "auto":
+        return "process" if backend in GIL_BOUND_BACKENDS else "thread"
+    if executor == "thread" and backend in GIL_BOUND_BACKENDS:
+        print(f"[WARN] RING_VERIFY_EXECUTOR=thread with the {backend} curve backend: verification holds the GIL, "
+              f"so the thread pool only limits concurrency; use process instead")
+    return executor
+
+
+class VerificationPool:
+    """把 CPU 密集的环签名验证移出 asyncio 事件循环。
+
+    任务提交到线程池或进程池（等价于 run_in_executor，但名额挂在执行器 future 上）；在途任务数（执行中 + 排队）有上限，
+    超过上限立即抛出 PoolSaturated，而不是让请求无限堆积。
+    """
+
+    def __init__(self, executor: str = VERIFY_EXECUTOR, workers: int = VERIFY_WORKERS, queue: int = VERIFY_QUEUE,
+                 verdict_cache_size: int = VERDICT_CACHE_SIZE, verdict_cache_ttl: float = VERDICT_CACHE_TTL):
+        if executor not in ("auto", "thread", "process", "inline"):
+            raise ValueError(f"unknown executor: {executor}")
+        executor = resolve_executor(executor)
+        self.kind = executor
+        self.workers = max(1, int(workers))
+        self.capacity = self.workers + max(0, int(queue))
+        if executor == "thread":
+            self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="ring-verify")
+        elif executor == "process":
+            self._executor = ProcessPoolExecutor(max_workers=self.workers)
+        else:
+            self._executor = None
+        self._lock = threading.Lock()
+        self.in_flight = 0
+        self.peak = 0
+        self.completed = 0
+        self.rejected = 0
+        # 验证结论缓存（签名与环公钥确定时结论不变，通过/不通过都缓存）与在途验证表（single-flight）
+        self._verdicts = TTLCache(maxsize=verdict_cache_size, ttl=verdict_cache_ttl) if verdict_cache_size > 0 else None
+        self._flights = {}
+        self.coalesced = 0
+
+    def _acquire(self, n: int) -> None:
+        with self._lock:
+            if self.in_flight + n > self.capacity:
+                self.rejected += n
+                raise PoolSaturated(f"verification queue full ({self.in_flight}/{self.capacity})")
+            self.in_flight += n
+            self.peak = max(self.peak, self.in_flight)
+
+    def _release(self, _future=None) -> None:
+        with self._lock:
+            self.in_flight -= 1
+            self.completed += 1
+
+    async def run(self, fn, *args):
+        """提交一个任务并等待结果；名额在执行器任务真正结束时才归还（客户端断开也不例外）。"""
+        self._acquire(1)
+        return await self._submit(fn, *args)
+
+    async def _submit(self, fn, *args):
+        if self._executor is None:
+            try:
+                return fn(*args)
+            finally:
+                self._release()
+        try:
+            future = self._executor.submit(fn, *args)
+        except Exception:
+            self._release()
+            raise
+        future.add_done_callback(self._release)
+        return await asyncio.wrap_future(future)
+
+    @staticmethod
+    def verdict_key(message: bytes, ring_pubkeys_hex: List[str], c0_hex: str, s_list_hex: List[str],
+                    ring_id: str = None) -> str:
+        """验证结论缓存键：SHA-256(ring_id | message | c0 | s[])；没有 ring_id 时以环公钥列表代替。"""
+        h = hashlib.sha256()
+        ring = ring_id.encode() if ring_id is not None else "\n".join(ring_pubkeys_hex).encode()
+        for part in (ring, message, str(c0_hex).encode(), *(str(s).encode() for s in s_list_hex)):
+            # 带长度前缀，避免字段拼接产生歧义
+            h.update(len(part).to_bytes(4, "big"))
+            h.update(part)
+        return h.hexdigest()
+
+    def _cached_verdict(self, key: str):
+        return self._verdicts.get(key) if self._verdicts is not None else None
+
+    def _land(self, key: str, task) -> None:
+        """在途验证结束：移出在途表，正常完成时写入结论缓存（异常与取消不缓存）。"""
+        self._flights.pop(key, None)
+        if self._verdicts is not None and not task.cancelled() and task.exception() is None:
+            self._verdicts.set(key, task.result()[0])
+
+    async def verify(self, message: bytes, ring_pubkeys_hex: List[str], c0_hex: str, s_list_hex: List[str],
+                     ring_id: str = None) -> bool:
+        """单条验证（同一环的多条签名请用 verify_batch）。
+
+        先查结论缓存；同一签名已有在途验证时直接等待它的结果（single-flight），不重复提交。
+        验证任务与发起请求解耦（shield），发起者断开不影响其他等待者。
+        """
+        key = self.verdict_key(message, ring_pubkeys_hex, c0_hex, s_list_hex, ring_id)
+        cached = self._cached_verdict(key)
+        if cached is not None:
+            return cached
+        task = self._flights.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self.run(
+                CryptoService.ring_verify_many, ring_pubkeys_hex, ring_id, [(message, c0_hex, s_list_hex)]
+            ))
+            self._flights[key] = task
+            task.add_done_callback(partial(self._land, key))
+        else:
+            with self._lock:
+                self.coalesced += 1
+        results = await asyncio.shield(task)
+        return results[0]
+
+    async def verify_batch(self, items: List[Tuple[bytes, List[str], str, List[str], str]]) -> List[bool]:
+        """批量验证：与 CryptoService.ring_verify_batch 相同的分组/切块，各块作为独立任务并行提交。
+
+        所有块的名额一次性预占，避免半批已提交、半批被拒的情况；因此块数超过池容量的批次总会被拒，
+        默认配置下（RING_BATCH_MAX_ITEMS / BATCH_VERIFY_CHUNK = 16 块 ≤ workers + 64）不会发生。
+        """
+        verdicts = [False] * len(items)
+        keys = [self.verdict_key(msg, pubkeys, c0, s_list, ring_id) for msg, pubkeys, c0, s_list, ring_id in items]
+        # 已有结论的条目不再验证，其余按原下标提交
+        pending = []
+        for idx, key in enumerate(keys):
+            cached = self._cached_verdict(key)
+            if cached is None:
+                pending.append(idx)
+            else:
+                verdicts[idx] = cached
+        tasks = CryptoService.plan_verify_batch([items[idx] for idx in pending])
+        if not tasks:
+            return verdicts
+        self._acquire(len(tasks))
+        outcomes = await asyncio.gather(*[
+            self._submit(CryptoService.ring_verify_many, pubkeys, ring_id, [sig for _, sig in entries])
+            for pubkeys, ring_id, entries in tasks
+        ])
+        for (_, _, entries), results in zip(tasks, outcomes):
+            for (pos, _), ok in zip(entries, results):
+                idx = pending[pos]
+                verdicts[idx] = ok
+                if self._verdicts is not None:
+                    self._verdicts.set(keys[idx], ok)
+        return verdicts
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "executor": self.kind,
+                "workers": self.workers,
+                "capacity": self.capacity,
+                "in_flight": self.in_flight,
+                "peak_in_flight": self.peak,
+                "completed": self.completed,
+                "rejected": self.rejected,
+                "coalesced": self.coalesced,
+                "in_flight_signatures": len(self._flights),
+                "verdict_cache": self._verdicts.stats() if self._verdicts is not None else None,
+            }
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_verify_pool() -> VerificationPool:
+    """进程内单例，首次使用时按环境变量创建。"""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = VerificationPool()
+    return _pool
+
+
+def configure_verify_pool(executor: str = None, workers: int = None, queue: int = None) -> VerificationPool:
+    """替换当前单例（基准测试 / 运行时调参用），旧池不再接收新任务。"""
+    global _pool
+    with _pool_lock:
+        old = _pool
+        _pool = VerificationPool(
+            executor or VERIFY_EXECUTOR,
+            VERIFY_WORKERS if workers is None else workers,
+            VERIFY_QUEUE if queue is None else queue,
+        )
+    if old is not None:
+        old.shutdown()
+    return _pool
+
+
+def shutdown_verify_pool() -> None:
+    global _pool
+    with _pool_lock:
+        old, _pool = _pool, None
+    if old is not None:
+        old.shutdown()
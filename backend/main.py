@@ -1,36 +1,105 @@
+import os
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from app.database import engine
+from app.database import engine, async_engine, SessionLocal
 from app import models
+from app.migrations import run_schema_migrations
 from app.routers import heatmap, leaderboard
 from app.routers import user as user_router
-from sqlalchemy import text
+from app.services.heatmap_service import HeatmapService
+from app.services.leaderboard_service import LeaderboardService
+from app.services.group_service import GroupService
+from app.services.verify_pool import shutdown_verify_pool
+from app.services.ring_pool import get_ring_pool
+from app.services.replay_guard import get_replay_guard
 
 # 创建数据库表（如果不存在）
 models.Base.metadata.create_all(bind=engine)
 
-def run_sqlite_migrations():
-    """在应用启动时执行轻量级SQLite迁移，补齐新增字段。"""
+def run_migrations():
+    """在应用启动时执行轻量级迁移，补齐新增字段和索引（SQLite / PostgreSQL 通用）。"""
     try:
-        with engine.connect() as conn:
-            # users 表：group_name 字段
-            cols = conn.execute(text("PRAGMA table_info(users);")).fetchall()
-            col_names = {c[1] for c in cols}
-            if 'group_name' not in col_names:
-                conn.execute(text("ALTER TABLE users ADD COLUMN group_name VARCHAR(100);"))
-
-            # group_scores 表：group_name、user_anonymous_id 字段
-            cols = conn.execute(text("PRAGMA table_info(group_scores);")).fetchall()
-            col_names = {c[1] for c in cols}
-            if 'group_name' not in col_names:
-                conn.execute(text("ALTER TABLE group_scores ADD COLUMN group_name VARCHAR(100);"))
-            if 'user_anonymous_id' not in col_names:
-                conn.execute(text("ALTER TABLE group_scores ADD COLUMN user_anonymous_id VARCHAR(100);"))
+        applied = run_schema_migrations(engine)
+        if applied:
+            print(f"[INFO] Schema migrations applied: {', '.join(applied)}")
     except Exception as e:
         # 迁移失败不应阻断服务，但记录日志
-        print(f"[WARN] SQLite migrations failed: {e}")
+        print(f"[WARN] Schema migrations failed: {e}")
 
-run_sqlite_migrations()
+run_migrations()
+
+def bootstrap_heatmap_cells():
+    """已有数据库首次升级时，聚合表（heatmap_cells / heatmap_rollups / heatmap_buckets）为空而 heatmap_data 有数据，则一次性重建。"""
+    db = SessionLocal()
+    try:
+        has_cells = db.query(models.HeatmapCell.x).first() is not None
+        has_rollups = db.query(models.HeatmapRollup.x).first() is not None
+        has_buckets = db.query(models.HeatmapBucket.x).first() is not None
+        has_raw = db.query(models.HeatmapData.id).first() is not None
+        if has_raw and not (has_cells and has_rollups and has_buckets):
+            count = HeatmapService.rebuild_cell_aggregates(db)
+            print(f"[INFO] Rebuilt heatmap_cells: {count} cells")
+    except Exception as e:
+        db.rollback()
+        print(f"[WARN] heatmap_cells bootstrap failed: {e}")
+    finally:
+        db.close()
+
+bootstrap_heatmap_cells()
+
+def bootstrap_group_stats():
+    """已有数据库首次升级时，group_stats 为空而 group_scores 有数据，则一次性重建运行汇总。"""
+    db = SessionLocal()
+    try:
+        has_stats = db.query(models.GroupStats.group_name).first() is not None
+        has_scores = db.query(models.GroupScore.id).first() is not None
+        if has_scores and not has_stats:
+            count = LeaderboardService.rebuild_group_stats(db)
+            print(f"[INFO] Rebuilt group_stats: {count} groups")
+    except Exception as e:
+        db.rollback()
+        print(f"[WARN] group_stats bootstrap failed: {e}")
+    finally:
+        db.close()
+
+bootstrap_group_stats()
+
+# 演示排行榜种子只在开发环境（APP_ENV=dev）默认开启，其他环境需显式设置 LEADERBOARD_SEED_ON_STARTUP=1
+APP_ENV = os.getenv("APP_ENV", "production")
+LEADERBOARD_SEED_ON_STARTUP = os.getenv("LEADERBOARD_SEED_ON_STARTUP", "1" if APP_ENV == "dev" else "0") == "1"
+
+def bootstrap_leaderboard_seed():
+    """启动时一次性播种演示排行榜（持久化标记保证只执行一次），由 LEADERBOARD_SEED_ON_STARTUP 控制。"""
+    if not LEADERBOARD_SEED_ON_STARTUP:
+        return
+    db = SessionLocal()
+    try:
+        inserted = LeaderboardService.bootstrap_demo_seed(db)
+        if inserted:
+            print(f"[INFO] Seeded leaderboard demo data: {inserted} scores")
+    except Exception as e:
+        db.rollback()
+        print(f"[WARN] leaderboard seed failed: {e}")
+    finally:
+        db.close()
+
+bootstrap_leaderboard_seed()
+
+def bootstrap_groups():
+    """确保固定群组都有群密钥，并载入进程内的组名→密钥映射（登录时不再查 groups 表）；
+    旧库首次升级时按 users 表一次性回填群组成员计数。"""
+    db = SessionLocal()
+    try:
+        GroupService.bootstrap(db)
+        if GroupService.backfill_member_counts(db):
+            print("[INFO] Backfilled group member counts")
+    except Exception as e:
+        db.rollback()
+        print(f"[WARN] group bootstrap failed: {e}")
+    finally:
+        db.close()
+
+bootstrap_groups()
 
 app = FastAPI(
     title="运动隐私保护系统 API",
@@ -53,12 +122,54 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    # 二进制热力图的元数据放在响应头中，需显式暴露给浏览器
+    expose_headers=["X-Heatmap-Count", "X-Heatmap-Zoom", "X-Heatmap-Cell-Size"],
 )
 
 app.include_router(heatmap.router, prefix="/api/heatmap", tags=["热力图"])
 app.include_router(leaderboard.router, prefix="/api/leaderboard", tags=["排行榜"])
 app.include_router(user_router.router, prefix="/api/user", tags=["用户"])
 
+@app.on_event("startup")
+def start_ring_pool():
+    """登记现有用户的 (user_level, group_name) 组合并启动环池后台补充线程。"""
+    pool = get_ring_pool()
+    db = SessionLocal()
+    try:
+        pool.warm_from_users(db)
+    except Exception as e:
+        print(f"[WARN] ring pool warm-up failed: {e}")
+    finally:
+        db.close()
+    pool.start()
+
+@app.on_event("startup")
+def warm_replay_guard():
+    """把已登记的签名摘要载入防重放布隆过滤器；失败时过滤器为空，仍由 signature_digests 唯一约束兜底。"""
+    db = SessionLocal()
+    try:
+        loaded = get_replay_guard().warm(db)
+        if loaded:
+            print(f"[INFO] Replay guard warmed: {loaded} signature digests")
+    except Exception as e:
+        print(f"[WARN] replay guard warm-up failed: {e}")
+    finally:
+        db.close()
+
+@app.on_event("shutdown")
+def close_verify_pool():
+    # 关闭环签名验证池（进程池模式下回收子进程）
+    shutdown_verify_pool()
+
+@app.on_event("shutdown")
+def stop_ring_pool():
+    get_ring_pool().stop()
+
+@app.on_event("shutdown")
+async def close_async_engine():
+    # aiosqlite 每个连接一个非守护线程，不释放连接池会阻止进程退出
+    await async_engine.dispose()
+
 @app.get("/")
 async def root():
     return {
@@ -67,7 +178,8 @@ async def root():
         "endpoints": {
             "heatmap": {
                 "GET /api/heatmap/": "获取热力图数据",
-                "POST /api/heatmap/data": "上传热力图数据"
+                "POST /api/heatmap/data": "上传热力图数据",
+                "POST /api/heatmap/data/stream": "NDJSON 流式批量导入热力图数据"
             },
             "leaderboard": {
                 "POST /api/leaderboard/request-ring": "请求匿名环",
@@ -75,7 +187,8 @@ async def root():
                 "GET /api/leaderboard/": "获取群体排行榜"
             },
             "user": {
-                "POST /api/user/login": "用户登录（首次分配固定队伍）"
+                "POST /api/user/login": "用户登录（首次分配固定队伍）",
+                "GET /api/user/group-sizes": "各群组成员数（管理）"
             }
         }
     }
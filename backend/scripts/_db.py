@@ -0,0 +1,49 @@
+"""
+Shared database selection for the maintenance scripts.
+
+Every script works against the SQLite file given by --db, or against any
+SQLAlchemy URL given by --url (default $DATABASE_URL when set), e.g. PostgreSQL.
+
+Usage inside a script:
+  from _db import add_db_args, resolve_url
+
+  add_db_args(parser)
+  args = parser.parse_args()
+  engine = create_engine(resolve_url(args))
+"""
+import argparse
+import os
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.append(str(ROOT))
+
+from app.database import check_backend
+
+DEF_DB_PATH = ROOT / 'sports_privacy.db'
+
+
+def add_db_args(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument('--db', type=Path, default=DEF_DB_PATH, help='Path to SQLite DB (default: backend/sports_privacy.db)')
+    parser.add_argument('--url', default=os.getenv('DATABASE_URL'), help='SQLAlchemy database URL (overrides --db; default: $DATABASE_URL)')
+
+
+def resolve_url(args, must_exist: bool = True) -> str:
+    """Return --url when given, otherwise the SQLite URL for --db.
+
+    Exits with status 2 when the SQLite file is missing (unless must_exist is
+    False, e.g. for seeding a fresh database) or the backend is unsupported.
+    """
+    if args.url:
+        try:
+            check_backend(args.url)
+        except ValueError as e:
+            print(e)
+            sys.exit(2)
+        return args.url
+    db_path: Path = args.db.resolve()
+    if must_exist and not db_path.exists():
+        print(f"Database not found: {db_path}")
+        sys.exit(2)
+    return f"sqlite:///{db_path}"
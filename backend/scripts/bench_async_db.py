@@ -0,0 +1,186 @@
+#!/usr/bin/env python3
+"""
+Load test: requests per worker with the async DB layer vs. a blocking sync Session.
+
+Both variants run in-process on one event loop (httpx.AsyncClient + ASGITransport,
+like a single uvicorn worker) against the same pre-filled SQLite file:
+
+  sync   async def handlers calling the sync Session from get_db, which is how the
+         routers were written before the port. Every query blocks the event loop.
+  async  the real app (main.app): AsyncSession from get_async_db, with queries on
+         aiosqlite's connection threads
+
+C concurrent clients loop over a mix of heatmap viewport reads, full heatmap
+reads, heatmap uploads and leaderboard reads. A lag monitor sleeps 10 ms in a loop
+and records how late it wakes up. That is how long any other request on the
+worker (even /health) would wait. The script reports requests/s, p50/p99
+latency and loop lag per variant and concurrency level.
+
+Examples:
+  python backend/scripts/bench_async_db.py
+  python backend/scripts/bench_async_db.py --concurrency 8 32 128 --seconds 5 --cells 90000
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+from types import SimpleNamespace
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.append(str(ROOT))
+
+
+def percentile(samples, pct):
+    if not samples:
+        return None
+    ordered = sorted(samples)
+    k = min(len(ordered) - 1, int(round(pct / 100.0 * (len(ordered) - 1))))
+    return round(ordered[k] * 1000, 2)
+
+
+def build_sync_app():
+    """改造前的路由写法：async def 处理函数里直接调用同步 Session，查询期间阻塞事件循环。"""
+    from fastapi import Depends, FastAPI
+    from sqlalchemy.orm import Session
+    from app.database import get_db
+    from app.schemas import HeatmapDataCreate
+    from app.services.heatmap_service import HeatmapService
+    from app.services.leaderboard_service import LeaderboardService
+
+    app = FastAPI()
+
+    @app.post("/api/heatmap/data")
+    async def upload(data: HeatmapDataCreate, db: Session = Depends(get_db)):
+        HeatmapService.store_heatmap_data(db, data.anonymous_id, data.data)
+        return {"status": "success"}
+
+    @app.get("/api/heatmap/")
+    async def heatmap(db: Session = Depends(get_db), x_min: int = None, x_max: int = None,
+                      y_min: int = None, y_max: int = None):
+        query = dict(x_min=x_min, x_max=x_max, y_min=y_min, y_max=y_max)
+        # 与 app/routers/heatmap.py 默认记录格式相同的计算路径，只有数据库访问方式不同
+        rows = HeatmapService.get_global_heatmap(db, **query)
+        return {"heatmap": HeatmapService.attenuate_center(rows)}
+
+    @app.get("/api/leaderboard/")
+    async def leaderboard(db: Session = Depends(get_db)):
+        return {"leaderboard": LeaderboardService.get_leaderboard(db)}
+
+    @app.get("/health")
+    async def health():
+        return {"status": "healthy"}
+
+    return app
+
+
+def fill_database(cells, seed=5):
+    from app.database import SessionLocal
+    from app.services.heatmap_service import HeatmapService
+
+    rng = random.Random(seed)
+    side = max(1, int(cells ** 0.5))
+    points = [SimpleNamespace(x=x, y=y, weight=rng.random()) for x in range(side) for y in range(side)]
+    db = SessionLocal()
+    try:
+        for start in range(0, len(points), 5000):
+            HeatmapService.store_heatmap_data(db, f'fill_{start}', points[start:start + 5000])
+    finally:
+        db.close()
+    return side
+
+
+async def run_variant(app, side, concurrency, args):
+    import httpx
+
+    transport = httpx.ASGITransport(app=app)
+    latencies, lags, errors = [], [], {}
+    rng = random.Random(concurrency)
+    async with httpx.AsyncClient(transport=transport, base_url='http://bench', timeout=60) as client:
+        await client.get('/api/leaderboard/')
+        deadline = time.perf_counter() + args.seconds
+
+        async def one_request(i):
+            kind = i % 10
+            if kind < 5:
+                x0, y0 = rng.randrange(side), rng.randrange(side)
+                return await client.get('/api/heatmap/', params={
+                    'x_min': x0, 'x_max': x0 + 30, 'y_min': y0, 'y_max': y0 + 30})
+            if kind < 6:
+                return await client.get('/api/heatmap/')
+            if kind < 8:
+                data = [{'x': rng.randrange(side), 'y': rng.randrange(side), 'weight': rng.random()}
+                        for _ in range(args.points)]
+                return await client.post('/api/heatmap/data', json={'anonymous_id': f'bench_{i}', 'data': data})
+            return await client.get('/api/leaderboard/')
+
+        async def worker(w):
+            i = w
+            while time.perf_counter() < deadline:
+                started = time.perf_counter()
+                resp = await one_request(i)
+                if resp.status_code == 200:
+                    latencies.append(time.perf_counter() - started)
+                else:
+                    detail = resp.json().get('detail', '')[:60]
+                    errors[detail] = errors.get(detail, 0) + 1
+                i += concurrency
+
+        async def lag_monitor():
+            while time.perf_counter() < deadline:
+                started = time.perf_counter()
+                await asyncio.sleep(0.01)
+                lags.append(max(0.0, time.perf_counter() - started - 0.01))
+
+        await asyncio.gather(*[worker(w) for w in range(concurrency)], lag_monitor())
+    return {
+        'requests_per_s': round(len(latencies) / args.seconds, 1),
+        'p50_ms': percentile(latencies, 50),
+        'p99_ms': percentile(latencies, 99),
+        'errors': errors,
+        'loop_lag_p50_ms': percentile(lags, 50),
+        'loop_lag_p99_ms': percentile(lags, 99),
+        'loop_lag_max_ms': percentile(lags, 100),
+    }
+
+
+async def run_all(variants, side, args):
+    from app.database import async_engine
+    report = {}
+    for concurrency in args.concurrency:
+        row = {}
+        for name, app in variants.items():
+            row[name] = await run_variant(app, side, concurrency, args)
+        report[str(concurrency)] = row
+    await async_engine.dispose()
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Load test: async DB layer vs blocking sync Session')
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[8, 32, 128], help='Concurrent clients')
+    parser.add_argument('--seconds', type=float, default=4.0, help='Duration per variant and concurrency level')
+    parser.add_argument('--cells', type=int, default=40000, help='Heatmap cells pre-filled into the database')
+    parser.add_argument('--points', type=int, default=50, help='Points per heatmap upload')
+    args = parser.parse_args()
+
+    os.chdir(tempfile.mkdtemp(prefix='bench_async_db_'))
+    os.environ.setdefault('LEADERBOARD_SEED_ON_STARTUP', '0')
+
+    import main as app_main
+    side = fill_database(args.cells)
+    variants = {'sync': build_sync_app(), 'async': app_main.app}
+    report = {
+        'cells': side * side,
+        'seconds': args.seconds,
+        'concurrency': asyncio.run(run_all(variants, side, args)),
+    }
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+
+
+if __name__ == '__main__':
+    main()
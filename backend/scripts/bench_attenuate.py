@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmark for heatmap center attenuation: list-of-dicts vs. NumPy columns.
+
+Compares HeatmapService.attenuate_center (three Python passes over dicts) with
+HeatmapService.attenuate_center_columns (vectorized centroid + radius mask) and
+checks that both produce the same weights.
+
+Examples:
+  python backend/scripts/bench_attenuate.py
+  python backend/scripts/bench_attenuate.py --sizes 10000,100000 --repeat 5
+"""
+import argparse
+import json
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.append(str(ROOT))
+
+from app.services.heatmap_service import HeatmapService, np
+
+
+def best_of(fn, repeat: int) -> float:
+    best = float('inf')
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark attenuate_center implementations')
+    parser.add_argument('--sizes', default='10000,100000,1000000', help='Comma separated cell counts')
+    parser.add_argument('--repeat', type=int, default=3, help='Take the best of N runs')
+    parser.add_argument('--radius', type=float, default=50.0, help='Attenuation radius (grid units)')
+    args = parser.parse_args()
+
+    if np is None:
+        print('numpy is not installed; nothing to compare.')
+        sys.exit(2)
+
+    rng = np.random.default_rng(7)
+    results = []
+    for n in (int(s) for s in args.sizes.split(',') if s.strip()):
+        xs = rng.integers(116000, 117000, size=n, dtype=np.int64)
+        ys = rng.integers(39500, 40500, size=n, dtype=np.int64)
+        ws = rng.exponential(2.0, size=n)
+        records = [{'x': x, 'y': y, 'weight': w} for x, y, w in zip(xs.tolist(), ys.tolist(), ws.tolist())]
+
+        out_list = HeatmapService.attenuate_center(records, factor=0.7, radius=args.radius)
+        _, _, out_ws = HeatmapService.attenuate_center_columns(xs, ys, ws, factor=0.7, radius=args.radius)
+        same = bool(np.allclose(np.fromiter((r['weight'] for r in out_list), dtype=np.float64, count=n), out_ws))
+
+        t_list = best_of(lambda: HeatmapService.attenuate_center(records, factor=0.7, radius=args.radius), args.repeat)
+        t_cols = best_of(lambda: HeatmapService.attenuate_center_columns(xs, ys, ws, factor=0.7, radius=args.radius), args.repeat)
+        results.append({
+            'cells': n,
+            'list_ms': round(t_list * 1000, 3),
+            'columns_ms': round(t_cols * 1000, 3),
+            'speedup': round(t_list / t_cols, 1) if t_cols > 0 else None,
+            'equivalent': same,
+        })
+    print(json.dumps(results, ensure_ascii=False, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+"""
+Benchmark the pluggable secp256k1 curve backends (coincurve / pure / ecdsa).
+
+For every installed backend reports operations per second for k*G, k*P and
+point decoding, plus ring_sign / ring_verify throughput at a given ring size.
+The pure-Python backend's one-off fixed-base table build is reported separately.
+
+Examples:
+  python backend/scripts/bench_curve_backends.py
+  python backend/scripts/bench_curve_backends.py --backends pure ecdsa --ring-size 16 --iterations 20
+"""
+import argparse
+import json
+import secrets
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.append(str(ROOT))
+
+from app.services.crypto_service import (
+    CryptoService, PurePythonBackend, SECP256K1_N, available_curve_backends, make_curve_backend
+)
+
+
+def per_second(fn, iterations):
+    started = time.perf_counter()
+    for _ in range(iterations):
+        fn()
+    return round(iterations / (time.perf_counter() - started), 1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark secp256k1 curve backends')
+    parser.add_argument('--backends', nargs='+', default=available_curve_backends())
+    parser.add_argument('--ring-size', type=int, default=8)
+    parser.add_argument('--iterations', type=int, default=50, help='Iterations per measurement')
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    PurePythonBackend()._base_table()
+    report = {
+        'ring_size': args.ring_size,
+        'pure_base_table_build_ms': round((time.perf_counter() - started) * 1000, 1),
+        'backends': {},
+    }
+
+    keypairs = [CryptoService.generate_keypair() for _ in range(args.ring_size)]
+    ring = [kp['public_key'] for kp in keypairs]
+    message = b"bench|5.0|6.0"
+    scalar = lambda: secrets.randbelow(SECP256K1_N - 1) + 1
+
+    for name in args.backends:
+        b = make_curve_backend(name)
+        b.base_mul(1)  # 预热（纯 Python 后端在此构建定基点表）
+        point = b.base_mul(scalar())
+        encoded = b.encode_point(point)
+        c0, s_list = CryptoService.ring_sign(message, keypairs[0]['private_key'], list(ring), backend=b)
+        sig_iters = max(1, args.iterations // args.ring_size)
+        report['backends'][name] = {
+            'base_mul_per_s': per_second(lambda: b.base_mul(scalar()), args.iterations),
+            'point_mul_per_s': per_second(lambda: b.point_mul(point, scalar()), args.iterations),
+            'decode_per_s': per_second(lambda: b.decode_point(encoded), args.iterations),
+            'ring_sign_per_s': per_second(
+                lambda: CryptoService.ring_sign(message, keypairs[0]['private_key'], list(ring), backend=b), sig_iters),
+            'ring_verify_per_s': per_second(
+                lambda: CryptoService.ring_verify(message, ring, c0, s_list, ring_id='bench', backend=b), sig_iters),
+        }
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""
+Benchmark heatmap upload ingestion: per-object ORM path vs. bulk executemany path.
+
+Each "upload" mimics one finished run (POST /api/heatmap/data) and goes through
+HeatmapService.store_heatmap_data against a throwaway SQLite file, so the
+numbers include the heatmap_cells upsert and the commit.
+
+Examples:
+  python backend/scripts/bench_heatmap_ingest.py
+  python backend/scripts/bench_heatmap_ingest.py --uploads 50 --cells 800 --batch-sizes 100,500,2000
+"""
+import argparse
+import json
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+from types import SimpleNamespace
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.append(str(ROOT))
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.database import Base
+from app.services.heatmap_service import HeatmapService
+
+
+def make_uploads(n_uploads: int, n_cells: int, seed: int = 7):
+    rnd = random.Random(seed)
+    uploads = []
+    for i in range(n_uploads):
+        cx, cy = 116407 + rnd.randint(-50, 50), 39904 + rnd.randint(-50, 50)
+        cells = [
+            SimpleNamespace(x=cx + rnd.randint(-30, 30), y=cy + rnd.randint(-30, 30), weight=rnd.uniform(0.0, 3.0))
+            for _ in range(n_cells)
+        ]
+        uploads.append((f"bench_{i}", cells))
+    return uploads
+
+
+def run(uploads, bulk: bool, batch_size: int = None) -> dict:
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_engine(f"sqlite:///{tmp}/bench.db", connect_args={"check_same_thread": False})
+        Base.metadata.create_all(bind=engine)
+        db = sessionmaker(bind=engine, autoflush=False)()
+        rows = 0
+        started = time.perf_counter()
+        try:
+            for anon, cells in uploads:
+                HeatmapService.store_heatmap_data(db, anon, cells, bulk=bulk, batch_size=batch_size)
+                rows += len(cells)
+        finally:
+            db.close()
+            engine.dispose()
+        elapsed = time.perf_counter() - started
+    return {
+        'mode': 'bulk' if bulk else 'orm',
+        'batch_size': batch_size if bulk else None,
+        'rows': rows,
+        'elapsed_s': round(elapsed, 4),
+        'rows_per_s': round(rows / elapsed, 1) if elapsed > 0 else None,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark heatmap ingestion paths')
+    parser.add_argument('--uploads', type=int, default=30, help='Number of uploads to replay')
+    parser.add_argument('--cells', type=int, default=500, help='Cells per upload')
+    parser.add_argument('--batch-sizes', default='100,500,2000', help='Comma separated bulk batch sizes')
+    args = parser.parse_args()
+
+    uploads = make_uploads(args.uploads, args.cells)
+    results = [run(uploads, bulk=False)]
+    for size in (int(s) for s in args.batch_sizes.split(',') if s.strip()):
+        results.append(run(uploads, bulk=True, batch_size=size))
+
+    base = results[0]['rows_per_s'] or 1
+    for r in results:
+        r['speedup_vs_orm'] = round((r['rows_per_s'] or 0) / base, 2)
+    print(json.dumps(results, ensure_ascii=False, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+"""
+Benchmark bulk heatmap ingestion: one POST /api/heatmap/data per upload vs a
+single NDJSON body on POST /api/heatmap/data/stream.
+
+Both variants run in-process (httpx.AsyncClient + ASGITransport) against a
+fresh SQLite file and ingest the same synthetic uploads (--points blocks each):
+
+  per-request   one JSON request and one commit per upload
+  stream        every upload as one NDJSON line in a single streamed request
+                body; the server commits every HEATMAP_STREAM_CHUNK_RECORDS
+                records
+
+The stream variant is repeated at each --records size: once for throughput and
+once more under tracemalloc (which slows allocation too much to time). The body
+is generated lazily, so the client side holds one line at a time; a flat peak
+across sizes means server memory does not grow with the payload.
+
+Examples:
+  python backend/scripts/bench_heatmap_stream.py
+  python backend/scripts/bench_heatmap_stream.py --records 10000 100000 --points 20
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.append(str(ROOT))
+
+
+def make_upload(rng, index, points):
+    return {
+        'anonymous_id': f'bench_{index}',
+        'data': [{'x': rng.randrange(2000), 'y': rng.randrange(2000), 'weight': round(rng.uniform(0.1, 5.0), 3)}
+                 for _ in range(points)],
+    }
+
+
+async def run_per_request(client, uploads, points):
+    rng = random.Random(1)
+    started = time.perf_counter()
+    for index in range(uploads):
+        resp = await client.post('/api/heatmap/data', json=make_upload(rng, index, points))
+        resp.raise_for_status()
+    elapsed = time.perf_counter() - started
+    return {'records': uploads * points, 'records_per_s': round(uploads * points / elapsed, 1)}
+
+
+async def post_stream(client, uploads, points):
+    rng = random.Random(2)
+
+    async def body():
+        for index in range(uploads):
+            yield (json.dumps(make_upload(rng, index, points)) + '\n').encode()
+
+    started = time.perf_counter()
+    resp = await client.post('/api/heatmap/data/stream', content=body(),
+                             headers={'content-type': 'application/x-ndjson'})
+    elapsed = time.perf_counter() - started
+    resp.raise_for_status()
+    return resp.json(), elapsed
+
+
+async def run_stream(client, uploads, points):
+    result, elapsed = await post_stream(client, uploads, points)
+    # tracemalloc 会显著拖慢分配，吞吐与内存峰值分两次测量
+    tracemalloc.start()
+    await post_stream(client, uploads, points)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {
+        'records': result['records'],
+        'chunks': result['chunks'],
+        'records_per_s': round(result['records'] / elapsed, 1),
+        'server_records_per_s': result['records_per_second'],
+        'peak_mib': round(peak / (1 << 20), 2),
+    }
+
+
+async def run_all(args):
+    import httpx
+    import main as app_main
+    from app.database import async_engine
+
+    report = {'points_per_upload': args.points}
+    transport = httpx.ASGITransport(app=app_main.app)
+    async with httpx.AsyncClient(transport=transport, base_url='http://bench', timeout=None) as client:
+        report['per_request'] = await run_per_request(client, max(1, args.records[0] // args.points), args.points)
+        report['stream'] = {
+            str(records): await run_stream(client, max(1, records // args.points), args.points)
+            for records in args.records
+        }
+    await async_engine.dispose()
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Heatmap ingestion: per-request uploads vs NDJSON stream')
+    parser.add_argument('--records', type=int, nargs='+', default=[20000, 80000],
+                        help='Records per stream run (the first size is also used for the per-request run)')
+    parser.add_argument('--points', type=int, default=50, help='Blocks per upload (one NDJSON line)')
+    args = parser.parse_args()
+
+    os.chdir(tempfile.mkdtemp(prefix='bench_heatmap_stream_'))
+    os.environ.setdefault('LEADERBOARD_SEED_ON_STARTUP', '0')
+
+    report = asyncio.run(run_all(args))
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+
+
+if __name__ == '__main__':
+    main()
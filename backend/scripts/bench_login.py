@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+"""
+Benchmark /api/user/login: latency and SQL statements per login, before vs after
+the single-transaction upsert rework.
+
+Both variants run in-process (httpx.AsyncClient + ASGITransport) against the
+same async engine and a fresh SQLite file:
+
+  legacy   the previous handler: SELECT user, INSERT + COMMIT for new users,
+           then SELECT (and lazily INSERT + COMMIT) the group on every call
+  upsert   the current handler (main.app): one SELECT for returning users with
+           the group secret from the in-process map; otherwise the group
+           counter UPDATE ... RETURNING, one INSERT ... ON CONFLICT ... RETURNING
+           and one COMMIT
+
+Statements are counted with a before_cursor_execute listener and commits with a
+commit listener on the engine. Each variant logs in N new users ("first"), then
+the same users again ("repeat"), C requests at a time.
+
+Examples:
+  python backend/scripts/bench_login.py
+  python backend/scripts/bench_login.py --users 1000 --concurrency 1 16
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.append(str(ROOT))
+
+
+def percentile(samples, pct):
+    if not samples:
+        return None
+    ordered = sorted(samples)
+    k = min(len(ordered) - 1, int(round(pct / 100.0 * (len(ordered) - 1))))
+    return round(ordered[k] * 1000, 2)
+
+
+def build_legacy_app():
+    """改造前的登录写法：最多两次提交，每次登录都查一次 groups 表。"""
+    import secrets
+    from fastapi import Depends, FastAPI
+    from sqlalchemy import select
+    from sqlalchemy.ext.asyncio import AsyncSession
+    from app.database import get_async_db
+    from app.models import Group, User
+    from app.schemas import UserLoginRequest, UserLoginResponse
+    from app.services.ring_service import RingService
+
+    app = FastAPI()
+
+    async def get_or_create_group(db, group_name):
+        group = (await db.execute(select(Group).where(Group.name == group_name))).scalar_one_or_none()
+        if not group:
+            group = Group(name=group_name, secret=secrets.token_hex(32))
+            db.add(group)
+            await db.commit()
+        return group
+
+    @app.post("/api/user/login", response_model=UserLoginResponse)
+    async def user_login(payload: UserLoginRequest, db: AsyncSession = Depends(get_async_db)):
+        user = (await db.execute(select(User).where(User.anonymous_id == payload.anonymous_id))).scalar_one_or_none()
+        if user:
+            if not user.group_name:
+                user.group_name = RingService.pick_group_for_user()
+                db.add(user)
+                await db.commit()
+            group = await get_or_create_group(db, user.group_name)
+            return UserLoginResponse(anonymous_id=user.anonymous_id, public_key=user.public_key,
+                                     user_level=user.user_level, group_name=user.group_name, group_key=group.secret)
+        user = User(anonymous_id=payload.anonymous_id, public_key=payload.public_key,
+                    public_key_valid=RingService._is_valid_secp256k1_compressed_hex(payload.public_key),
+                    user_level=payload.user_level, group_name=RingService.pick_group_for_user())
+        db.add(user)
+        await db.commit()
+        group = await get_or_create_group(db, user.group_name)
+        return UserLoginResponse(anonymous_id=user.anonymous_id, public_key=user.public_key,
+                                 user_level=user.user_level, group_name=user.group_name, group_key=group.secret)
+
+    return app
+
+
+class StatementCounter:
+    def __init__(self, engine):
+        from sqlalchemy import event
+        self.statements = 0
+        self.commits = 0
+        event.listen(engine, "before_cursor_execute", self._on_execute)
+        event.listen(engine, "commit", self._on_commit)
+
+    def _on_execute(self, *args):
+        self.statements += 1
+
+    def _on_commit(self, *args):
+        self.commits += 1
+
+    def snapshot(self):
+        return self.statements, self.commits
+
+
+async def run_phase(client, counter, ids, concurrency):
+    latencies = []
+    queue = list(ids)
+    before = counter.snapshot()
+    started_all = time.perf_counter()
+
+    async def worker():
+        while queue:
+            anonymous_id = queue.pop()
+            started = time.perf_counter()
+            resp = await client.post('/api/user/login', json={
+                'anonymous_id': anonymous_id, 'public_key': '02' + anonymous_id.encode().hex()[:64].ljust(64, '0')})
+            resp.raise_for_status()
+            latencies.append(time.perf_counter() - started)
+
+    await asyncio.gather(*[worker() for _ in range(concurrency)])
+    elapsed = time.perf_counter() - started_all
+    statements, commits = (a - b for a, b in zip(counter.snapshot(), before))
+    return {
+        'logins_per_s': round(len(ids) / elapsed, 1),
+        'p50_ms': percentile(latencies, 50),
+        'p99_ms': percentile(latencies, 99),
+        'statements_per_login': round(statements / len(ids), 2),
+        'commits_per_login': round(commits / len(ids), 2),
+    }
+
+
+async def run_all(variants, args):
+    import httpx
+    from app.database import async_engine
+
+    counter = StatementCounter(async_engine.sync_engine)
+    report = {}
+    for concurrency in args.concurrency:
+        row = {}
+        for name, app in variants.items():
+            ids = [f'{name}_{concurrency}_{i}' for i in range(args.users)]
+            transport = httpx.ASGITransport(app=app)
+            async with httpx.AsyncClient(transport=transport, base_url='http://bench') as client:
+                row[name] = {
+                    'first': await run_phase(client, counter, ids, concurrency),
+                    'repeat': await run_phase(client, counter, ids, concurrency),
+                }
+        report[str(concurrency)] = row
+    await async_engine.dispose()
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Login latency and statement count: legacy vs upsert')
+    parser.add_argument('--users', type=int, default=500, help='New users per variant and concurrency level')
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 16], help='Concurrent clients')
+    args = parser.parse_args()
+
+    os.chdir(tempfile.mkdtemp(prefix='bench_login_'))
+    os.environ.setdefault('LEADERBOARD_SEED_ON_STARTUP', '0')
+
+    import main as app_main
+    variants = {'legacy': build_legacy_app(), 'upsert': app_main.app}
+    report = {'users': args.users, 'concurrency': asyncio.run(run_all(variants, args))}
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+"""
+Benchmark batch ring-signature verification against the single-submission path.
+
+Signs N score payloads spread over K rings, then measures:
+  * verifications/second: N x CryptoService.ring_verify vs. one ring_verify_batch
+  * end-to-end: N x POST /api/leaderboard/submit-score-ring vs.
+    POST /api/leaderboard/submit-scores-ring/batch (in chunks of RING_BATCH_MAX_ITEMS)
+
+The API part runs in-process against a throwaway SQLite file.
+
+Examples:
+  python backend/scripts/bench_ring_batch.py
+  python backend/scripts/bench_ring_batch.py --payloads 512 --rings 8
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.append(str(ROOT))
+
+
+def make_payloads(crypto, rings, n, offset):
+    payloads = []
+    for i in range(n):
+        ring_id, pubkeys, priv = rings[i % len(rings)]
+        distance, pace = round(1.0 + offset + i * 0.01, 2), 6.0
+        msg = f"{ring_id}|{distance}|{pace}".encode()
+        c0, s = crypto.ring_sign(msg, priv, list(pubkeys))
+        payloads.append({'ring_id': ring_id, 'total_distance': distance, 'average_pace': pace,
+                         'signature': {'c0': c0, 's': s}})
+    return payloads
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark batch ring-signature verification')
+    parser.add_argument('--payloads', type=int, default=256, help='Number of signed payloads per mode')
+    parser.add_argument('--rings', type=int, default=4, help='Number of distinct rings')
+    args = parser.parse_args()
+
+    tmp = tempfile.mkdtemp(prefix='bench_ring_batch_')
+    os.chdir(tmp)
+    os.environ.setdefault('LEADERBOARD_SEED_ON_STARTUP', '0')
+
+    from fastapi.testclient import TestClient
+    import main as app_main
+    from app.routers.leaderboard import BATCH_MAX_ITEMS
+    from app.services.crypto_service import CryptoService
+
+    client = TestClient(app_main.app)
+    rings = []
+    for r in range(args.rings):
+        kp = CryptoService.generate_keypair()
+        info = client.post('/api/leaderboard/request-ring', json={
+            'anonymous_id': f'bench_{r}', 'public_key': kp['public_key']
+        }).json()
+        rings.append((info['ring_id'], info['ring_public_keys'], kp['private_key']))
+
+    single = make_payloads(CryptoService, rings, args.payloads, offset=0)
+    batch = make_payloads(CryptoService, rings, args.payloads, offset=1000)
+    ring_keys = {ring_id: keys for ring_id, keys, _ in rings}
+
+    def as_job(p):
+        msg = f"{p['ring_id']}|{p['total_distance']}|{p['average_pace']}".encode()
+        return msg, ring_keys[p['ring_id']], p['signature']['c0'], p['signature']['s'], p['ring_id']
+
+    jobs = [as_job(p) for p in single]
+    started = time.perf_counter()
+    ok_seq = sum(CryptoService.ring_verify(*job[:4], ring_id=job[4]) for job in jobs)
+    t_seq = time.perf_counter() - started
+    started = time.perf_counter()
+    ok_batch = sum(CryptoService.ring_verify_batch(jobs))
+    t_batch = time.perf_counter() - started
+
+    started = time.perf_counter()
+    api_single_ok = sum(
+        client.post('/api/leaderboard/submit-score-ring', json=p).status_code == 200 for p in single
+    )
+    t_api_single = time.perf_counter() - started
+    started = time.perf_counter()
+    api_batch_ok = 0
+    for i in range(0, len(batch), BATCH_MAX_ITEMS):
+        resp = client.post('/api/leaderboard/submit-scores-ring/batch', json={'items': batch[i:i + BATCH_MAX_ITEMS]})
+        api_batch_ok += resp.json()['accepted']
+    t_api_batch = time.perf_counter() - started
+
+    n = args.payloads
+    print(json.dumps({
+        'payloads': n,
+        'rings': args.rings,
+        'ring_size': len(rings[0][1]),
+        'verify': {
+            'sequential_per_s': round(n / t_seq, 1),
+            'batch_per_s': round(n / t_batch, 1),
+            'speedup': round(t_seq / t_batch, 2),
+            'valid': [ok_seq, ok_batch],
+        },
+        'api': {
+            'single_endpoint_per_s': round(n / t_api_single, 1),
+            'batch_endpoint_per_s': round(n / t_api_batch, 1),
+            'speedup': round(t_api_single / t_api_batch, 2),
+            'accepted': [api_single_ok, api_batch_ok],
+        },
+    }, ensure_ascii=False, indent=2))
+
+
+if __name__ == '__main__':
+    main()
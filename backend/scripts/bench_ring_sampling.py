@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+"""
+Benchmark ring-member selection strategies on large user tables.
+
+For each table size a throwaway SQLite file is filled with N users spread over
+three levels (about 2% with an invalid public key, as left behind by old
+clients), then ms per call is measured for:
+
+  first_rows     WHERE level AND valid LIMIT k      (the old, non-random query)
+  order_random   WHERE level AND valid ORDER BY RANDOM() LIMIT k
+  probe          RingService.sample_members (random id probe on ix_users_level_valid_id)
+
+A uniformity check then draws many samples from a small table with id gaps
+and reports the min/max hit count per user against the expected count.
+
+Examples:
+  python backend/scripts/bench_ring_sampling.py
+  python backend/scripts/bench_ring_sampling.py --sizes 10000 100000 --calls 200
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.append(str(ROOT))
+
+LEVELS = ['beginner', 'medium', 'advanced']
+
+
+def build_db(path, n_users, seed=7, unique_keys=False):
+    from sqlalchemy import create_engine
+    from sqlalchemy.orm import sessionmaker
+    from app.database import Base
+    from app.models import User
+    from app.services.crypto_service import CryptoService
+
+    engine = create_engine(f'sqlite:///{path}', connect_args={'check_same_thread': False})
+    Base.metadata.create_all(bind=engine)
+    rng = random.Random(seed)
+    # 公钥内容不影响抽样耗时：大表循环使用少量真实公钥；统计均匀性时每行一个公钥
+    real_keys = [CryptoService.generate_keypair()['public_key'] for _ in range(n_users if unique_keys else 32)]
+    batch = []
+    with engine.begin() as conn:
+        for i in range(n_users):
+            valid = rng.random() >= 0.02
+            batch.append({
+                'anonymous_id': f'u{i}',
+                'group_name': None,
+                'group_secret_key': None,
+                'public_key': real_keys[i % len(real_keys)] if valid else f'bad_{i}',
+                'public_key_valid': valid,
+                'user_level': LEVELS[rng.randrange(len(LEVELS))],
+            })
+            if len(batch) >= 20000:
+                conn.execute(User.__table__.insert(), batch)
+                batch = []
+        if batch:
+            conn.execute(User.__table__.insert(), batch)
+    return engine, sessionmaker(bind=engine)
+
+
+def time_calls(fn, calls):
+    started = time.perf_counter()
+    for _ in range(calls):
+        fn()
+    return round((time.perf_counter() - started) * 1000 / calls, 3)
+
+
+def bench_size(tmp, n_users, args):
+    from sqlalchemy import func
+    from app.models import User
+    from app.services.ring_service import RingService
+
+    path = os.path.join(tmp, f'users_{n_users}.db')
+    started = time.perf_counter()
+    engine, Session = build_db(path, n_users)
+    build_s = round(time.perf_counter() - started, 1)
+    db = Session()
+    k = args.k
+    eligible = db.query(User.public_key).filter(User.user_level == 'medium', User.public_key_valid.is_(True))
+    result = {
+        'users': n_users,
+        'build_s': build_s,
+        'first_rows_ms': time_calls(lambda: eligible.limit(k).all(), args.calls),
+        'order_random_ms': time_calls(lambda: eligible.order_by(func.random()).limit(k).all(), max(1, args.calls // 10)),
+        'probe_ms': time_calls(lambda: RingService.sample_members(db, 'medium', k), args.calls),
+    }
+    result['speedup_vs_order_random'] = round(result['order_random_ms'] / result['probe_ms'], 1)
+    db.close()
+    engine.dispose()
+    os.remove(path)
+    return result
+
+
+def uniformity(tmp, args):
+    """小表 + 人为制造的 id 空隙：无偏的抽样下每个用户的命中次数应接近期望值。"""
+    from sqlalchemy import text
+    from app.models import User
+    from app.services import ring_service
+    from app.services.ring_service import RingService
+
+    path = os.path.join(tmp, 'uniformity.db')
+    engine, Session = build_db(path, 3000, seed=11, unique_keys=True)
+    with engine.begin() as conn:
+        # 删除一段连续 id，让紧随其后的用户背后有一个大空隙
+        conn.execute(text("DELETE FROM users WHERE id BETWEEN 500 AND 1400"))
+    db = Session()
+    population = [pk for (pk,) in db.query(User.public_key).filter(
+        User.user_level == 'medium', User.public_key_valid.is_(True)).all()]
+    hits = dict.fromkeys(population, 0)
+    # 紧跟在被删除区间之后的用户：有偏的探测会让它的命中次数高出数百倍
+    after_gap = db.query(User.public_key).filter(
+        User.user_level == 'medium', User.public_key_valid.is_(True), User.id > 1400
+    ).order_by(User.id).limit(1).scalar()
+    saved = ring_service.SAMPLE_SCAN_SPAN
+    ring_service.SAMPLE_SCAN_SPAN = 0  # 强制走探测路径
+    try:
+        for _ in range(args.uniformity_rounds):
+            for pk in RingService.sample_members(db, 'medium', args.k):
+                hits[pk] += 1
+    finally:
+        ring_service.SAMPLE_SCAN_SPAN = saved
+    db.close()
+    engine.dispose()
+    os.remove(path)
+    expected = args.uniformity_rounds * args.k / len(population)
+    return {
+        'population': len(population),
+        'draws': args.uniformity_rounds * args.k,
+        'expected_per_user': round(expected, 2),
+        'min_per_user': min(hits.values()),
+        'max_per_user': max(hits.values()),
+        'user_after_gap': hits[after_gap],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark random ring-member sampling')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10000, 100000, 1000000], help='User table sizes')
+    parser.add_argument('--k', type=int, default=4, help='Members drawn per call (ring size - 1)')
+    parser.add_argument('--calls', type=int, default=500, help='Calls per strategy (ORDER BY RANDOM() runs 1/10)')
+    parser.add_argument('--uniformity-rounds', type=int, default=20000, help='Draws for the uniformity check (0 = skip)')
+    args = parser.parse_args()
+
+    tmp = tempfile.mkdtemp(prefix='bench_ring_sampling_')
+    report = {'k': args.k, 'sizes': [bench_size(tmp, n, args) for n in args.sizes]}
+    if args.uniformity_rounds:
+        report['uniformity'] = uniformity(tmp, args)
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+"""
+Benchmark ring_verify with the joint s*G + c*P (Straus/Shamir) step against the
+previous two-multiplications-plus-add step, per curve backend and ring size.
+
+The "separate" numbers run the same verifier through a subclass of each backend
+whose mul_add is the CurveBackend default (base_mul + point_mul + add).
+Backends that do not override mul_add (ecdsa) would time the same code twice,
+so only their separate time is reported.
+
+Examples:
+  python backend/scripts/bench_ring_verify_msm.py
+  python backend/scripts/bench_ring_verify_msm.py --backends coincurve --ring-sizes 5 16 64 256 1024
+"""
+import argparse
+import json
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.append(str(ROOT))
+
+from app.services.crypto_service import (
+    CryptoService, CurveBackend, available_curve_backends, make_curve_backend
+)
+
+
+def separate_variant(backend):
+    cls = type(f"Separate{type(backend).__name__}", (type(backend),), {'mul_add': CurveBackend.mul_add})
+    return cls()
+
+
+def time_verify(message, ring, c0, s_list, backend, budget):
+    """在约 budget 秒内重复验证，返回单次耗时（毫秒）。"""
+    runs, started = 0, time.perf_counter()
+    while True:
+        assert CryptoService.ring_verify(message, ring, c0, s_list, ring_id='bench_msm', backend=backend)
+        runs += 1
+        elapsed = time.perf_counter() - started
+        if elapsed >= budget:
+            return round(elapsed / runs * 1000, 3)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Joint vs separate scalar multiplication in ring_verify')
+    parser.add_argument('--backends', nargs='+', default=available_curve_backends())
+    parser.add_argument('--ring-sizes', nargs='+', type=int, default=[5, 16, 64, 256])
+    parser.add_argument('--budget', type=float, default=0.5, help='Seconds spent per measurement (at least one run)')
+    args = parser.parse_args()
+
+    signer = make_curve_backend(available_curve_backends()[0])
+    report = {}
+    for size in args.ring_sizes:
+        keypairs = [CryptoService.generate_keypair() for _ in range(size)]
+        ring = [kp['public_key'] for kp in keypairs]
+        message = f"bench_msm|{size}|6.0".encode()
+        c0, s_list = CryptoService.ring_sign(message, keypairs[0]['private_key'], list(ring), backend=signer)
+        for name in args.backends:
+            joint = make_curve_backend(name)
+            joint.base_mul(1)  # 预热：纯 Python 后端构建定基点表
+            if type(joint).mul_add is CurveBackend.mul_add:
+                report.setdefault(name, {})[str(size)] = {
+                    'separate_ms': time_verify(message, ring, c0, s_list, joint, args.budget),
+                    'joint_ms': None,
+                }
+                continue
+            joint_ms = time_verify(message, ring, c0, s_list, joint, args.budget)
+            separate_ms = time_verify(message, ring, c0, s_list, separate_variant(joint), args.budget)
+            report.setdefault(name, {})[str(size)] = {
+                'separate_ms': separate_ms,
+                'joint_ms': joint_ms,
+                'speedup': round(separate_ms / joint_ms, 2),
+            }
+    print(json.dumps({'verify_time_by_ring_size': report}, ensure_ascii=False, indent=2))
+
+
+if __name__ == '__main__':
+    main()
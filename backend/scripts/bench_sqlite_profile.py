@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+"""
+Concurrent write/read throughput: SQLite defaults vs. the tuned profile in app/database.py.
+
+Each profile gets its own throwaway database file. Writer threads upload heatmap
+batches (HeatmapService.store_heatmap_data) and record ring scores
+(LeaderboardService.record_score), while reader threads query a heatmap viewport
+and the leaderboard. The threads mirror FastAPI running sync DB work in its
+threadpool. For each profile the script reports:
+
+  writes_per_s / reads_per_s   committed transactions and finished queries per second
+  write_p50/p99_ms             latency of one write transaction
+  locked_errors                "database is locked" failures (rolled back, not retried)
+
+Profiles:
+  default  rollback journal, synchronous=FULL, no busy_timeout, pool 5 + 10
+  tuned    SQLITE_PRAGMAS (WAL, synchronous=NORMAL, busy_timeout, cache/mmap/temp_store) and DB_POOL_* sizing
+
+Examples:
+  python backend/scripts/bench_sqlite_profile.py
+  python backend/scripts/bench_sqlite_profile.py --writers 8 --readers 8 --seconds 10
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.append(str(ROOT))
+
+
+def percentile(samples, pct):
+    if not samples:
+        return None
+    ordered = sorted(samples)
+    k = min(len(ordered) - 1, int(round(pct / 100.0 * (len(ordered) - 1))))
+    return round(ordered[k] * 1000, 2)
+
+
+def run_profile(name, tmp, args):
+    from sqlalchemy.exc import OperationalError
+    from sqlalchemy.orm import sessionmaker
+    from app.database import Base, make_engine
+    from app.models import GroupScore
+    from app.schemas import HeatmapDataBase
+    from app.services.heatmap_service import HeatmapService
+    from app.services.leaderboard_service import LeaderboardService
+
+    url = f"sqlite:///{os.path.join(tmp, name + '.db')}"
+    if name == 'default':
+        engine = make_engine(url, tuned=False, pool_size=5, max_overflow=10)
+    else:
+        engine = make_engine(url, tuned=True)
+    Base.metadata.create_all(bind=engine)
+    Session = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+    lock = threading.Lock()
+    counters = {'writes': 0, 'reads': 0, 'locked': 0, 'other_errors': 0}
+    write_latencies = []
+    deadline = time.perf_counter() + args.seconds
+
+    def count(key, latency=None):
+        with lock:
+            counters[key] += 1
+            if latency is not None:
+                write_latencies.append(latency)
+
+    def writer(w):
+        rng = random.Random(w)
+        i = 0
+        while time.perf_counter() < deadline:
+            db = Session()
+            started = time.perf_counter()
+            try:
+                if i % 2 == 0:
+                    points = [HeatmapDataBase(x=rng.randrange(200), y=rng.randrange(200), weight=rng.random())
+                              for _ in range(args.points)]
+                    HeatmapService.store_heatmap_data(db, f'writer_{w}', points)
+                else:
+                    LeaderboardService.record_score(db, GroupScore(
+                        ring_id=f'ring_{w}', group_name=f'group_{w % 4}', user_anonymous_id=f'writer_{w}',
+                        total_distance=round(rng.uniform(1, 20), 2), average_pace=6.0, signature='{}'))
+                    db.commit()
+                count('writes', time.perf_counter() - started)
+            except OperationalError as e:
+                db.rollback()
+                count('locked' if 'locked' in str(e) else 'other_errors')
+            finally:
+                db.close()
+            i += 1
+
+    def reader(r):
+        rng = random.Random(1000 + r)
+        i = 0
+        while time.perf_counter() < deadline:
+            db = Session()
+            try:
+                if i % 2 == 0:
+                    x0, y0 = rng.randrange(150), rng.randrange(150)
+                    HeatmapService.get_global_heatmap(db, x_min=x0, x_max=x0 + 50, y_min=y0, y_max=y0 + 50)
+                else:
+                    LeaderboardService.compute_leaderboard(db)
+                count('reads')
+            except OperationalError as e:
+                db.rollback()
+                count('locked' if 'locked' in str(e) else 'other_errors')
+            finally:
+                db.close()
+            i += 1
+
+    threads = [threading.Thread(target=writer, args=(w,)) for w in range(args.writers)]
+    threads += [threading.Thread(target=reader, args=(r,)) for r in range(args.readers)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    with engine.connect() as conn:
+        journal = conn.exec_driver_sql('PRAGMA journal_mode').scalar()
+    engine.dispose()
+    return {
+        'journal_mode': journal,
+        'writes_per_s': round(counters['writes'] / args.seconds, 1),
+        'reads_per_s': round(counters['reads'] / args.seconds, 1),
+        'write_p50_ms': percentile(write_latencies, 50),
+        'write_p99_ms': percentile(write_latencies, 99),
+        'locked_errors': counters['locked'],
+        'other_errors': counters['other_errors'],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Concurrent SQLite throughput: default vs tuned profile')
+    parser.add_argument('--profiles', nargs='+', default=['default', 'tuned'], choices=['default', 'tuned'])
+    parser.add_argument('--writers', type=int, default=4, help='Concurrent writer threads')
+    parser.add_argument('--readers', type=int, default=4, help='Concurrent reader threads')
+    parser.add_argument('--seconds', type=float, default=5.0, help='Duration per profile')
+    parser.add_argument('--points', type=int, default=50, help='Heatmap points per upload')
+    args = parser.parse_args()
+
+    from app.database import SQLITE_PRAGMAS, DB_POOL_SIZE, DB_MAX_OVERFLOW
+
+    tmp = tempfile.mkdtemp(prefix='bench_sqlite_profile_')
+    report = {
+        'writers': args.writers,
+        'readers': args.readers,
+        'seconds': args.seconds,
+        'tuned_pragmas': SQLITE_PRAGMAS,
+        'tuned_pool': {'pool_size': DB_POOL_SIZE, 'max_overflow': DB_MAX_OVERFLOW},
+        'profiles': {name: run_profile(name, tmp, args) for name in args.profiles},
+    }
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+"""
+Measure GET latency while ring-signature verification is under load.
+
+Runs the ASGI app in-process (httpx.AsyncClient + ASGITransport, one event loop,
+like a single uvicorn worker). A set of writers keeps POSTing signed scores to
+/api/leaderboard/submit-score-ring while readers hit /health and
+/api/leaderboard/; the readers' p50/p99 latency is reported for each executor mode:
+
+  inline   verification runs on the event loop (the pre-pool behaviour)
+  thread   verification is offloaded to a thread pool
+  process  verification is offloaded to a process pool
+
+Writers that get a 503 (pool saturated) back off briefly and are counted.
+Every payload is signed once up front and submitted once: replayed signatures
+are rejected before verification and repeated ones are answered from the
+verdict cache, so reusing payloads would not load the pool.
+
+Examples:
+  python backend/scripts/bench_verify_offload.py
+  python backend/scripts/bench_verify_offload.py --modes inline thread --writers 32 --seconds 5
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.append(str(ROOT))
+
+
+def percentile(samples, pct):
+    if not samples:
+        return None
+    ordered = sorted(samples)
+    k = min(len(ordered) - 1, int(round(pct / 100.0 * (len(ordered) - 1))))
+    return round(ordered[k] * 1000, 2)
+
+
+async def run_mode(app, payloads, mode, args):
+    import httpx
+    from app.services.verify_pool import configure_verify_pool
+
+    pool = configure_verify_pool(executor=mode, workers=args.workers, queue=args.queue)
+    transport = httpx.ASGITransport(app=app)
+    latencies, counters = [], {'accepted': 0, 'busy': 0, 'failed': 0}
+
+    async with httpx.AsyncClient(transport=transport, base_url='http://bench') as client:
+        # 预热：拉起池内 worker（进程池首个任务需要 fork + import）并填充读缓存
+        unused = iter(payloads)
+        await asyncio.gather(*[
+            client.post('/api/leaderboard/submit-score-ring', json=next(unused))
+            for _ in range(pool.workers)
+        ])
+        await client.get('/api/leaderboard/')
+        deadline = time.perf_counter() + args.seconds
+
+        async def writer(w):
+            # 每条签名只提交一次，用完即停
+            for payload in unused:
+                if time.perf_counter() >= deadline:
+                    break
+                resp = await client.post('/api/leaderboard/submit-score-ring', json=payload)
+                if resp.status_code == 200:
+                    counters['accepted'] += 1
+                elif resp.status_code == 503:
+                    counters['busy'] += 1
+                    await asyncio.sleep(0.01)
+                else:
+                    counters['failed'] += 1
+
+        async def reader(r):
+            path = '/health' if r % 2 == 0 else '/api/leaderboard/'
+            while time.perf_counter() < deadline:
+                started = time.perf_counter()
+                await client.get(path)
+                latencies.append(time.perf_counter() - started)
+                await asyncio.sleep(args.read_interval)
+
+        await asyncio.gather(*[writer(w) for w in range(args.writers)], *[reader(r) for r in range(args.readers)])
+
+    stats = pool.stats()
+    return {
+        'reads': len(latencies),
+        'read_p50_ms': percentile(latencies, 50),
+        'read_p95_ms': percentile(latencies, 95),
+        'read_p99_ms': percentile(latencies, 99),
+        'read_max_ms': percentile(latencies, 100),
+        'writes_per_s': round(counters['accepted'] / args.seconds, 1),
+        'writes_503': counters['busy'],
+        'writes_failed': counters['failed'],
+        'payloads_left': sum(1 for _ in unused),
+        'pool_peak_in_flight': stats['peak_in_flight'],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='p99 GET latency with ring verification under load')
+    parser.add_argument('--modes', nargs='+', default=['inline', 'thread', 'process'],
+                        choices=['inline', 'thread', 'process'])
+    parser.add_argument('--writers', type=int, default=16, help='Concurrent submit-score-ring clients')
+    parser.add_argument('--readers', type=int, default=4, help='Concurrent GET clients')
+    parser.add_argument('--seconds', type=float, default=3.0, help='Duration per mode')
+    parser.add_argument('--read-interval', type=float, default=0.005, help='Pause between reads per reader')
+    parser.add_argument('--workers', type=int, default=None, help='Pool workers (default RING_VERIFY_WORKERS)')
+    parser.add_argument('--queue', type=int, default=None, help='Pool queue length (default RING_VERIFY_QUEUE)')
+    parser.add_argument('--ring-size', type=int, default=16, help='Public keys per ring')
+    parser.add_argument('--payloads', type=int, default=2000, help='Distinct signed payloads per mode')
+    args = parser.parse_args()
+
+    os.chdir(tempfile.mkdtemp(prefix='bench_verify_offload_'))
+    os.environ.setdefault('LEADERBOARD_SEED_ON_STARTUP', '0')
+
+    import main as app_main
+    from app.database import SessionLocal
+    from app.models import Ring
+    from app.services.crypto_service import CryptoService
+    from app.services.verify_pool import shutdown_verify_pool
+
+    # 直接写入一个指定大小的环，签名负载提前生成
+    keys = [CryptoService.generate_keypair() for _ in range(args.ring_size)]
+    pubkeys = [k['public_key'] for k in keys]
+    ring_id = CryptoService.generate_ring_id()
+    db = SessionLocal()
+    db.add(Ring(ring_id=ring_id, public_keys=pubkeys, group_name='bench', user_level='medium'))
+    db.commit()
+    db.close()
+
+    def signed_payloads(pace):
+        payloads = []
+        for i in range(args.payloads):
+            distance = round(1.0 + i * 0.01, 2)
+            msg = f"{ring_id}|{distance}|{pace}".encode()
+            c0, s = CryptoService.ring_sign(msg, keys[i % len(keys)]['private_key'], pubkeys)
+            payloads.append({'ring_id': ring_id, 'total_distance': distance, 'average_pace': pace,
+                             'signature': {'c0': c0, 's': s}})
+        return payloads
+
+    report = {'ring_size': args.ring_size, 'writers': args.writers, 'readers': args.readers, 'modes': {}}
+    for n, mode in enumerate(args.modes):
+        # 各模式使用不同配速，签名互不重复
+        payloads = signed_payloads(6.0 + n * 0.1)
+        report['modes'][mode] = asyncio.run(run_mode(app_main.app, payloads, mode, args))
+    shutdown_verify_pool()
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+
+
+if __name__ == '__main__':
+    main()
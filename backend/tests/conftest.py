@@ -0,0 +1,76 @@
+"""Shared pytest fixtures: a throwaway SQLite database per test, and the app's routers
+mounted on it for in-process HTTP calls."""
+import asyncio
+import sys
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parents[1]
+# Ensure backend package import
+sys.path.append(str(ROOT))
+
+import httpx
+from fastapi import FastAPI
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+from sqlalchemy.orm import sessionmaker
+
+from app.database import Base, get_async_db, make_async_engine, make_engine, to_async_url
+from app.routers import heatmap, leaderboard, user
+
+
+@pytest.fixture
+def db_url(tmp_path):
+    return f"sqlite:///{tmp_path / 'test.db'}"
+
+
+@pytest.fixture
+def db(db_url):
+    """Sync session on a fresh schema."""
+    engine = make_engine(db_url)
+    Base.metadata.create_all(bind=engine)
+    session = sessionmaker(bind=engine, autoflush=False)()
+    try:
+        yield session
+    finally:
+        session.close()
+        engine.dispose()
+
+
+class Api:
+    """The heatmap / leaderboard / user routers on the test database (same prefixes as main.app).
+
+    run(scenario) awaits scenario(client) on a fresh event loop with its own async engine,
+    so aiosqlite connections never outlive the loop that opened them.
+    """
+
+    def __init__(self, url):
+        self.url = url
+
+    def run(self, scenario):
+        return asyncio.run(self._run(scenario))
+
+    async def _run(self, scenario):
+        engine = make_async_engine(to_async_url(self.url))
+        sessions = async_sessionmaker(engine, class_=AsyncSession, autoflush=False, expire_on_commit=False)
+
+        async def override_db():
+            async with sessions() as session:
+                yield session
+
+        app = FastAPI()
+        app.include_router(heatmap.router, prefix="/api/heatmap")
+        app.include_router(leaderboard.router, prefix="/api/leaderboard")
+        app.include_router(user.router, prefix="/api/user")
+        app.dependency_overrides[get_async_db] = override_db
+        try:
+            async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+                return await scenario(client)
+        finally:
+            await engine.dispose()
+
+
+@pytest.fixture
+def api(db):
+    """Api on the same database as the db fixture (schema already created)."""
+    return Api(str(db.get_bind().url))
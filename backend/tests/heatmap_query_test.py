@@ -0,0 +1,238 @@
+"""Heatmap read path test: zoom rollups and viewport bounds.
+Run: python -m pytest backend/tests/heatmap_query_test.py
+
+Checks:
+1. heatmap_rollups at every level k equal the level-0 cells grouped by (x >> k, y >> k),
+   and zoom=k reads return exactly those super-cells
+2. Viewport bounds are inclusive at both edges; at zoom>0 every super-cell overlapping the
+   viewport is returned, and the time-window path applies the same bounds
+3. Time windows read partial days from hourly buckets and whole days from daily buckets
+4. Out-of-range and empty windows, and since >= until, are rejected with 400
+5. Accept negotiation: the binary type returns packed columns that decode to the JSON result,
+   the columns type returns parallel arrays, and a browser Accept header gets records JSON
+6. The default records response equals the row-by-row get_global_heatmap + attenuate_center
+   output, and coordinates beyond float64 precision survive both JSON formats exactly
+7. The bulk Core executemany write path, with a batch_size smaller than the upload, stores the
+   same raw rows and the same cells / rollups / buckets as the per-object ORM path
+"""
+import random
+import struct
+import sys
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from types import SimpleNamespace
+
+ROOT = Path(__file__).resolve().parents[1]
+# Ensure backend package import
+sys.path.append(str(ROOT))
+
+import pytest
+from sqlalchemy.orm import sessionmaker
+
+from app.database import Base, make_engine
+from app.models import HeatmapBucket, HeatmapCell, HeatmapData, HeatmapRollup
+from app.routers.heatmap import BINARY_MEDIA_TYPE, COLUMNS_MEDIA_TYPE
+from app.services.heatmap_service import DAY, HOUR, HeatmapService
+
+
+def points(*cells):
+    return [SimpleNamespace(x=x, y=y, weight=w) for x, y, w in cells]
+
+
+def as_map(rows):
+    return {(r['x'], r['y']): round(r['weight'], 6) for r in rows}
+
+
+def test_rollups_match_level0_cells(db):
+    rng = random.Random(3)
+    for upload in range(20):
+        HeatmapService.store_heatmap_data(db, f"u{upload}", points(*(
+            (rng.randrange(-300, 300), rng.randrange(-300, 300), round(rng.uniform(0.1, 3.0), 3))
+            for _ in range(50)
+        )))
+    cells = db.query(HeatmapCell).all()
+    assert HeatmapService.MAX_ZOOM_LEVEL >= 1
+    for level in range(1, HeatmapService.MAX_ZOOM_LEVEL + 1):
+        expected = {}
+        for c in cells:
+            key = (c.x >> level, c.y >> level)
+            w, n = expected.get(key, (0.0, 0))
+            expected[key] = (w + c.weight_sum, n + c.sample_count)
+        rollups = {(r.x, r.y): (r.weight_sum, r.sample_count)
+                   for r in db.query(HeatmapRollup).filter(HeatmapRollup.level == level)}
+        assert rollups.keys() == expected.keys(), level
+        for key, (w, n) in expected.items():
+            assert rollups[key][1] == n and abs(rollups[key][0] - w) < 1e-6, (level, key)
+        read = as_map(HeatmapService.get_global_heatmap(db, zoom=level))
+        assert read == {key: round(w, 6) for key, (w, _) in expected.items()}, level
+
+
+def snapshot(db):
+    """原始行与各聚合表的内容（时间桶按粒度合并，避免两次写入恰好跨过整点）。"""
+    raw = sorted((r.anonymous_id, r.x, r.y, r.weight) for r in db.query(HeatmapData))
+    cells = {(c.x, c.y): (round(c.weight_sum, 6), c.sample_count) for c in db.query(HeatmapCell)}
+    rollups = {(r.level, r.x, r.y): (round(r.weight_sum, 6), r.sample_count) for r in db.query(HeatmapRollup)}
+    buckets = {}
+    for b in db.query(HeatmapBucket):
+        w, n = buckets.get((b.granularity, b.x, b.y), (0.0, 0))
+        buckets[(b.granularity, b.x, b.y)] = (w + b.weight_sum, n + b.sample_count)
+    buckets = {key: (round(w, 6), n) for key, (w, n) in buckets.items()}
+    return raw, cells, rollups, buckets
+
+
+def test_bulk_path_matches_orm_path(db, tmp_path):
+    rng = random.Random(5)
+    uploads = [
+        (f"u{upload}", points(*(
+            (rng.randrange(-40, 40), rng.randrange(-40, 40), round(rng.uniform(0.1, 3.0), 3))
+            for _ in range(10)
+        )))
+        for upload in range(4)
+    ]
+    # 重复区块：同一上传内合并，跨上传累加
+    uploads.append(("dup", points((1, 1, 1.0), (1, 1, 2.0), (-1, -1, 0.5))))
+    for anonymous_id, data in uploads:
+        HeatmapService.store_heatmap_data(db, anonymous_id, data, bulk=False)
+
+    engine = make_engine(f"sqlite:///{tmp_path / 'bulk.db'}")
+    Base.metadata.create_all(bind=engine)
+    bulk_db = sessionmaker(bind=engine, autoflush=False)()
+    try:
+        for anonymous_id, data in uploads:
+            # batch_size=3 < 每次上传的行数：一次上传拆成多次 executemany
+            HeatmapService.store_heatmap_data(bulk_db, anonymous_id, data, bulk=True, batch_size=3)
+        bulk = snapshot(bulk_db)
+    finally:
+        bulk_db.close()
+        engine.dispose()
+
+    orm = snapshot(db)
+    assert len(orm[0]) == 4 * 10 + 3
+    assert bulk == orm
+
+
+def test_viewport_bounds_are_inclusive(db):
+    HeatmapService.store_heatmap_data(db, "a", points(
+        (9, 15, 1.0), (10, 15, 2.0), (11, 15, 3.0), (20, 15, 4.0), (21, 15, 5.0),
+        (15, 9, 6.0), (15, 10, 7.0), (15, 20, 8.0), (15, 21, 9.0),
+    ))
+    view = dict(x_min=10, x_max=20, y_min=10, y_max=20)
+    got = as_map(HeatmapService.get_global_heatmap(db, **view))
+    assert got == {(10, 15): 2.0, (11, 15): 3.0, (20, 15): 4.0, (15, 10): 7.0, (15, 20): 8.0}, got
+
+    # zoom=2：视口 [10, 20] 覆盖超级区块 2..5，边缘区块 x=9 (9>>2=2) 与 x=21 (21>>2=5) 也落在其中
+    zoomed = as_map(HeatmapService.get_global_heatmap(db, zoom=2, **view))
+    assert zoomed == {(2, 3): 1.0 + 2.0 + 3.0, (5, 3): 4.0 + 5.0, (3, 2): 6.0 + 7.0, (3, 5): 8.0 + 9.0}, zoomed
+    narrow = as_map(HeatmapService.get_global_heatmap(db, zoom=2, x_min=12, x_max=19, y_min=12, y_max=19))
+    assert narrow == {}, narrow
+
+    # 时间窗口路径（读时间桶）对视口的处理与聚合表路径一致
+    since = datetime.now(timezone.utc) - timedelta(hours=2)
+    for zoom in (0, 2):
+        windowed = as_map(HeatmapService.get_global_heatmap(db, zoom=zoom, since=since, **view))
+        assert windowed == as_map(HeatmapService.get_global_heatmap(db, zoom=zoom, **view)), zoom
+
+
+def utc(*args):
+    return datetime(*args, tzinfo=timezone.utc)
+
+
+@pytest.mark.parametrize("since, until, expected", [
+    # 首日 05:00 起的 19 个小时桶 + 中间 1 个整天桶 + 末日 3 个小时桶（since 向下、until 向上取整到整点）
+    (utc(2024, 1, 1, 5, 30), utc(2024, 1, 3, 2, 10), 19 + 100 + 3),
+    (utc(2024, 1, 1), utc(2024, 1, 3), 200),
+    (utc(2024, 1, 1, 2), utc(2024, 1, 1, 10), 8),
+    # 跨零点但不含整天：只读小时桶
+    (utc(2024, 1, 1, 20), utc(2024, 1, 2, 4), 8),
+])
+def test_window_splits_hour_and_day_buckets(db, since, until, expected):
+    # 小时桶每个权重 1，天桶每个权重 100（故意与小时桶之和不一致），结果可区分读了哪一级
+    first_day = int(utc(2024, 1, 1).timestamp()) // DAY
+    db.add_all(HeatmapBucket(granularity=HOUR, bucket=first_day * 24 + h, x=0, y=0, weight_sum=1.0, sample_count=1)
+               for h in range(3 * 24))
+    db.add_all(HeatmapBucket(granularity=DAY, bucket=first_day + d, x=0, y=0, weight_sum=100.0, sample_count=24)
+               for d in range(3))
+    db.commit()
+    rows = HeatmapService.get_global_heatmap(db, since=since, until=until)
+    assert rows == [{'x': 0, 'y': 0, 'weight': float(expected)}], rows
+
+
+def test_window_out_of_range_is_400(api):
+    async def scenario(client):
+        codes = {}
+        for params in ({"window": "99999999999d"}, {"window": "800000d"}, {"window": "9000h"},
+                       {"window": "7d", "until": "0001-01-03T00:00:00Z"}):
+            resp = await client.get("/api/heatmap/", params=params)
+            codes[tuple(params.values())] = resp.status_code
+        codes["365d"] = (await client.get("/api/heatmap/", params={"window": "365d"})).status_code
+        return codes
+
+    codes = api.run(scenario)
+    assert codes.pop("365d") == 200
+    assert set(codes.values()) == {400}, codes
+
+
+def test_inverted_window_is_400(api):
+    async def scenario(client):
+        cases = [
+            {"since": "2024-05-02T00:00:00Z", "until": "2024-05-01T00:00:00Z"},
+            {"since": "2024-05-01T00:00:00", "until": "2024-05-01T00:00:00Z"},
+            {"window": "0h"},
+            {"window": "1h", "until": "2024-05-01T00:00:00Z"},
+            {"since": "2024-05-01T00:00:00Z", "until": "2024-05-01T01:00:00Z"},
+        ]
+        return [(await client.get("/api/heatmap/", params=params)).status_code for params in cases]
+
+    assert api.run(scenario) == [400, 400, 400, 200, 200]
+
+
+BROWSER_ACCEPT = "text/html,application/xhtml+xml,application/xml;q=0.9,image/avif,*/*;q=0.8"
+
+
+def test_accept_negotiation(db, api):
+    HeatmapService.store_heatmap_data(db, "a", points((-3, 7, 1.25), (100, 200, 2.5), (101, 200, 0.1), (5, 5, 3.0)))
+    params = {"zoom": 1}
+
+    async def scenario(client):
+        get = lambda accept: client.get("/api/heatmap/", params=params, headers={"accept": accept})
+        return (await get("application/json"), await get(BINARY_MEDIA_TYPE),
+                await get(COLUMNS_MEDIA_TYPE), await get(BROWSER_ACCEPT))
+
+    records, binary, columns, browser = api.run(scenario)
+    expected = records.json()["heatmap"]
+    assert len(expected) == 3  # (100, 200) 与 (101, 200) 合并为同一超级区块
+
+    assert binary.headers["content-type"] == BINARY_MEDIA_TYPE
+    n = int(binary.headers["x-heatmap-count"])
+    assert n == len(expected) and len(binary.content) == 12 * n
+    assert binary.headers["x-heatmap-zoom"] == "1" and binary.headers["x-heatmap-cell-size"] == "2"
+    values = struct.unpack(f"<{n}i{n}i{n}f", binary.content)
+    decoded = [{"x": x, "y": y, "weight": w} for x, y, w in zip(values[:n], values[n:2 * n], values[2 * n:])]
+    assert [(d["x"], d["y"]) for d in decoded] == [(e["x"], e["y"]) for e in expected]
+    assert all(abs(d["weight"] - e["weight"]) < 1e-5 for d, e in zip(decoded, expected)), decoded
+
+    assert columns.headers["content-type"] == COLUMNS_MEDIA_TYPE
+    body = columns.json()
+    assert list(zip(body["x"], body["y"], body["w"])) == [(e["x"], e["y"], e["weight"]) for e in expected]
+
+    assert browser.headers["content-type"] == "application/json"
+    assert browser.json() == records.json()
+
+
+def test_records_match_list_path(db, api):
+    big = 2 ** 53 + 1  # float64 无法精确表示
+    HeatmapService.store_heatmap_data(db, "a", points(
+        (big, 3, 1.5), (big + 2, 3, 0.25), (0, 0, 4.0), (1, 1, 2.0), (2, 1, 1.0), (40, 40, 0.5)
+    ))
+
+    async def scenario(client):
+        return (await client.get("/api/heatmap/"),
+                await client.get("/api/heatmap/", params={"format": "columns", "attenuate": "false"}))
+
+    records, columns = api.run(scenario)
+    expected = HeatmapService.attenuate_center(HeatmapService.get_global_heatmap(db))
+    assert records.json()["heatmap"] == expected
+    assert {big, big + 2} <= {r["x"] for r in records.json()["heatmap"]}
+    body = columns.json()
+    rows = HeatmapService.get_global_heatmap(db)
+    assert list(zip(body["x"], body["y"], body["w"])) == [(r["x"], r["y"], r["weight"]) for r in rows]
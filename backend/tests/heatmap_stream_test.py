@@ -0,0 +1,112 @@
+"""Heatmap NDJSON stream ingestion test.
+Run: python -m pytest backend/tests/heatmap_stream_test.py
+
+Mounts the heatmap router on a throwaway SQLite file and posts NDJSON bodies in small
+pieces that split lines at arbitrary byte offsets.
+
+Checks:
+1. Record lines and upload lines mix freely, blank lines are skipped, and a last line
+   without a trailing newline is ingested; chunks are committed on line boundaries
+2. A malformed line returns 400 naming the line; earlier chunks stay committed and
+   lines_committed says where to resume
+3. A line longer than the configured limit is rejected with 413
+4. A long line arriving in many small pieces is reassembled intact, next to short lines
+"""
+import asyncio
+import json
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+# Ensure backend package import
+sys.path.append(str(ROOT))
+
+import httpx
+from fastapi import FastAPI
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from app.database import Base, get_async_db, make_async_engine
+from app.models import HeatmapCell, HeatmapData
+from app.routers import heatmap as heatmap_router
+
+
+async def post_stream(lines, chunk_records=3, max_line_bytes=None, piece=7):
+    """以 piece 字节为单位分段发送 NDJSON，返回 (状态码, 响应体, 原始行数, 聚合区块数)。"""
+    url = f"sqlite+aiosqlite:///{os.path.join(tempfile.mkdtemp(prefix='heatmap_stream_test_'), 'test.db')}"
+    engine = make_async_engine(url)
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    sessions = async_sessionmaker(engine, class_=AsyncSession, autoflush=False, expire_on_commit=False)
+
+    async def override_db():
+        async with sessions() as db:
+            yield db
+
+    app = FastAPI()
+    app.include_router(heatmap_router.router, prefix="/api/heatmap")
+    app.dependency_overrides[get_async_db] = override_db
+
+    body = "\n".join(lines).encode()
+
+    async def pieces():
+        for start in range(0, len(body), piece):
+            yield body[start:start + piece]
+
+    saved = heatmap_router.STREAM_CHUNK_RECORDS, heatmap_router.STREAM_MAX_LINE_BYTES
+    heatmap_router.STREAM_CHUNK_RECORDS = chunk_records
+    heatmap_router.STREAM_MAX_LINE_BYTES = max_line_bytes or saved[1]
+    try:
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+            resp = await client.post("/api/heatmap/data/stream", content=pieces(),
+                                     headers={"content-type": "application/x-ndjson"})
+        async with sessions() as db:
+            raw = (await db.execute(select(func.count(HeatmapData.id)))).scalar_one()
+            cells = (await db.execute(select(func.count()).select_from(HeatmapCell))).scalar_one()
+        return resp.status_code, resp.json(), raw, cells
+    finally:
+        heatmap_router.STREAM_CHUNK_RECORDS, heatmap_router.STREAM_MAX_LINE_BYTES = saved
+        await engine.dispose()
+
+
+def record(anonymous_id, x, y, weight=1.0):
+    return json.dumps({"anonymous_id": anonymous_id, "x": x, "y": y, "weight": weight})
+
+
+def test_mixed_lines_and_chunking():
+    lines = [record("a", i, 1) for i in range(5)]
+    lines.append(json.dumps({"anonymous_id": "b", "data": [{"x": 1, "y": 1, "weight": 2.0},
+                                                            {"x": 7, "y": 7, "weight": 1.5}]}))
+    lines += ["", record("c", 9, 9)]
+    status, body, raw, cells = asyncio.run(post_stream(lines))
+    assert status == 200, body
+    assert body["records"] == 8 and body["lines"] == 8, body
+    # 3 + 3（第 6 行的两条与第 4、5 行一起在行边界提交）+ 1 → 3 个事务
+    assert body["chunks"] == 3 and body["records_per_second"] > 0, body
+    assert raw == 8 and cells == 7, (raw, cells)
+
+
+def test_malformed_line_keeps_committed_chunks():
+    lines = [record("a", i, 1) for i in range(4)] + ['{"x": 1}', record("a", 5, 1)]
+    status, body, raw, _ = asyncio.run(post_stream(lines))
+    assert status == 400, body
+    detail = body["detail"]
+    assert detail["line"] == 5 and detail["lines_committed"] == 3 and detail["records_committed"] == 3, detail
+    assert raw == 3, raw
+
+
+def test_oversized_line_rejected():
+    status, body, raw, _ = asyncio.run(post_stream([record("a", 1, 1), "x" * 200], max_line_bytes=64))
+    assert status == 413, body
+    assert raw == 0, raw
+
+
+def test_long_line_across_many_pieces():
+    points = [{"x": i % 50, "y": i // 50, "weight": 1.0} for i in range(2000)]
+    lines = [record("a", 1, 1), json.dumps({"anonymous_id": "b", "data": points}), record("c", 2, 2)]
+    status, body, raw, _ = asyncio.run(post_stream(lines, chunk_records=1000, piece=5))
+    assert status == 200, body
+    assert body["records"] == 2002 and body["lines"] == 3, body
+    assert raw == 2002, raw
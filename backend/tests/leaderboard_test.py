@@ -0,0 +1,246 @@
+"""Leaderboard test: cache invalidation under concurrent writes.
+Run: python -m pytest backend/tests/leaderboard_test.py
+
+Checks:
+1. A leaderboard computed while a write invalidates the cache is returned to its caller
+   but not cached, so the next read recomputes
+2. A mixed ring-signature batch reports accepted / not_found / replayed / rejected per item
+   and records only the accepted score; an empty batch succeeds
+3. With the verification pool at capacity, further single and batch submissions get 503 with
+   Retry-After (not queued, not 500), and succeed once capacity frees up
+4. Group-HMAC submissions read the group secret and id from the in-process map (loading groups
+   missing from it once), keep the group_<id> ring_id, and 404 for unknown groups
+5. The demo seed writes once: a second call sees the app_meta marker and inserts nothing, and
+   a worker that loses the race on the marker rolls back its own seed rows
+6. TTLCache drops a set whose generation was read before an invalidation (counted as a stale
+   set), whether the invalidation came from another thread or targeted a single key
+"""
+import asyncio
+import hashlib
+import hmac
+import sys
+import threading
+from pathlib import Path
+
+from sqlalchemy.orm import sessionmaker
+
+ROOT = Path(__file__).resolve().parents[1]
+# Ensure backend package import
+sys.path.append(str(ROOT))
+
+from app.models import AppMeta, Group, GroupScore
+from app.services.cache_service import TTLCache
+from app.services.crypto_service import CryptoService, SECP256K1_N
+from app.services.group_service import GroupService
+from app.services.leaderboard_service import LeaderboardService
+from app.services.ring_service import RingService
+from app.services.verify_pool import configure_verify_pool, shutdown_verify_pool
+
+
+def score(group_name, distance):
+    return GroupScore(ring_id="r", group_name=group_name, user_anonymous_id=None,
+                      total_distance=distance, average_pace=5.0, signature="s")
+
+
+def make_ring(db, group_name, size=3):
+    """写入一个环，返回 (环信息, 其中一个成员的私钥)。"""
+    keypairs = [CryptoService.generate_keypair() for _ in range(size)]
+    ring = RingService.create_ring(db, [kp["public_key"] for kp in keypairs], "medium", group_name)
+    return ring, keypairs[0]["private_key"]
+
+
+def signed_score(ring, private_key, distance, pace=5.0):
+    msg = f"{ring['ring_id']}|{distance}|{pace}".encode()
+    c0, s_list = CryptoService.ring_sign(msg, private_key, ring["ring_public_keys"])
+    return {"ring_id": ring["ring_id"], "total_distance": distance, "average_pace": pace,
+            "signature": {"c0": c0, "s": s_list}}
+
+
+def test_invalidation_during_compute_is_not_overwritten(db, monkeypatch):
+    LeaderboardService.record_score(db, score("A", 10.0))
+    db.commit()
+    LeaderboardService.invalidate_cache()
+    compute = LeaderboardService.compute_leaderboard
+
+    def racing_compute(session):
+        result = compute(session)
+        # 聚合完成后、回填之前，另一请求写入成绩并使缓存失效
+        LeaderboardService.record_score(session, score("A", 30.0))
+        session.commit()
+        LeaderboardService.invalidate_cache()
+        return result
+
+    monkeypatch.setattr(LeaderboardService, "compute_leaderboard", staticmethod(racing_compute))
+    stale = LeaderboardService.get_leaderboard(db)
+    assert stale[0]["average_distance"] == 10.0
+    monkeypatch.setattr(LeaderboardService, "compute_leaderboard", staticmethod(compute))
+
+    fresh = LeaderboardService.get_leaderboard(db)
+    assert fresh[0]["average_distance"] == 20.0, fresh
+    assert LeaderboardService.get_leaderboard(db) == fresh
+    assert LeaderboardService.cache_stats()["stale_sets"] >= 1
+
+
+def test_batch_reports_each_outcome(db, api):
+    ring, key = make_ring(db, "batch_group")
+    earlier = signed_score(ring, key, 7.0)
+    fresh = signed_score(ring, key, 5.0)
+    tampered = signed_score(ring, key, 6.0)
+    tampered["signature"]["s"][0] = format((int(tampered["signature"]["s"][0], 16) + 1) % SECP256K1_N, "064x")
+    missing = dict(fresh, ring_id="ring_does_not_exist")
+
+    async def scenario(client):
+        single = await client.post("/api/leaderboard/submit-score-ring", json=earlier)
+        batch = await client.post("/api/leaderboard/submit-scores-ring/batch",
+                                  json={"items": [fresh, missing, fresh, tampered, earlier]})
+        empty = await client.post("/api/leaderboard/submit-scores-ring/batch", json={"items": []})
+        board = await client.get("/api/leaderboard/")
+        return single, batch, empty, board
+
+    single, batch, empty, board = api.run(scenario)
+    assert single.status_code == 200, single.text
+    assert batch.status_code == 200, batch.text
+    body = batch.json()
+    assert [r["status"] for r in body["results"]] == ["accepted", "not_found", "replayed", "rejected", "replayed"], body
+    assert [r["index"] for r in body["results"]] == [0, 1, 2, 3, 4]
+    assert body["accepted"] == 1 and body["rejected"] == 4, body
+    assert empty.status_code == 200 and empty.json() == {"accepted": 0, "rejected": 0, "results": []}
+    entry = next(e for e in board.json()["leaderboard"] if e["group_name"] == "batch_group")
+    assert entry["average_distance"] == 6.0, entry
+
+
+def test_full_verify_pool_returns_503(db, api, monkeypatch):
+    ring, key = make_ring(db, "busy_group")
+    first, second, third = (signed_score(ring, key, d) for d in (4.0, 5.0, 6.0))
+    gate = threading.Event()
+    verify_many = CryptoService.ring_verify_many
+
+    def blocked_verify_many(*args):
+        # 占住唯一的验证名额，直到测试放行
+        gate.wait(10)
+        return verify_many(*args)
+
+    monkeypatch.setattr(CryptoService, "ring_verify_many", staticmethod(blocked_verify_many))
+    pool = configure_verify_pool("thread", workers=1, queue=0)
+
+    async def scenario(client):
+        holding = asyncio.ensure_future(client.post("/api/leaderboard/submit-score-ring", json=first))
+        while pool.stats()["in_flight"] < 1:
+            await asyncio.sleep(0.01)
+        single = await client.post("/api/leaderboard/submit-score-ring", json=second)
+        batch = await client.post("/api/leaderboard/submit-scores-ring/batch", json={"items": [third]})
+        gate.set()
+        held = await holding
+        retry = await client.post("/api/leaderboard/submit-score-ring", json=second)
+        return held, single, batch, retry
+
+    try:
+        held, single, batch, retry = api.run(scenario)
+    finally:
+        gate.set()
+        shutdown_verify_pool()
+    for resp in (single, batch):
+        assert resp.status_code == 503, resp.text
+        assert resp.headers["retry-after"] == "1"
+    assert pool.stats()["rejected"] == 2
+    assert held.status_code == 200 and retry.status_code == 200, (held.text, retry.text)
+
+
+def hmac_score(group_name, secret, distance, pace=5.0):
+    msg = f"{group_name}|{distance}|{pace}".encode()
+    return {"group_name": group_name, "total_distance": distance, "average_pace": pace,
+            "group_signature": hmac.new(bytes.fromhex(secret), msg, hashlib.sha512).hexdigest()}
+
+
+def test_group_hmac_submission_uses_secret_map(db, api):
+    GroupService.bootstrap(db, ["hmac_group"])
+    secret = GroupService.cached_secret("hmac_group")
+    # 映射外的群组（例如启动后才写入的旧组名）首次提交时读入映射
+    db.add(Group(name="late_group", secret="ab" * 32))
+    db.commit()
+    late_id = db.query(Group.id).filter(Group.name == "late_group").scalar()
+
+    async def scenario(client):
+        url = "/api/leaderboard/submit-score"
+        return [
+            await client.post(url, json=hmac_score("hmac_group", secret, 8.0)),
+            await client.post(url, json=dict(hmac_score("hmac_group", secret, 8.0), total_distance=9.0)),
+            await client.post(url, json=hmac_score("no_such_group", secret, 8.0)),
+            await client.post(url, json=hmac_score("late_group", "ab" * 32, 3.0)),
+        ]
+
+    ok, forged, unknown, late = api.run(scenario)
+    assert ok.status_code == 200 and late.status_code == 200, (ok.text, late.text)
+    assert forged.status_code == 400 and unknown.status_code == 404, (forged.text, unknown.text)
+    assert GroupService.cached_group_id("late_group") == late_id
+    group_id = db.query(Group.id).filter(Group.name == "hmac_group").scalar()
+    ring_ids = {name: rid for name, rid in db.query(GroupScore.group_name, GroupScore.ring_id)}
+    assert ring_ids == {"hmac_group": f"group_{group_id}", "late_group": f"group_{late_id}"}, ring_ids
+
+
+def test_demo_seed_runs_once(db, monkeypatch):
+    first = LeaderboardService.bootstrap_demo_seed(db)
+    assert first > 0
+    assert db.get(AppMeta, LeaderboardService.SEED_MARKER) is not None
+    assert LeaderboardService.bootstrap_demo_seed(db) == 0
+    assert db.query(GroupScore).count() == first
+
+    # 另一个 worker：读标记时尚未看到本 worker 的提交，写标记时主键冲突，整体回滚
+    db.query(GroupScore).delete()
+    db.query(AppMeta).delete()
+    db.commit()
+    other = sessionmaker(bind=db.get_bind(), autoflush=False)()
+    get = db.get
+
+    def racing_get(model, key):
+        winner = LeaderboardService.bootstrap_demo_seed(other)
+        assert winner > 0
+        racing_get.winner = winner
+        return None
+
+    monkeypatch.setattr(db, "get", racing_get)
+    try:
+        assert LeaderboardService.bootstrap_demo_seed(db) == 0
+    finally:
+        monkeypatch.setattr(db, "get", get)
+        other.close()
+    assert db.query(GroupScore).count() == racing_get.winner
+    assert db.query(AppMeta).count() == 1
+
+
+def test_set_started_before_invalidation_is_dropped():
+    cache = TTLCache(maxsize=4)
+    started, invalidated = threading.Event(), threading.Event()
+    result = {}
+
+    def compute():
+        generation = cache.generation
+        started.set()
+        # 计算期间另一线程写入并使缓存失效
+        invalidated.wait(5)
+        result["stored"] = cache.set("board", "old", generation=generation)
+
+    worker = threading.Thread(target=compute)
+    worker.start()
+    started.wait(5)
+    cache.invalidate()
+    invalidated.set()
+    worker.join(5)
+    assert result["stored"] is False
+    assert cache.get("board") is None
+    stats = cache.stats()
+    assert stats["stale_sets"] == 1 and stats["invalidations"] == 1 and stats["size"] == 0, stats
+
+    # 失效之后读取的 generation 可以正常回填
+    generation = cache.generation
+    assert cache.set("board", "new", generation=generation) is True
+    assert cache.get("board") == "new"
+
+    # 单键失效同样递增 generation；不带 generation 的 set 不受影响
+    generation = cache.generation
+    cache.invalidate("other")
+    assert cache.set("board", "newer", generation=generation) is False
+    assert cache.get("board") == "new"
+    assert cache.set("board", "newest") is True
+    assert cache.get("board") == "newest"
+    assert cache.stats()["stale_sets"] == 2
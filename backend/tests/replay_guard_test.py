@@ -0,0 +1,68 @@
+"""Replay guard test: Bloom filter front + signature_digests table.
+Run: python -m pytest backend/tests/replay_guard_test.py
+
+Checks:
+1. The Bloom filter has no false negatives and a false-positive rate near the target
+2. Digests are unambiguous across field boundaries
+3. claim() registers a digest once; seen() finds it after commit; prune() removes old digests
+"""
+import os
+import sys
+import tempfile
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+# Ensure backend package import
+sys.path.append(str(ROOT))
+
+from sqlalchemy.orm import sessionmaker
+
+from app.database import Base, make_engine
+from app.models import SignatureDigest
+from app.services.replay_guard import BloomFilter, ReplayGuard
+
+
+def test_bloom_filter_rates():
+    bloom = BloomFilter(capacity=10000, error_rate=0.01)
+    added = [ReplayGuard.digest("r", str(i).encode(), "c0") for i in range(10000)]
+    for d in added:
+        bloom.add(bytes.fromhex(d))
+    assert all(bytes.fromhex(d) in bloom for d in added)
+    probes = [bytes.fromhex(ReplayGuard.digest("other", str(i).encode(), "c0")) for i in range(20000)]
+    false_positives = sum(p in bloom for p in probes) / len(probes)
+    assert false_positives < 0.02, false_positives
+
+
+def test_digest_field_boundaries():
+    assert ReplayGuard.digest("ab", b"c", "d") != ReplayGuard.digest("a", b"bc", "d")
+    assert ReplayGuard.digest("r", b"m", "1") == ReplayGuard.digest("r", b"m", "1")
+
+
+def test_claim_seen_prune():
+    url = f"sqlite:///{os.path.join(tempfile.mkdtemp(prefix='replay_guard_test_'), 'test.db')}"
+    engine = make_engine(url)
+    Base.metadata.create_all(bind=engine)
+    db = sessionmaker(bind=engine, autoflush=False)()
+    guard = ReplayGuard(capacity=1000)
+    try:
+        d = guard.digest("ring_1", b"ring_1|5.0|6.0", "123")
+        assert guard.candidates([d]) == set()
+        assert guard.claim(db, d) is True
+        assert guard.claim(db, d) is False
+        db.commit()
+        guard.remember([d])
+        assert guard.candidates([d]) == {d}
+        assert guard.seen(db, [d]) == {d}
+
+        # 新的守卫从库中预热，重启后仍能在验证前拦截
+        fresh = ReplayGuard(capacity=1000)
+        assert fresh.warm(db) == 1 and fresh.candidates([d]) == {d}
+
+        db.add(SignatureDigest(digest="0" * 64, created_at=datetime.now(timezone.utc) - timedelta(days=40)))
+        db.commit()
+        assert ReplayGuard.prune(db, 30) == {'digests': 1}
+        assert guard.seen(db, [d, "0" * 64]) == {d}
+    finally:
+        db.close()
+        engine.dispose()
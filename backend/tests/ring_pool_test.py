@@ -0,0 +1,160 @@
+"""Ring pool test: pre-built member sets for /request-ring.
+Run: python -m pytest backend/tests/ring_pool_test.py
+
+Checks:
+1. An empty (or disabled) pool builds the ring on the spot, counts a miss and wakes the refill thread
+2. The background thread refills registered pools to depth; acquire then serves from the pool
+3. A repeated request from the same key reuses the issued ring within the reuse window
+4. Member sets older than max_age are dropped instead of served
+5. Unregistered levels never create a pool, registration is capped at max_keys, and refill only
+   reads: it neither seeds users nor pools sets that cannot fill a ring
+6. backfill_public_key_valid flags NULL rows (in batches) by curve validity, leaves already
+   flagged rows alone unless recheck is set, and sample_members then draws only valid keys
+"""
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+# Ensure backend package import
+sys.path.append(str(ROOT))
+
+from sqlalchemy.orm import sessionmaker
+
+from app.models import Ring, User
+from app.services.crypto_service import CryptoService
+from app.services.ring_pool import RingPool
+from app.services.ring_service import RingService
+
+
+def make_pool(db, **kwargs):
+    kwargs.setdefault("depth", 2)
+    kwargs.setdefault("reuse_window", 0)
+    return RingPool(ring_size=3, refill_interval=0.05,
+                    session_factory=sessionmaker(bind=db.get_bind(), autoflush=False), **kwargs)
+
+
+def add_users(db, level, n):
+    db.add_all(User(anonymous_id=f"{level}_{i}", public_key=requester(), public_key_valid=True, user_level=level)
+               for i in range(n))
+    db.commit()
+
+
+def requester():
+    return CryptoService.generate_keypair()["public_key"]
+
+
+def test_empty_pool_builds_ring_on_the_spot(db):
+    pool = make_pool(db)
+    pool.register("medium", "g")
+    pool._wake.clear()
+    pk = requester()
+    info = pool.acquire(db, pk, "medium", group_name="g")
+    assert pk in info["ring_public_keys"] and len(info["ring_public_keys"]) == 3
+    assert db.query(Ring).filter(Ring.ring_id == info["ring_id"]).one().group_name == "g"
+    stats = pool.stats()
+    assert stats["misses"] == 1 and stats["hits"] == 0 and stats["pools"] == {"medium/g": 0}, stats
+    assert pool._wake.is_set()
+
+    disabled = make_pool(db, depth=0)
+    disabled.start()
+    assert disabled.acquire(db, requester(), "medium", group_name="g")["ring_id"] != info["ring_id"]
+    assert disabled.stats()["running"] is False and disabled.stats()["misses"] == 0
+
+
+def test_background_refill_then_pooled_acquire(db):
+    add_users(db, "medium", 6)
+    pool = make_pool(db, depth=3)
+    pool.register("medium", "g")
+    pool.start()
+    try:
+        deadline = time.monotonic() + 5
+        while pool.stats()["pools"]["medium/g"] < 3 and time.monotonic() < deadline:
+            time.sleep(0.02)
+        assert pool.stats()["running"] is True
+    finally:
+        pool.stop()
+    stats = pool.stats()
+    assert stats["pools"]["medium/g"] == 3 and stats["refilled_sets"] >= 3 and not stats["running"], stats
+
+    pk = requester()
+    info = pool.acquire(db, pk, "medium", group_name="g")
+    stats = pool.stats()
+    assert stats["hits"] == 1 and stats["misses"] == 0 and stats["pools"]["medium/g"] == 2, stats
+    members = set(info["ring_public_keys"]) - {pk}
+    valid = {k for (k,) in db.query(User.public_key).filter(User.user_level == "medium", User.public_key_valid.is_(True))}
+    assert pk in info["ring_public_keys"] and len(members) == 2 and members <= valid, info
+
+
+def test_reuse_window_returns_issued_ring(db):
+    pool = make_pool(db, reuse_window=60)
+    pk = requester()
+    first = pool.acquire(db, pk, "medium", group_name="g")
+    assert pool.acquire(db, pk, "medium", group_name="g") == first
+    assert pool.stats()["reuse_hits"] == 1
+    assert pool.acquire(db, pk, "high", group_name="g")["ring_id"] != first["ring_id"]
+    assert pool.acquire(db, requester(), "medium", group_name="g")["ring_id"] != first["ring_id"]
+    assert db.query(Ring).count() == 3
+
+
+def test_expired_sets_are_not_served(db):
+    add_users(db, "medium", 4)
+    pool = make_pool(db, max_age=0.05)
+    pool.register("medium", "g")
+    assert pool.refill_once() == 2
+    time.sleep(0.1)
+    pool.acquire(db, requester(), "medium", group_name="g")
+    stats = pool.stats()
+    assert stats["expired"] == 2 and stats["misses"] == 1 and stats["hits"] == 0, stats
+
+
+def test_unregistered_levels_and_read_only_refill(db):
+    add_users(db, "medium", 4)
+    db.add(User(anonymous_id="u_high", public_key=requester(), public_key_valid=True,
+                user_level="high", group_name="g"))
+    db.commit()
+    pool = make_pool(db, levels=["medium"], max_keys=len(RingService.GROUP_NAMES) + 1)
+    assert pool.warm_from_users(db) == len(RingService.GROUP_NAMES) + 1
+    assert "high/g" in pool.stats()["pools"]
+    assert pool.register("elite", "g") is False
+
+    for i in range(20):
+        pool.acquire(db, requester(), f"made_up_{i}", group_name="g")
+    stats = pool.stats()
+    assert stats["unpooled"] == 20 and stats["misses"] == 0, stats
+    assert len(stats["pools"]) == len(RingService.GROUP_NAMES) + 1, stats
+
+    # "high" 只有一个用户，凑不满环：补充时不预建、不补种
+    users = db.query(User).count()
+    pool.refill_once()
+    db.expire_all()
+    assert pool.stats()["pools"]["high/g"] == 0
+    assert all(n == 2 for key, n in pool.stats()["pools"].items() if key.startswith("medium/"))
+    assert db.query(User).filter(User.user_level == "high").count() == 1
+    assert db.query(User).count() == users
+
+
+def test_backfill_public_key_valid(db):
+    valid = [requester() for _ in range(4)]
+    invalid = ["pk", "02" + "00" * 32, "04" + "ab" * 32]
+    db.add_all(User(anonymous_id=f"v{i}", public_key=pk, public_key_valid=None, user_level="medium")
+               for i, pk in enumerate(valid))
+    db.add_all(User(anonymous_id=f"x{i}", public_key=pk, public_key_valid=None, user_level="medium")
+               for i, pk in enumerate(invalid))
+    # 已标记的行默认不重算（即使标记与公钥不符）
+    stale = requester()
+    db.add(User(anonymous_id="stale", public_key=stale, public_key_valid=False, user_level="medium"))
+    db.commit()
+    assert RingService.sample_members(db, "medium", 10) == []
+
+    counts = RingService.backfill_public_key_valid(db, batch_size=2)
+    assert counts == {"checked": 7, "valid": 4, "invalid": 3}, counts
+    flags = {u.public_key: u.public_key_valid for u in db.query(User)}
+    assert all(flags[pk] is True for pk in valid) and all(flags[pk] is False for pk in invalid), flags
+    assert flags[stale] is False
+    assert sorted(RingService.sample_members(db, "medium", 10)) == sorted(valid)
+    assert RingService.backfill_public_key_valid(db)["checked"] == 0
+
+    counts = RingService.backfill_public_key_valid(db, recheck=True)
+    assert counts == {"checked": 8, "valid": 5, "invalid": 3}, counts
+    assert sorted(RingService.sample_members(db, "medium", 10)) == sorted(valid + [stale])
@@ -0,0 +1,84 @@
+"""Verification pool test: verdict cache and single-flight for ring signature verification.
+Run: python -m pytest backend/tests/verify_pool_test.py
+
+Checks:
+1. Identical in-flight verifications run once and all callers get the verdict
+2. A repeated signature is answered from the verdict cache, valid or not
+3. Batch verification reuses cached verdicts and only verifies the rest
+4. The auto executor picks a process pool for GIL-bound curve backends and a thread pool for
+   coincurve; an explicit thread pool with a pure-Python backend logs a warning
+"""
+import asyncio
+import sys
+from pathlib import Path
+from types import SimpleNamespace
+
+ROOT = Path(__file__).resolve().parents[1]
+# Ensure backend package import
+sys.path.append(str(ROOT))
+
+from app.services.crypto_service import CryptoService, SECP256K1_N
+from app.services import verify_pool
+from app.services.verify_pool import VerificationPool
+
+
+def make_signature(message: bytes):
+    keypairs = [CryptoService.generate_keypair() for _ in range(3)]
+    ring = [kp['public_key'] for kp in keypairs]
+    c0, s_list = CryptoService.ring_sign(message, keypairs[0]['private_key'], ring)
+    return ring, c0, s_list
+
+
+def test_single_flight_and_cache():
+    message = b"ring_vp|5.0|6.0"
+    ring, c0, s_list = make_signature(message)
+    pool = VerificationPool("thread", workers=2, queue=8)
+
+    async def scenario():
+        same = [pool.verify(message, ring, c0, s_list, ring_id="ring_vp") for _ in range(4)]
+        verdicts = await asyncio.gather(*same)
+        again = await pool.verify(message, ring, c0, s_list, ring_id="ring_vp")
+        return verdicts, again
+
+    try:
+        verdicts, again = asyncio.run(scenario())
+        stats = pool.stats()
+        assert verdicts == [True] * 4 and again is True
+        assert stats["completed"] == 1 and stats["coalesced"] == 3, stats
+        assert stats["verdict_cache"]["hits"] == 1 and stats["in_flight_signatures"] == 0, stats
+
+        tampered = list(s_list)
+        tampered[0] = format((int(tampered[0], 16) + 1) % SECP256K1_N, '064x')
+        assert asyncio.run(pool.verify(message, ring, c0, tampered, ring_id="ring_vp")) is False
+        assert asyncio.run(pool.verify(message, ring, c0, tampered, ring_id="ring_vp")) is False
+        assert pool.stats()["completed"] == 2
+    finally:
+        pool.shutdown()
+
+
+def test_batch_uses_cached_verdicts():
+    message = b"ring_vb|7.0|5.5"
+    ring, c0, s_list = make_signature(message)
+    other = b"ring_vb|8.0|5.5"
+    _, c1, s1 = make_signature(other)
+    pool = VerificationPool("inline", workers=1, queue=8)
+    items = [(message, ring, c0, s_list, "ring_vb"), (other, ring, c1, s1, "ring_vb")]
+    assert asyncio.run(pool.verify_batch(items)) == [True, False]
+    assert asyncio.run(pool.verify_batch(items)) == [True, False]
+    assert pool.stats()["completed"] == 1
+
+
+def test_auto_executor_follows_curve_backend(monkeypatch, capsys):
+    for backend, expected in (("pure", "process"), ("ecdsa", "process"), ("coincurve", "thread")):
+        monkeypatch.setattr(verify_pool, "get_curve_backend", lambda: SimpleNamespace(name=backend))
+        pool = VerificationPool("auto", workers=1, queue=0)
+        try:
+            assert pool.kind == expected, (backend, pool.kind)
+        finally:
+            pool.shutdown()
+    assert "[WARN]" not in capsys.readouterr().out
+
+    monkeypatch.setattr(verify_pool, "get_curve_backend", lambda: SimpleNamespace(name="pure"))
+    pool = VerificationPool("thread", workers=1, queue=0)
+    pool.shutdown()
+    assert pool.kind == "thread" and "holds the GIL" in capsys.readouterr().out
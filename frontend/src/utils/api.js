@@ -37,11 +37,12 @@ export async function uploadHeatmapData(anonymousId, heatmapData) {
 
 /**
  * 获取全局热力图数据
+ * @param {Object} [params] - 可选查询参数：视口 x_min/x_max/y_min/y_max（网格编号）与缩放级别 zoom
  * @returns {Promise} 热力图数据
  */
-export async function getGlobalHeatmap() {
+export async function getGlobalHeatmap(params = {}) {
     try {
-        const response = await apiClient.get('/api/heatmap');
+        const response = await apiClient.get('/api/heatmap', { params });
         return response.data;
     } catch (error) {
         console.error('获取热力图数据失败:', error);
@@ -49,6 +50,34 @@ export async function getGlobalHeatmap() {
     }
 }
 
+/**
+ * 以二进制列式格式获取热力图（大地图时体积与解析开销更小）
+ * 布局：int32 x[n] | int32 y[n] | float32 w[n]（小端序），n 取自 X-Heatmap-Count 响应头
+ * @param {Object} [params] - 与 getGlobalHeatmap 相同的查询参数
+ * @returns {Promise<{x: Int32Array, y: Int32Array, w: Float32Array, zoom: number, cellSize: number}>}
+ */
+export async function getGlobalHeatmapBinary(params = {}) {
+    try {
+        const response = await apiClient.get('/api/heatmap', {
+            params,
+            responseType: 'arraybuffer',
+            headers: { Accept: 'application/octet-stream' }
+        });
+        const buffer = response.data;
+        const n = Number(response.headers['x-heatmap-count'] ?? buffer.byteLength / 12);
+        return {
+            x: new Int32Array(buffer, 0, n),
+            y: new Int32Array(buffer, n * 4, n),
+            w: new Float32Array(buffer, n * 8, n),
+            zoom: Number(response.headers['x-heatmap-zoom'] ?? 0),
+            cellSize: Number(response.headers['x-heatmap-cell-size'] ?? 1)
+        };
+    } catch (error) {
+        console.error('获取热力图数据失败:', error);
+        throw error;
+    }
+}
+
 /**
  * 请求加入匿名环
  * @param {string} anonymousId - 用户匿名ID